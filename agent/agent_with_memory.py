@@ -4,7 +4,8 @@
 
 import os
 import sys
-from typing import Dict, List, Any, Union
+import logging
+from typing import Dict, List, Any, Optional, Tuple, Union
 
 # 将项目根目录添加到Python路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -12,37 +13,57 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langgraph.prebuilt import create_react_agent
 
+from misc.conversation_history import ConversationHistory
 from misc.memory_bm25 import create_memory_tools
+from misc.tokenizer import warm_up_tokenizer
 from misc.utils import create_llm, load_environment
 
 bm25_cache_dir = "/mnt/data/gyzou/expr_workplace/self-agent-memory/db_cache/bm25_txt"
 
 
-def create_bm25_memory_agent(api_key: str = None, cache_dir: str = bm25_cache_dir):
+def create_bm25_memory_agent(
+    api_key: str = None,
+    cache_dir: str = bm25_cache_dir,
+    user_dict: str = None,
+    warm_up: bool = True,
+    memory_tools: Optional[Tuple[Any, Any]] = None,
+    model: Optional[Any] = None,
+):
     """创建带有bm25记忆功能的ReactAgent
 
     Args:
-        api_key: OpenAI API密钥（可选）
+        api_key: OpenAI API密钥（可选，只在创建模型时使用）
         cache_dir: 缓存目录路径
+        user_dict: jieba领域用户词典路径（可选）
+        warm_up: 是否在后台线程中提前构建jieba词典
+        memory_tools: 已创建的(保存工具, 检索工具)，为None时按cache_dir创建
+        model: 已创建的语言模型，为None时设置api_key或加载环境后调用create_llm创建；
+            传入时不再加载环境，api_key被忽略
 
     Returns:
         配置好的ReactAgent
     """
-    # 设置OpenAI API密钥
-    if api_key:
-        os.environ["OPENAI_API_KEY"] = api_key
-    else:
-        load_environment()
+    # 后台预热分词器；记忆工具在模型创建之后才构建（加载记忆需要等待词典），
+    # 词典构建与环境加载、langchain_openai导入和模型创建重叠
+    if warm_up:
+        warm_up_tokenizer(cache_dir, user_dict)
+
+    # 设置OpenAI API密钥并创建语言模型，传入已创建的模型时环境已由调用方加载
+    if model is None:
+        if api_key:
+            os.environ["OPENAI_API_KEY"] = api_key
+        else:
+            load_environment()
+        model = create_llm()
 
     # 创建记忆工具
-    memory_save_tool, memory_retrieve_tool = create_memory_tools(cache_dir)
+    if memory_tools is None:
+        memory_tools = create_memory_tools(cache_dir, user_dict=user_dict)
+    memory_save_tool, memory_retrieve_tool = memory_tools
 
     # 定义工具列表
     tools = [memory_save_tool, memory_retrieve_tool]
 
-    # 创建语言模型
-    model = create_llm()
-
     # 创建ReactAgent
     agent = create_react_agent(
         model=model,
@@ -57,6 +78,7 @@ def create_bm25_memory_agent(api_key: str = None, cache_dir: str = bm25_cache_di
 - 保存用户提供的重要信息，如偏好、需求、背景等
 - 保存对话中的关键结论和决策
 - 在回答问题前，检索相关记忆以提供更连贯和个性化的回答
+- 较早的对话会被自动保存到记忆库（以"[历史对话]"开头），需要回顾时请检索
 
 请根据需要使用这些工具，并在与用户交互时展示你的记忆能力。请使用中文回复。""",
     )
@@ -83,14 +105,29 @@ def print_messages(messages: List[Union[BaseMessage, Dict[str, Any]]]) -> None:
 
 def main():
     """主函数"""
+    # 记忆存储的日志默认只输出警告，可以通过LOG_LEVEL环境变量调整
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "WARNING"),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
 
-    agent = create_bm25_memory_agent()
+    # 先在后台预热分词器并创建模型，再构建需要分词的记忆工具
+    warm_up_tokenizer(bm25_cache_dir)
+    load_environment()
+    model = create_llm()
+    memory_tools = create_memory_tools(bm25_cache_dir)
+    agent = create_bm25_memory_agent(
+        memory_tools=memory_tools, model=model, warm_up=False
+    )
 
     print("带记忆功能的AI助手已启动，输入'退出'结束对话")
     print("-" * 50)
 
-    # 保存所有对话历史
-    messages = []
+    # 只保留token预算内的最近对话，更早的对话写入记忆库
+    history = ConversationHistory(
+        save_tool=memory_tools[0],
+        max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "4000")),
+    )
 
     while True:
         # 获取用户输入
@@ -100,17 +137,14 @@ def main():
             print("助手: 再见！")
             break
 
-        # 添加用户消息
-        messages.append(HumanMessage(content=user_input))
-
-        # 运行Agent
-        response = agent.invoke({"messages": messages})
+        # 添加用户消息并运行Agent
+        response = agent.invoke({"messages": history.add_user_message(user_input)})
 
         # 更新消息历史
-        messages = response["messages"]
+        history.update(response["messages"])
 
         # 打印助手回复（最后一条消息）
-        print_messages(messages[-1:])
+        print_messages(response["messages"][-1:])
         print("-" * 50)
 
 
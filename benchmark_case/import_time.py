@@ -0,0 +1,165 @@
+"""
+基于 python -X importtime 的模块导入耗时基准
+
+每个模块在全新的子进程中导入，重复若干次取最小值，结果可保存为JSON，
+并与之前保存的基线比较，用于跟踪启动耗时的回退。
+
+用法:
+    python benchmark_case/import_time.py --output import_time.json
+    python benchmark_case/import_time.py --baseline import_time.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_MODULES = [
+    "misc.utils",
+    "misc.tokenizer",
+    "misc.retrieval_cache",
+    "misc.memory_bm25",
+    "misc.memory_graph",
+    "misc.memory_vector",
+    "misc.memory_hybrid",
+    "agent.agent_with_memory",
+]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """解析 -X importtime 的输出
+
+    Args:
+        stderr: 子进程的标准错误输出
+
+    Returns:
+        (模块名, 自身耗时us, 累计耗时us, 嵌套深度) 列表
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure_import_time(module: str, repeat: int = 3, top: int = 5) -> Dict[str, Any]:
+    """在全新进程中测量模块导入耗时
+
+    Args:
+        module: 模块名
+        repeat: 重复次数，取累计耗时最小的一次
+        top: 记录累计耗时最大的前top个依赖模块
+
+    Returns:
+        包含累计耗时（毫秒）和最重依赖的字典
+    """
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+        entries = parse_importtime(result.stderr)
+        total = next(
+            (cumulative for name, _, cumulative, _ in entries if name == module),
+            sum(cumulative for _, _, cumulative, depth in entries if depth == 0),
+        )
+        if best is None or total < best[0]:
+            best = (total, entries)
+
+    total, entries = best
+    heaviest = sorted(
+        (e for e in entries if e[0] != module), key=lambda e: e[2], reverse=True
+    )[:top]
+    return {
+        "cumulative_ms": total / 1000,
+        "modules_imported": len(entries),
+        "heaviest": [
+            {"module": name, "cumulative_ms": cumulative / 1000}
+            for name, _, cumulative, _ in heaviest
+        ],
+    }
+
+
+def compare_with_baseline(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float = 0.2,
+    min_delta_ms: float = 20.0,
+) -> List[str]:
+    """找出相对基线变慢的模块
+
+    Args:
+        results: 本次测量结果
+        baseline: 基线测量结果
+        tolerance: 允许的相对增长比例
+        min_delta_ms: 低于该绝对增长（毫秒）的变化视为噪声
+
+    Returns:
+        回退描述列表
+    """
+    regressions = []
+    for module, result in results.items():
+        if module not in baseline:
+            continue
+        before = baseline[module]["cumulative_ms"]
+        after = result["cumulative_ms"]
+        if after - before > max(before * tolerance, min_delta_ms):
+            regressions.append(f"{module}: {before:.1f}ms -> {after:.1f}ms")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="测量各模块的导入耗时")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="保存结果的JSON文件")
+    parser.add_argument("--baseline", help="用于比较的基线JSON文件")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module in args.modules:
+        results[module] = measure_import_time(module, args.repeat)
+        heaviest = ", ".join(
+            f"{item['module']}({item['cumulative_ms']:.0f}ms)"
+            for item in results[module]["heaviest"][:3]
+        )
+        print(
+            f"{module:<28} {results[module]['cumulative_ms']:>9.1f}ms  最重依赖: {heaviest}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("导入耗时回退:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("与基线相比没有回退")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,115 @@
-import datasets
+import os
+from typing import Any, Dict, Iterator, Optional, Sequence, Union
 
 DS_PATH = "/mnt/data/gyzou/expr_workplace/self-agent-memory/benchmark_cache/manual_hf_download/MemoryAgentBench"
 
+# 转换后的Arrow IPC缓存，之后的运行直接内存映射读取
+ARROW_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "benchmark_cache", "ttl.arrow"
+)
+
+
+class ArrowRows(Sequence):
+    """内存映射Arrow IPC文件的惰性行视图
+
+    打开时只映射文件、不复制数据，按下标访问时才把对应行转换为字典。
+    序列化时只携带文件路径，工作进程重新映射同一文件，共享页缓存而不是复制数据。
+    """
+
+    def __init__(self, path: str, start: int = 0, stop: Optional[int] = None):
+        """打开Arrow缓存
+
+        Args:
+            path: Arrow IPC文件路径
+            start: 视图的起始行
+            stop: 视图的结束行（不含），为None时到文件末尾
+        """
+        import pyarrow as pa
+
+        self.path = path
+        self._source = pa.memory_map(path, "r")
+        table = pa.ipc.open_file(self._source).read_all()
+        stop = table.num_rows if stop is None else min(stop, table.num_rows)
+        self.start = start
+        self.stop = max(start, stop)
+        self.table = table.slice(self.start, self.stop - self.start)
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[Dict[str, Any], "ArrowRows"]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return ArrowRows(self.path, self.start + start, self.start + stop)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.table.slice(index, 1).to_pylist()[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # 按批转换，避免逐行切片的开销
+        for batch in self.table.to_batches():
+            yield from batch.to_pylist()
+
+    def __reduce__(self):
+        return (ArrowRows, (self.path, self.start, self.stop))
+
+
+def write_arrow_cache(table: Any, cache_path: str) -> str:
+    """把Arrow表写为可内存映射的IPC文件（先写临时文件再原子替换）
+
+    Args:
+        table: pyarrow.Table
+        cache_path: 缓存文件路径
+
+    Returns:
+        缓存文件路径
+    """
+    import pyarrow as pa
+
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def build_arrow_cache(cache_path: str = ARROW_CACHE_PATH) -> str:
+    """从本地数据集一次性转换出Test_Time_Learning的Arrow缓存
+
+    Args:
+        cache_path: 缓存文件路径
+
+    Returns:
+        缓存文件路径
+    """
+    # datasets较重，只在转换缓存时导入
+    import datasets
 
-def get_ttl_ds():
     ds = datasets.load_dataset(DS_PATH)
-    ttl_ds = ds["Test_Time_Learning"]
-    ttl_pd = ttl_ds.to_pandas()
-    return ttl_pd.iloc[1:].to_dict(orient="records")
+    # 与原先的iloc[1:]保持一致，跳过第一条记录
+    table = ds["Test_Time_Learning"].data.table.slice(1)
+    return write_arrow_cache(table, cache_path)
+
+
+def get_ttl_ds(cache_path: str = ARROW_CACHE_PATH, refresh: bool = False) -> ArrowRows:
+    """获取Test_Time_Learning记录，首次调用时转换为Arrow缓存
+
+    Args:
+        cache_path: 缓存文件路径
+        refresh: 是否重新转换缓存
+
+    Returns:
+        按下标访问时返回记录字典的惰性序列
+    """
+    if refresh or not os.path.exists(cache_path):
+        build_arrow_cache(cache_path)
+    return ArrowRows(cache_path)
@@ -0,0 +1,378 @@
+"""
+记忆存储的性能基准
+
+用固定随机种子生成中英文混合的合成语料，对BM25MemoryStore和GraphMemoryStore测量：
+批量导入耗时、逐条add_memory吞吐、冷启动（从磁盘重新打开存储）耗时、
+检索延迟的p50/p99以及进程峰值内存。每个（后端, 规模）组合在独立子进程中运行，
+避免内存和缓存互相影响。结果可保存为JSON，并与之前保存的基线比较。
+
+GraphMemoryStore的批量导入不建立记忆之间的关系（link=False），否则每条记忆都要扫描全图；
+逐条写入吞吐则测量包含建立关系在内的完整写入路径。
+
+用法:
+    python benchmark_case/store_benchmark.py --sizes 1000 10000 --output store_bench.json
+    python benchmark_case/store_benchmark.py --baseline store_bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+DEFAULT_BACKENDS = ["bm25", "graph"]
+# jieba词典缓存的持久目录，评测中为每条样本新建的临时存储都从这里加载词典
+TOKENIZER_CACHE_DIR = "db_cache/jieba"
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+ZH_SUBJECTS = ["用户", "我的同事", "小王", "客户", "项目经理", "老师", "朋友", "团队"]
+ZH_VERBS = ["喜欢", "讨厌", "正在学习", "计划购买", "经常使用", "推荐了", "提到了"]
+ZH_OBJECTS = [
+    "机器学习",
+    "图数据库",
+    "咖啡",
+    "篮球",
+    "旅行",
+    "深度学习框架",
+    "中文分词",
+    "向量检索",
+    "红烧肉",
+    "摄影",
+    "钢琴",
+    "自然语言处理",
+]
+EN_SUBJECTS = ["The user", "Alice", "Bob", "My manager", "The customer", "Our team"]
+EN_VERBS = [
+    "likes",
+    "prefers",
+    "is learning",
+    "plans to buy",
+    "often uses",
+    "mentioned",
+]
+EN_OBJECTS = [
+    "Python",
+    "graph databases",
+    "green tea",
+    "hiking",
+    "Rust",
+    "BM25 ranking",
+    "vector search",
+    "jazz music",
+    "mechanical keyboards",
+    "Kubernetes",
+]
+
+# 结果中越大越好的指标，其余越小越好
+HIGHER_IS_BETTER = {"batch_load_per_s", "add_per_s"}
+COMPARED_METRICS = [
+    "batch_load_per_s",
+    "add_per_s",
+    "cold_start_s",
+    "retrieve_p50_ms",
+    "retrieve_p99_ms",
+    "peak_rss_mb",
+]
+
+
+def generate_corpus(size: int, seed: int = 42) -> List[str]:
+    """生成中英文各半的合成记忆语料
+
+    Args:
+        size: 记忆条数
+        seed: 随机种子，相同种子生成相同语料
+
+    Returns:
+        记忆内容列表
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        if i % 2 == 0:
+            text = (
+                f"{rng.choice(ZH_SUBJECTS)}{rng.choice(ZH_VERBS)}"
+                f"{rng.choice(ZH_OBJECTS)}，也关注{rng.choice(ZH_OBJECTS)}"
+            )
+        else:
+            text = (
+                f"{rng.choice(EN_SUBJECTS)} {rng.choice(EN_VERBS)} "
+                f"{rng.choice(EN_OBJECTS)} and {rng.choice(EN_OBJECTS)}"
+            )
+        corpus.append(f"{text} #{i}")
+    return corpus
+
+
+def generate_queries(count: int, seed: int = 7) -> List[str]:
+    """生成检索查询，中英文各半"""
+    rng = random.Random(seed)
+    return [
+        rng.choice(ZH_OBJECTS) if i % 2 == 0 else rng.choice(EN_OBJECTS)
+        for i in range(count)
+    ]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """计算百分位数（最近秩法）
+
+    Args:
+        values: 观测值
+        p: 百分位，0-100
+
+    Returns:
+        百分位数，没有观测值时为0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位为KB，macOS上为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def init_worker_tokenizer(backend: str, cache_dir: str = TOKENIZER_CACHE_DIR) -> None:
+    """用持久的缓存目录初始化评测进程的jieba分词器
+
+    BM25存储会把自己的缓存目录设为词典缓存目录（只在词典尚未构建时生效）。
+    每条样本都在临时目录中新建存储时，需要先初始化分词器：否则词典缓存写进随后
+    被删除的临时目录，每个进程都要重新构建一次词典。
+
+    Args:
+        backend: 记忆后端，只有bm25使用分词器
+        cache_dir: 词典缓存目录
+    """
+    if backend == "bm25":
+        from misc.tokenizer import init_tokenizer
+
+        init_tokenizer(cache_dir)
+
+
+def _open_store(backend: str, work_dir: str):
+    """在工作目录中打开（或创建）指定后端的存储"""
+    if backend == "bm25":
+        from misc.memory_bm25 import BM25MemoryStore
+
+        return BM25MemoryStore(cache_dir=os.path.join(work_dir, "bm25"))
+    if backend == "graph":
+        from misc.memory_graph import GraphMemoryStore
+
+        return GraphMemoryStore(db_path=os.path.join(work_dir, "graph.kuzu"))
+    raise ValueError(f"未知的后端: {backend}")
+
+
+def _close_store(store) -> None:
+    close = getattr(store, "close", None)
+    if close is not None:
+        close()
+
+
+def run_backend(
+    backend: str,
+    size: int,
+    work_dir: str,
+    queries: int = 200,
+    add_samples: int = 50,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """在当前进程中对一个后端运行基准
+
+    Args:
+        backend: 后端名称，bm25或graph
+        size: 批量导入的记忆条数
+        work_dir: 存储数据的目录
+        queries: 检索次数
+        add_samples: 逐条写入的次数（在导入后的存储上进行）
+        seed: 语料随机种子
+
+    Returns:
+        基准结果字典
+    """
+    corpus = generate_corpus(size, seed)
+    extra = generate_corpus(add_samples, seed + 1)
+
+    start = time.perf_counter()
+    store = _open_store(backend, work_dir)
+    first_open_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if backend == "graph":
+        store.add_memories(corpus, link=False)
+    else:
+        store.add_memories(corpus)
+    batch_load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for content in extra:
+        store.add_memory(content)
+    add_s = time.perf_counter() - start
+    _close_store(store)
+
+    start = time.perf_counter()
+    store = _open_store(backend, work_dir)
+    cold_start_s = time.perf_counter() - start
+
+    latencies = []
+    for query in generate_queries(queries):
+        start = time.perf_counter()
+        store.retrieve_relevant_memories(query, 5)
+        latencies.append((time.perf_counter() - start) * 1000)
+    _close_store(store)
+
+    return {
+        "backend": backend,
+        "size": size,
+        "first_open_s": first_open_s,
+        "batch_load_s": batch_load_s,
+        "batch_load_per_s": size / batch_load_s if batch_load_s else 0.0,
+        "add_per_s": add_samples / add_s if add_s else 0.0,
+        "cold_start_s": cold_start_s,
+        "retrieve_p50_ms": percentile(latencies, 50),
+        "retrieve_p99_ms": percentile(latencies, 99),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_in_subprocess(backend: str, size: int, **kwargs: Any) -> Dict[str, Any]:
+    """在全新子进程和临时目录中运行一个后端的基准"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        args = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--worker",
+            backend,
+            str(size),
+            work_dir,
+        ]
+        for key, value in kwargs.items():
+            args += [f"--{key.replace('_', '-')}", str(value)]
+        result = subprocess.run(args, cwd=PROJECT_ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{backend}@{size} 基准失败:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare_with_baseline(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    tolerance: float = 0.2,
+) -> List[str]:
+    """找出相对基线变差的指标
+
+    Args:
+        results: 本次基准结果
+        baseline: 基线基准结果
+        tolerance: 允许的相对变化比例
+
+    Returns:
+        回退描述列表
+    """
+    before_by_key = {(item["backend"], item["size"]): item for item in baseline}
+    regressions = []
+    for item in results:
+        before = before_by_key.get((item["backend"], item["size"]))
+        if before is None:
+            continue
+        for name in COMPARED_METRICS:
+            old, new = before.get(name), item.get(name)
+            if not old or new is None:
+                continue
+            if name in HIGHER_IS_BETTER:
+                worse = new < old * (1 - tolerance)
+            else:
+                worse = new > old * (1 + tolerance)
+            if worse:
+                regressions.append(
+                    f"{item['backend']}@{item['size']} {name}: {old:.4g} -> {new:.4g}"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="记忆存储性能基准")
+    parser.add_argument("--backends", nargs="+", default=DEFAULT_BACKENDS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--add-samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="保存结果的JSON文件")
+    parser.add_argument("--baseline", help="用于比较的基线JSON文件")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--worker",
+        nargs=3,
+        metavar=("BACKEND", "SIZE", "WORK_DIR"),
+        help="内部使用：在当前进程中运行单个基准并输出JSON",
+    )
+    args = parser.parse_args(argv)
+
+    options = {
+        "queries": args.queries,
+        "add_samples": args.add_samples,
+        "seed": args.seed,
+    }
+
+    if args.worker:
+        backend, size, work_dir = args.worker
+        result = run_backend(backend, int(size), work_dir, **options)
+        print(json.dumps(result, ensure_ascii=False))
+        return 0
+
+    results = []
+    for backend in args.backends:
+        for size in args.sizes:
+            result = run_in_subprocess(backend, size, **options)
+            results.append(result)
+            print(
+                f"{backend:<6} {size:>7}  导入 {result['batch_load_per_s']:>9.0f}条/秒"
+                f"  写入 {result['add_per_s']:>7.1f}条/秒"
+                f"  冷启动 {result['cold_start_s']:>6.2f}秒"
+                f"  p50 {result['retrieve_p50_ms']:>7.2f}ms"
+                f"  p99 {result['retrieve_p99_ms']:>7.2f}ms"
+                f"  内存 {result['peak_rss_mb']:>6.0f}MB"
+            )
+
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                **options,
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("与基线相比没有回退")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
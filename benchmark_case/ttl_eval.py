@@ -0,0 +1,321 @@
+"""
+MemoryAgentBench Test_Time_Learning 的离线评测
+
+把每条记录的context按空行切分成若干示例（"文本\\nlabel: N"），写入全新的记忆存储，
+再用每个问题通过检索工具取回记忆，由确定性的本地替身LLM（对检索结果中的标签
+按排名加权投票）给出答案。不需要调用真实模型，结果可复现。
+
+报告检索recall@k（前k条记忆中包含正确标签的问题比例）、替身LLM的准确率，
+以及建库、写入、检索、作答各阶段的耗时。记录在多个工作进程中并行评测。
+
+用法:
+    python benchmark_case/ttl_eval.py --backend bm25 --workers 8 --output ttl_bm25.json
+    python benchmark_case/ttl_eval.py --data ttl_records.jsonl --limit 2 -k 1 5 10
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmark_case.memory_benchmark_dataset import ArrowRows  # noqa: E402
+from benchmark_case.store_benchmark import (  # noqa: E402
+    TOKENIZER_CACHE_DIR,
+    init_worker_tokenizer,
+)
+
+PHASES = ("setup", "ingest", "retrieve", "answer")
+LABEL_PATTERN = re.compile(r"label:\s*(\S+)")
+
+
+class StubLLM:
+    """确定性的替身LLM：对检索到的示例标签按排名加权投票"""
+
+    def answer(self, question: str, retrieved: str) -> str:
+        """根据检索工具返回的文本作答
+
+        Args:
+            question: 问题
+            retrieved: 检索工具返回的格式化记忆
+
+        Returns:
+            得票最高的标签，没有可用标签时返回空字符串
+        """
+        votes: Dict[str, float] = defaultdict(float)
+        for rank, label in enumerate(LABEL_PATTERN.findall(retrieved), 1):
+            votes[label] += 1.0 / rank
+        if not votes:
+            return ""
+        # 票数相同时取排名靠前（先出现）的标签
+        return max(votes, key=lambda label: votes[label])
+
+
+def split_examples(context: str) -> List[str]:
+    """把context切分为独立的示例
+
+    Args:
+        context: 记录中的上下文文本
+
+    Returns:
+        非空示例列表
+    """
+    return [chunk.strip() for chunk in re.split(r"\n\s*\n", context) if chunk.strip()]
+
+
+def normalize_answers(answers: Any) -> List[List[str]]:
+    """把答案统一为字符串列表的列表（datasets转换出的numpy数组也适用）"""
+    normalized = []
+    for answer in answers:
+        if isinstance(answer, str):
+            normalized.append([answer])
+        else:
+            normalized.append([str(item) for item in answer])
+    return normalized
+
+
+def load_records(data_path: Optional[str] = None) -> Sequence[Dict[str, Any]]:
+    """加载评测记录
+
+    Args:
+        data_path: JSON或JSONL文件路径，为空时通过get_ttl_ds从本地数据集加载
+
+    Returns:
+        包含context、questions、answers的记录列表
+    """
+    if data_path is None:
+        from benchmark_case.memory_benchmark_dataset import get_ttl_ds
+
+        # 返回内存映射的Arrow缓存视图，记录在访问时才转换
+        return get_ttl_ds()
+
+    with open(data_path, "r", encoding="utf-8") as f:
+        if data_path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def _create_tools(backend: str, work_dir: str):
+    """在工作目录中创建指定后端的记忆工具（不启用检索缓存）"""
+    if backend == "bm25":
+        from misc.memory_bm25 import create_memory_tools
+
+        return create_memory_tools(cache_dir=work_dir, cache_size=0)
+    if backend == "graph":
+        from misc.memory_graph import create_memory_tools
+
+        return create_memory_tools(
+            db_path=os.path.join(work_dir, "memory.kuzu"), cache_size=0
+        )
+    if backend == "vector":
+        from misc.memory_vector import create_memory_tools
+
+        return create_memory_tools(cache_dir=work_dir, cache_size=0)
+    raise ValueError(f"未知的后端: {backend}")
+
+
+def _release_tools(backend: str, save_tool) -> None:
+    if backend == "graph":
+        from misc.memory_graph import release_graph_store
+
+        release_graph_store(save_tool.memory_store)
+
+
+def evaluate_record(
+    record: Dict[str, Any],
+    backend: str = "bm25",
+    ks: Sequence[int] = (1, 5, 10),
+    ingest: str = "batch",
+    max_questions: Optional[int] = None,
+) -> Dict[str, Any]:
+    """评测单条记录
+
+    Args:
+        record: 包含context、questions、answers的记录
+        backend: 记忆后端，bm25、graph或vector
+        ks: 计算recall@k的k值
+        ingest: batch表示一次性批量写入，tool表示逐条调用保存工具
+        max_questions: 每条记录最多评测的问题数
+
+    Returns:
+        该记录的命中数、问题数和各阶段耗时
+    """
+    examples = split_examples(record["context"])
+    questions = list(record["questions"])
+    answers = normalize_answers(record["answers"])
+    if max_questions is not None:
+        questions, answers = questions[:max_questions], answers[:max_questions]
+
+    llm = StubLLM()
+    max_k = max(ks)
+    timings = dict.fromkeys(PHASES, 0.0)
+    hits = dict.fromkeys(ks, 0)
+    correct = 0
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        save_tool, retrieve_tool = _create_tools(backend, work_dir)
+        timings["setup"] = time.perf_counter() - start
+
+        try:
+            start = time.perf_counter()
+            if ingest == "batch":
+                save_tool.memory_store.add_memories(examples)
+            else:
+                for example in examples:
+                    save_tool._run(example)
+            timings["ingest"] = time.perf_counter() - start
+
+            for question, gold in zip(questions, answers):
+                start = time.perf_counter()
+                retrieved = retrieve_tool._run(question, max_k)
+                timings["retrieve"] += time.perf_counter() - start
+
+                # 检索工具按排名输出记忆，逐条提取标签计算recall@k
+                labels = LABEL_PATTERN.findall(retrieved)
+                for k in ks:
+                    if any(label in gold for label in labels[:k]):
+                        hits[k] += 1
+
+                start = time.perf_counter()
+                prediction = llm.answer(question, retrieved)
+                timings["answer"] += time.perf_counter() - start
+                if prediction in gold:
+                    correct += 1
+        finally:
+            _release_tools(backend, save_tool)
+
+    return {
+        "examples": len(examples),
+        "questions": len(questions),
+        "hits": hits,
+        "correct": correct,
+        "timings": timings,
+    }
+
+
+def _evaluate_indexed(args: Tuple[int, Any, Dict[str, Any]]):
+    index, source, options = args
+    record = source[index] if isinstance(source, ArrowRows) else source
+    return index, evaluate_record(record, **options)
+
+
+def run_evaluation(
+    records: Sequence[Dict[str, Any]],
+    workers: int = 1,
+    tokenizer_cache_dir: str = TOKENIZER_CACHE_DIR,
+    **options: Any,
+) -> Dict[str, Any]:
+    """评测所有记录并汇总结果
+
+    Args:
+        records: 评测记录
+        workers: 工作进程数，为1时在当前进程中顺序评测
+        tokenizer_cache_dir: jieba词典缓存目录，每个进程只从这里加载一次词典
+        options: 传给evaluate_record的参数
+
+    Returns:
+        汇总后的recall@k、准确率、阶段耗时和每条记录的结果
+    """
+    if isinstance(records, ArrowRows):
+        # Arrow缓存只序列化文件路径，工作进程映射同一文件按下标读取，不复制记录
+        tasks = [(i, records, options) for i in range(len(records))]
+    else:
+        tasks = [(i, record, options) for i, record in enumerate(records)]
+    # 先在当前进程中构建词典缓存，工作进程启动时直接从缓存加载
+    backend = options.get("backend", "bm25")
+    init_worker_tokenizer(backend, tokenizer_cache_dir)
+    if workers <= 1:
+        per_record = [_evaluate_indexed(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker_tokenizer,
+            initargs=(backend, tokenizer_cache_dir),
+        ) as executor:
+            per_record = list(executor.map(_evaluate_indexed, tasks))
+    per_record = [result for _, result in sorted(per_record, key=lambda r: r[0])]
+
+    total_questions = sum(r["questions"] for r in per_record)
+    ks = list(per_record[0]["hits"]) if per_record else []
+    timings = {phase: sum(r["timings"][phase] for r in per_record) for phase in PHASES}
+    return {
+        "records": len(per_record),
+        "questions": total_questions,
+        "recall_at_k": {
+            str(k): (
+                sum(r["hits"][k] for r in per_record) / total_questions
+                if total_questions
+                else 0.0
+            )
+            for k in ks
+        },
+        "accuracy": (
+            sum(r["correct"] for r in per_record) / total_questions
+            if total_questions
+            else 0.0
+        ),
+        "timings_s": timings,
+        "per_record": per_record,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Test_Time_Learning离线评测")
+    parser.add_argument("--data", help="JSON/JSONL记录文件，默认读取本地数据集")
+    parser.add_argument(
+        "--backend", default="bm25", choices=["bm25", "graph", "vector"]
+    )
+    parser.add_argument("-k", nargs="+", type=int, default=[1, 5, 10], dest="ks")
+    parser.add_argument("--ingest", default="batch", choices=["batch", "tool"])
+    parser.add_argument("--limit", type=int, help="最多评测的记录数")
+    parser.add_argument("--max-questions", type=int, help="每条记录最多评测的问题数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="保存结果的JSON文件")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.data)
+    if args.limit is not None:
+        records = records[: args.limit]
+
+    start = time.perf_counter()
+    summary = run_evaluation(
+        records,
+        workers=args.workers,
+        backend=args.backend,
+        ks=args.ks,
+        ingest=args.ingest,
+        max_questions=args.max_questions,
+    )
+    summary["wall_time_s"] = time.perf_counter() - start
+
+    print(
+        f"后端: {args.backend}  记录: {summary['records']}  问题: {summary['questions']}"
+    )
+    for k, recall in summary["recall_at_k"].items():
+        print(f"  recall@{k}: {recall:.4f}")
+    print(f"  替身LLM准确率: {summary['accuracy']:.4f}")
+    for phase, seconds in summary["timings_s"].items():
+        print(f"  {phase:<8} {seconds:>9.2f}秒")
+    print(f"  总耗时 {summary['wall_time_s']:.2f}秒")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,65 @@
 import json
 import os
-from typing import List, Dict, Any, Optional
+import re
+from typing import Iterable, Iterator, List, Dict, Any, Optional
+
+SPLITS = ("train", "dev", "test")
+
+
+# 数字和true/false/null没有结束符，遇到其后的分隔符才能确定已经读完
+_SCALAR_END = re.compile(r"[,\]\s]")
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    逐条解析顶层为JSON数组的文件，每次只读入chunk_size个字符，不把整个文件载入内存
+
+    参数:
+        path: JSON文件路径
+        chunk_size: 每次读取的字符数
+
+    返回:
+        数组元素的迭代器
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # 跳过空白、数组起始符和元素间的逗号
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+                if buffer[pos] == "[":
+                    if started:
+                        break
+                    started = True
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            # 对象、数组和字符串不完整时解析出错，读入下一块后重试；
+            # 标量在块边界被截断时仍能解析出前缀（如1.5截成1.），要等到分隔符出现
+            if pos < len(buffer) and (
+                eof or buffer[pos] in '{["' or _SCALAR_END.search(buffer, pos)
+            ):
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield item
+                    pos = end
+                    continue
+
+            if eof:
+                return
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
 
 
 class WikiHopQADataset:
@@ -73,6 +132,114 @@ class WikiHopQADataset:
         else:
             raise ValueError(f"无效的分割名称: {split}")
 
+    def _split_path(self, split: str) -> str:
+        if split not in SPLITS:
+            raise ValueError(f"无效的分割名称: {split}")
+        return os.path.join(self.data_dir, f"{split}.json")
+
+    def iter_data(
+        self,
+        split: str,
+        shard_index: int = 0,
+        num_shards: int = 1,
+        cache_dir: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        流式读取指定分割的数据，不把整个文件载入内存
+
+        参数:
+            split: 数据分割，可以是"train", "dev"或"test"
+            shard_index: 当前工作进程的分片序号
+            num_shards: 分片总数，第i条记录属于第 i % num_shards 个分片
+            cache_dir: JSONL缓存目录，给定时先转换为每行一条记录的缓存，之后按行读取
+
+        返回:
+            记录迭代器
+        """
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"无效的分片: {shard_index}/{num_shards}")
+
+        if cache_dir is not None:
+            cache_path = self.build_jsonl_cache(split, cache_dir)
+            with open(cache_path, "r", encoding="utf-8") as f:
+                for i, line in enumerate(f):
+                    # 不属于当前分片的行不做解析
+                    if i % num_shards == shard_index:
+                        yield json.loads(line)
+            return
+
+        for i, record in enumerate(iter_json_array(self._split_path(split))):
+            if i % num_shards == shard_index:
+                yield record
+
+    def build_jsonl_cache(self, split: str, cache_dir: str) -> str:
+        """
+        把分割文件转换为JSONL缓存，缓存已存在且不旧于源文件时直接复用
+
+        参数:
+            split: 数据分割
+            cache_dir: 缓存目录
+
+        返回:
+            缓存文件路径
+        """
+        source_path = self._split_path(split)
+        cache_path = os.path.join(cache_dir, f"{split}.jsonl")
+        if os.path.exists(cache_path) and os.path.getmtime(
+            cache_path
+        ) >= os.path.getmtime(source_path):
+            return cache_path
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # 多个工作进程可能同时转换，各自写临时文件后原子替换
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in iter_json_array(source_path):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, cache_path)
+        return cache_path
+
+
+def context_paragraphs(record: Dict[str, Any]) -> List[str]:
+    """
+    把样本context中的每个段落转换为一条记忆文本
+
+    参数:
+        record: WikiHop样本
+
+    返回:
+        "标题: 段落" 形式的文本列表
+    """
+    return [f"{title}: {' '.join(sentences)}" for title, sentences in record["context"]]
+
+
+def ingest_records(
+    records: Iterable[Dict[str, Any]], memory_store: Any, batch_size: int = 1000
+) -> int:
+    """
+    把流式读取的样本段落按批写入记忆存储
+
+    参数:
+        records: 样本迭代器，例如iter_data的返回值
+        memory_store: 提供add_memories批量写入接口的记忆存储
+        batch_size: 每批写入的段落数
+
+    返回:
+        写入的段落数
+    """
+    total = 0
+    batch: List[str] = []
+    for record in records:
+        batch.extend(context_paragraphs(record))
+        if len(batch) >= batch_size:
+            memory_store.add_memories(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        memory_store.add_memories(batch)
+        total += len(batch)
+    return total
+
 
 # 使用示例
 if __name__ == "__main__":
@@ -0,0 +1,299 @@
+"""
+WikiHop多跳检索基准
+
+对每个样本新建一个记忆存储，把context中的段落批量写入，先用问题检索，再用
+evidences中每一跳的"主语 关系"作为查询继续检索，统计支持事实（supporting_facts）
+所在段落被检索到的比例，以及写入和检索的延迟。数据按工作进程分片流式读取，
+样本在多个进程中并行评测。
+
+用法:
+    python benchmark_case/wikihop_eval.py --data-dir /path/to/2wikihopqa/data --limit 1000
+    python benchmark_case/wikihop_eval.py --data-dir ... --backends bm25 vector -k 3 --output wikihop.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmark_case.store_benchmark import (  # noqa: E402
+    TOKENIZER_CACHE_DIR,
+    init_worker_tokenizer,
+    percentile,
+)
+from benchmark_case.wikihop_dataset import (  # noqa: E402
+    WikiHopQADataset,
+    context_paragraphs,
+)
+from misc.utils import relevant_memories  # noqa: E402
+
+DEFAULT_BACKENDS = ["bm25", "graph", "vector"]
+
+
+def _open_store(backend: str, work_dir: str):
+    """在工作目录中创建指定后端的记忆存储"""
+    if backend == "bm25":
+        from misc.memory_bm25 import BM25MemoryStore
+
+        return BM25MemoryStore(cache_dir=work_dir)
+    if backend == "graph":
+        from misc.memory_graph import GraphMemoryStore
+
+        return GraphMemoryStore(db_path=os.path.join(work_dir, "memory.kuzu"))
+    if backend == "vector":
+        from misc.memory_vector import VectorMemoryStore
+
+        return VectorMemoryStore(cache_dir=work_dir)
+    raise ValueError(f"未知的后端: {backend}")
+
+
+def hop_queries(record: Dict[str, Any]) -> List[str]:
+    """根据evidences三元组生成每一跳的查询
+
+    Args:
+        record: WikiHop样本
+
+    Returns:
+        "主语 关系" 形式的查询列表
+    """
+    return [
+        f"{subject} {relation}" for subject, relation, _ in record.get("evidences", [])
+    ]
+
+
+def evaluate_example(
+    record: Dict[str, Any], backend: str = "bm25", k: int = 5
+) -> Dict[str, Any]:
+    """在全新的存储上评测一个样本
+
+    Args:
+        record: WikiHop样本
+        backend: 记忆后端，bm25、graph或vector
+        k: 每次检索返回的记忆条数
+
+    Returns:
+        支持事实命中数和各次操作的延迟
+    """
+    titles = [title for title, _ in record["context"]]
+    gold = {title for title, _ in record["supporting_facts"]}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = _open_store(backend, work_dir)
+        try:
+            start = time.perf_counter()
+            if backend == "graph":
+                memory_ids = store.add_memories(context_paragraphs(record), link=False)
+            else:
+                memory_ids = store.add_memories(context_paragraphs(record))
+            ingest_ms = (time.perf_counter() - start) * 1000
+            id_to_title = dict(zip(memory_ids, titles))
+
+            query_ms = []
+
+            def retrieve(query: str) -> set:
+                start = time.perf_counter()
+                memories = store.retrieve_relevant_memories(query, k)
+                query_ms.append((time.perf_counter() - start) * 1000)
+                # 不足k条匹配时补足的0分记忆和占位记忆不算检索到
+                memories = relevant_memories(memories)
+                return {id_to_title.get(memory["id"]) for memory in memories}
+
+            found_by_question = retrieve(record["question"])
+            found_with_hops = set(found_by_question)
+            for query in hop_queries(record):
+                found_with_hops |= retrieve(query)
+        finally:
+            close = getattr(store, "close", None)
+            if close is not None:
+                close()
+
+    return {
+        "id": record.get("_id"),
+        "type": record.get("type"),
+        "supporting": len(gold),
+        "hits_question": len(gold & found_by_question),
+        "hits_with_hops": len(gold & found_with_hops),
+        "ingest_ms": ingest_ms,
+        "query_ms": query_ms,
+    }
+
+
+def evaluate_shard(
+    data_dir: str,
+    split: str,
+    shard_index: int,
+    num_shards: int,
+    backend: str = "bm25",
+    k: int = 5,
+    limit: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """流式读取一个分片并逐个样本评测
+
+    Args:
+        data_dir: 包含train.json, dev.json和test.json的目录
+        split: 数据分割
+        shard_index: 分片序号
+        num_shards: 分片总数
+        backend: 记忆后端
+        k: 每次检索返回的记忆条数
+        limit: 全部分片合计最多评测的样本数（按原始顺序取前limit条）
+        cache_dir: JSONL缓存目录
+
+    Returns:
+        每个样本的评测结果
+    """
+    dataset = WikiHopQADataset(data_dir)
+    results = []
+    for j, record in enumerate(
+        dataset.iter_data(split, shard_index, num_shards, cache_dir=cache_dir)
+    ):
+        if limit is not None and shard_index + j * num_shards >= limit:
+            break
+        results.append(evaluate_example(record, backend, k))
+    return results
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总样本结果
+
+    Args:
+        results: evaluate_example的结果列表
+
+    Returns:
+        支持事实召回率和延迟统计
+    """
+    supporting = sum(r["supporting"] for r in results)
+    ingest_ms = [r["ingest_ms"] for r in results]
+    query_ms = [ms for r in results for ms in r["query_ms"]]
+    return {
+        "examples": len(results),
+        "sf_recall_question": (
+            sum(r["hits_question"] for r in results) / supporting if supporting else 0.0
+        ),
+        "sf_recall_with_hops": (
+            sum(r["hits_with_hops"] for r in results) / supporting
+            if supporting
+            else 0.0
+        ),
+        "ingest_p50_ms": percentile(ingest_ms, 50),
+        "ingest_p99_ms": percentile(ingest_ms, 99),
+        "query_p50_ms": percentile(query_ms, 50),
+        "query_p99_ms": percentile(query_ms, 99),
+    }
+
+
+def run_benchmark(
+    data_dir: str,
+    split: str = "dev",
+    backend: str = "bm25",
+    k: int = 5,
+    limit: Optional[int] = None,
+    workers: int = 1,
+    cache_dir: Optional[str] = None,
+    tokenizer_cache_dir: str = TOKENIZER_CACHE_DIR,
+) -> Dict[str, Any]:
+    """在多个进程中按分片评测一个后端
+
+    Args:
+        data_dir: 数据目录
+        split: 数据分割
+        backend: 记忆后端
+        k: 每次检索返回的记忆条数
+        limit: 最多评测的样本数
+        workers: 工作进程数（也是分片数），为1时在当前进程中评测
+        cache_dir: JSONL缓存目录，多进程时建议提供，避免每个进程都解析一遍JSON
+        tokenizer_cache_dir: jieba词典缓存目录，每个进程只从这里加载一次词典
+
+    Returns:
+        汇总结果
+    """
+    start = time.perf_counter()
+    # 先在当前进程中构建词典缓存，工作进程启动时直接从缓存加载
+    init_worker_tokenizer(backend, tokenizer_cache_dir)
+    if workers <= 1:
+        results = evaluate_shard(data_dir, split, 0, 1, backend, k, limit, cache_dir)
+    else:
+        if cache_dir is not None:
+            # 先在主进程中生成缓存，避免各工作进程重复转换
+            WikiHopQADataset(data_dir).build_jsonl_cache(split, cache_dir)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker_tokenizer,
+            initargs=(backend, tokenizer_cache_dir),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    evaluate_shard,
+                    data_dir,
+                    split,
+                    shard_index,
+                    workers,
+                    backend,
+                    k,
+                    limit,
+                    cache_dir,
+                )
+                for shard_index in range(workers)
+            ]
+            results = [r for future in futures for r in future.result()]
+
+    summary = summarize(results)
+    summary["backend"] = backend
+    summary["wall_time_s"] = time.perf_counter() - start
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="WikiHop多跳检索基准")
+    parser.add_argument("--data-dir", required=True, help="2WikiMultihopQA数据目录")
+    parser.add_argument("--split", default="dev", choices=["train", "dev", "test"])
+    parser.add_argument("--backends", nargs="+", default=DEFAULT_BACKENDS)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--limit", type=int, help="最多评测的样本数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache-dir", help="JSONL缓存目录")
+    parser.add_argument("--output", help="保存结果的JSON文件")
+    args = parser.parse_args(argv)
+
+    summaries = []
+    for backend in args.backends:
+        summary = run_benchmark(
+            args.data_dir,
+            args.split,
+            backend,
+            args.k,
+            args.limit,
+            args.workers,
+            args.cache_dir,
+        )
+        summaries.append(summary)
+        print(
+            f"{backend:<6} 样本 {summary['examples']:>6}"
+            f"  支持事实召回 {summary['sf_recall_question']:.4f}"
+            f" (含多跳 {summary['sf_recall_with_hops']:.4f})"
+            f"  写入p50 {summary['ingest_p50_ms']:.2f}ms"
+            f"  检索p50 {summary['query_p50_ms']:.2f}ms"
+            f"  p99 {summary['query_p99_ms']:.2f}ms"
+            f"  总耗时 {summary['wall_time_s']:.1f}秒"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
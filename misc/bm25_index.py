@@ -0,0 +1,229 @@
+"""
+整数ID倒排索引上的BM25Okapi打分
+
+词项映射为整数ID，每个词项的倒排表是两个array（文档ID和词频），内存中不保存记忆原文
+和分词结果。打分与rank_bm25.BM25Okapi一致：idf = log(N - n + 0.5) - log(n + 0.5)，
+为负的idf替换为 epsilon × 平均idf。平均idf由"文档频率 → 词项数"的直方图计算，
+不需要在每次写入后遍历全部词表。
+
+删除文档时只把文档标记为失效并扣减文档频率，倒排表中的条目在检索时跳过，
+失效文档过多时由compact统一重新编号。
+"""
+
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class BM25Index:
+    """按文档ID增量维护的BM25倒排索引"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        """初始化空索引
+
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+            epsilon: 负idf的下限系数
+        """
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self._vocab: Dict[str, int] = {}
+        self._postings: List[array] = []  # 词项ID -> 文档ID
+        self._freqs: List[array] = []  # 词项ID -> 词频，与_postings一一对应
+        self._df = array("I")  # 词项ID -> 包含该词项的有效文档数
+        self._df_hist: Dict[int, int] = {}  # 文档频率 -> 词项数
+
+        self._doc_len = array("I")
+        self._live = bytearray()
+        self.num_docs = 0
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    @property
+    def size(self) -> int:
+        """已分配的文档ID数（含失效文档）"""
+        return len(self._doc_len)
+
+    @property
+    def dead(self) -> int:
+        """已失效但尚未压缩的文档数"""
+        return self.size - self.num_docs
+
+    def is_live(self, doc: int) -> bool:
+        """文档是否有效"""
+        return 0 <= doc < self.size and bool(self._live[doc])
+
+    def _set_df(self, term: int, df: int) -> None:
+        """修改词项的文档频率并同步直方图"""
+        old = self._df[term]
+        if old:
+            self._df_hist[old] -= 1
+            if not self._df_hist[old]:
+                del self._df_hist[old]
+        if df:
+            self._df_hist[df] = self._df_hist.get(df, 0) + 1
+        self._df[term] = df
+
+    @staticmethod
+    def _count(tokens: Iterable[str]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        return counts
+
+    def add(self, tokens: List[str]) -> int:
+        """加入一篇文档
+
+        Args:
+            tokens: 分词结果
+
+        Returns:
+            新文档的ID（按加入顺序递增）
+        """
+        doc = self.size
+        for token, tf in self._count(tokens).items():
+            term = self._vocab.get(token)
+            if term is None:
+                term = len(self._postings)
+                self._vocab[token] = term
+                self._postings.append(array("I"))
+                self._freqs.append(array("I"))
+                self._df.append(0)
+            self._postings[term].append(doc)
+            self._freqs[term].append(tf)
+            self._set_df(term, self._df[term] + 1)
+        self._doc_len.append(len(tokens))
+        self._live.append(1)
+        self.num_docs += 1
+        self.total_len += len(tokens)
+        return doc
+
+    def remove(self, doc: int, tokens: List[str]) -> None:
+        """把文档标记为失效
+
+        Args:
+            doc: 文档ID
+            tokens: 文档加入时的分词结果，用于扣减文档频率
+        """
+        if not self.is_live(doc):
+            return
+        for token in self._count(tokens):
+            term = self._vocab.get(token)
+            if term is not None and self._df[term]:
+                self._set_df(term, self._df[term] - 1)
+        self._live[doc] = 0
+        self.num_docs -= 1
+        self.total_len -= self._doc_len[doc]
+
+    def average_idf(self) -> float:
+        """有效词表上的平均idf（含负值），与BM25Okapi的average_idf一致"""
+        vocab_size = sum(self._df_hist.values())
+        if not vocab_size:
+            return 0.0
+        idf_sum = sum(
+            count * (math.log(self.num_docs - df + 0.5) - math.log(df + 0.5))
+            for df, count in self._df_hist.items()
+        )
+        return idf_sum / vocab_size
+
+    def score(self, tokens: List[str]) -> Dict[int, float]:
+        """对包含查询词项的有效文档打分
+
+        Args:
+            tokens: 查询的分词结果，重复的词项重复计分
+
+        Returns:
+            文档ID到分数的映射，不包含任何查询词项的文档分数为0，不出现在结果中
+        """
+        scores: Dict[int, float] = {}
+        if not self.num_docs:
+            return scores
+        n = self.num_docs
+        avgdl = self.total_len / n
+        eps: Optional[float] = None
+        k1, b = self.k1, self.b
+        doc_len, live = self._doc_len, self._live
+
+        for token in tokens:
+            term = self._vocab.get(token)
+            if term is None or not self._df[term]:
+                continue
+            df = self._df[term]
+            idf = math.log(n - df + 0.5) - math.log(df + 0.5)
+            if idf < 0:
+                if eps is None:
+                    eps = self.epsilon * self.average_idf()
+                idf = eps
+            for doc, tf in zip(self._postings[term], self._freqs[term]):
+                if not live[doc]:
+                    continue
+                scores[doc] = scores.get(doc, 0.0) + idf * (
+                    tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[doc] / avgdl))
+                )
+        return scores
+
+    def rank(self, scores: Dict[int, float], limit: int) -> List[Tuple[int, float]]:
+        """按分数取前limit篇有效文档
+
+        排序与对全部文档打分后稳定排序一致：分数相同时文档ID小的在前，
+        不包含查询词项的文档以0分参与排序。
+
+        Args:
+            scores: score返回的文档分数
+            limit: 返回的文档数
+
+        Returns:
+            文档ID和分数列表
+        """
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        positives = [item for item in ranked if item[1] > 0]
+        if len(positives) >= limit:
+            return positives[:limit]
+
+        results = positives
+        for doc in range(self.size):
+            if len(results) >= limit:
+                break
+            if self._live[doc] and scores.get(doc, 0.0) == 0:
+                results.append((doc, 0.0))
+        results.extend(item for item in ranked if item[1] < 0)
+        return results[:limit]
+
+    def compact(self) -> List[int]:
+        """丢弃失效文档并按原顺序重新编号
+
+        Returns:
+            保留的旧文档ID列表，新ID为其在列表中的下标
+        """
+        keep = [doc for doc in range(self.size) if self._live[doc]]
+        new_id = array("i", [-1]) * self.size
+        for new, old in enumerate(keep):
+            new_id[old] = new
+
+        vocab: Dict[str, int] = {}
+        postings: List[array] = []
+        freqs: List[array] = []
+        df = array("I")
+        for token, term in self._vocab.items():
+            if not self._df[term]:
+                continue
+            docs = array("I")
+            tfs = array("I")
+            for doc, tf in zip(self._postings[term], self._freqs[term]):
+                if new_id[doc] >= 0:
+                    docs.append(new_id[doc])
+                    tfs.append(tf)
+            vocab[token] = len(postings)
+            postings.append(docs)
+            freqs.append(tfs)
+            df.append(self._df[term])
+
+        self._vocab, self._postings, self._freqs, self._df = vocab, postings, freqs, df
+        self._doc_len = array("I", (self._doc_len[doc] for doc in keep))
+        self._live = bytearray(b"\x01") * len(keep)
+        return keep
@@ -0,0 +1,124 @@
+"""
+通过mmap按(偏移, 长度)读取只追加记忆文件中的记录
+
+记忆原文只保存在磁盘文件中，由操作系统的页缓存按需换入换出。文件只会在末尾追加或被
+整体替换：追加后读取超出映射范围时重新映射，文件被替换后由调用方调用reopen。
+
+记录按行分隔、字段按制表符分隔，写入前用escape_field转义字段中的换行符、回车符、
+制表符和反斜杠，读取后用unescape_field还原。
+"""
+
+import mmap
+import os
+import re
+import threading
+from typing import Optional
+
+_ESCAPES = {"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_UNESCAPES = {"\\": "\\", "n": "\n", "r": "\r", "t": "\t"}
+_escape_pattern = re.compile(r"[\\\n\r\t]")
+_unescape_pattern = re.compile(r"\\(.)")
+
+
+def escape_field(text: str) -> str:
+    """转义记录字段，结果中不含换行符、回车符和制表符
+
+    Args:
+        text: 字段原文
+
+    Returns:
+        转义后的字段
+    """
+    return _escape_pattern.sub(lambda m: _ESCAPES[m.group()], text)
+
+
+def unescape_field(text: str) -> str:
+    """还原escape_field转义的字段，无法识别的转义序列原样保留
+
+    Args:
+        text: 转义后的字段
+
+    Returns:
+        字段原文
+    """
+    if "\\" not in text:
+        return text
+    return _unescape_pattern.sub(lambda m: _UNESCAPES.get(m.group(1), m.group()), text)
+
+
+class ContentLog:
+    """只读映射的记忆文件"""
+
+    def __init__(self, path: str):
+        """打开并映射文件，文件不存在时在首次reopen后映射
+
+        Args:
+            path: 记忆文件路径
+        """
+        self.path = path
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        self.reopen()
+
+    @property
+    def mapped_size(self) -> int:
+        """当前映射的字节数"""
+        return len(self._map) if self._map is not None else 0
+
+    def _unmap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _remap(self) -> None:
+        """按文件当前大小重新映射，空文件不映射"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None and os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def reopen(self) -> None:
+        """文件被整体替换后重新打开"""
+        with self._lock:
+            self._unmap()
+            try:
+                self._file = open(self.path, "rb")
+            except FileNotFoundError:
+                return
+            self._remap()
+
+    def read(self, offset: int, length: int) -> bytes:
+        """读取一段记录
+
+        Args:
+            offset: 起始偏移（字节）
+            length: 长度（字节）
+
+        Returns:
+            记录的字节内容
+        """
+        if length == 0:
+            return b""
+        with self._lock:
+            if offset + length > self.mapped_size:
+                if self._file is None:
+                    raise ValueError(f"记忆文件未打开: {self.path}")
+                self._remap()
+                if offset + length > self.mapped_size:
+                    raise ValueError(f"读取超出记忆文件末尾: {offset}+{length}")
+            return self._map[offset : offset + length]
+
+    def stat(self) -> Optional[os.stat_result]:
+        """已打开文件的状态，文件不存在时返回None"""
+        with self._lock:
+            return os.fstat(self._file.fileno()) if self._file is not None else None
+
+    def close(self) -> None:
+        """关闭映射和文件"""
+        with self._lock:
+            self._unmap()
@@ -0,0 +1,130 @@
+"""
+按token预算打包检索结果
+
+检索工具的输出会直接进入下游LLM的提示词。打包时按排名依次放入记忆，
+过长的记忆只保留查询词附近的片段，超出预算的记忆不再输出，只报告条数。
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from misc.utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 单条记忆的预算低于该值时不再放入，避免输出只剩省略号的片段
+MIN_MEMORY_TOKENS = 16
+
+_TERM_PATTERN = re.compile(r"[\u4e00-\u9fff]+|[^\W\u4e00-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]")
+
+
+class PackedMemories(NamedTuple):
+    """打包结果"""
+
+    text: str
+    included: int
+    dropped: int
+    truncated: int
+
+
+def query_terms(query: str) -> List[str]:
+    """提取用于定位片段的查询词，连续的中文按二元组切分，不依赖分词器
+
+    Args:
+        query: 查询字符串
+
+    Returns:
+        小写的查询词列表
+    """
+    terms = []
+    for run in _TERM_PATTERN.findall(query.lower()):
+        if _CJK_PATTERN.match(run) and len(run) > 2:
+            terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+        elif len(run) >= 2 or _CJK_PATTERN.match(run):
+            terms.append(run)
+    return terms
+
+
+def snippet(text: str, terms: List[str], max_tokens: int) -> str:
+    """把过长的文本截取为查询词附近的片段
+
+    Args:
+        text: 记忆内容
+        terms: 查询词
+        max_tokens: 片段的token上限
+
+    Returns:
+        不超过上限时原样返回，否则返回带省略号的片段
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+
+    max_chars = max(1, len(text) * max_tokens // tokens)
+    lower = text.lower()
+    positions = [pos for pos in (lower.find(term) for term in terms) if pos >= 0]
+    center = min(positions) if positions else 0
+
+    # 命中位置之前留三分之一的窗口作为上下文
+    start = max(0, min(center - max_chars // 3, len(text) - max_chars))
+    end = start + max_chars
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    return f"{prefix}{text[start:end]}{suffix}"
+
+
+def pack_memories(
+    memories: List[Dict[str, Any]],
+    query: str,
+    format_memory: Callable[[int, Dict[str, Any], str], str],
+    token_budget: int = 1000,
+    max_memory_tokens: int = 300,
+) -> PackedMemories:
+    """按排名把记忆打包为不超过token预算的文本
+
+    Args:
+        memories: 按相关性排序的记忆
+        query: 查询字符串，用于定位长记忆中的片段
+        format_memory: 格式化单条记忆的函数，参数为(序号, 记忆, 截取后的内容)
+        token_budget: 输出文本的token预算
+        max_memory_tokens: 单条记忆内容的token上限
+
+    Returns:
+        打包结果，包含输出文本以及放入、丢弃和截断的条数
+    """
+    if not memories:
+        return PackedMemories("没有找到相关记忆。", 0, 0, 0)
+
+    terms = query_terms(query)
+    # 为标题和结尾的丢弃说明预留空间
+    remaining = token_budget - 40
+    items = []
+    truncated = 0
+
+    for i, memory in enumerate(memories, 1):
+        limit = min(max_memory_tokens, remaining)
+        if limit < MIN_MEMORY_TOKENS:
+            break
+        try:
+            content = str(memory["content"])
+            packed = snippet(content, terms, limit)
+            item = format_memory(i, memory, packed)
+        except Exception as e:
+            logger.error("格式化记忆时出错: %s", e)
+            packed = content = ""
+            item = f"{i}. 记忆格式化错误: {str(memory)[:200]}"
+        cost = estimate_tokens(item)
+        if cost > remaining and items:
+            break
+        items.append(f"{item}\n\n")
+        remaining -= cost
+        if packed != content:
+            truncated += 1
+
+    dropped = len(memories) - len(items)
+    parts = [f"找到以下相关记忆 (共{len(items)}条):\n\n", *items]
+    if dropped:
+        parts.append(f"（另有{dropped}条相关记忆因长度限制未显示）\n")
+    return PackedMemories("".join(parts), len(items), dropped, truncated)
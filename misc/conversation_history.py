@@ -0,0 +1,202 @@
+"""
+按token预算保留对话窗口的历史管理器
+
+超出预算时从最早的一轮对话开始淘汰，被淘汰的对话（可选先摘要）通过记忆保存工具
+写入记忆库，之后Agent可以用检索工具按需取回。
+"""
+
+import json
+import logging
+from typing import Any, Callable, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from misc.utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 每条消息的角色标记等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """估计一条消息占用的token数
+
+    Args:
+        message: 消息
+
+    Returns:
+        估计的token数，包含工具调用参数
+    """
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(
+            tool_call["name"] + json.dumps(tool_call["args"], ensure_ascii=False)
+        )
+    return tokens
+
+
+def format_turn(turn: List[BaseMessage]) -> str:
+    """把一轮对话格式化为保存到记忆库的文本，省略工具调用过程
+
+    Args:
+        turn: 一轮对话的消息
+
+    Returns:
+        "用户: ...\\n助手: ..." 形式的文本
+    """
+    lines = []
+    for message in turn:
+        if isinstance(message, ToolMessage) or not isinstance(message.content, str):
+            continue
+        if not message.content.strip():
+            continue
+        if isinstance(message, HumanMessage):
+            lines.append(f"用户: {message.content}")
+        elif isinstance(message, AIMessage):
+            lines.append(f"助手: {message.content}")
+    return "\n".join(lines)
+
+
+def single_line(text: str) -> str:
+    """把多行文本合并为一行
+
+    BM25记忆文件每行一条记录、以制表符分隔ID和内容，保存前需要去掉换行和制表符。
+
+    Args:
+        text: 文本
+
+    Returns:
+        各行以" / "连接的单行文本
+    """
+    lines = (line.replace("\t", " ").strip() for line in text.splitlines())
+    return " / ".join(line for line in lines if line)
+
+
+def make_llm_summarizer(llm: Any) -> Callable[[str], str]:
+    """用语言模型把被淘汰的对话压缩为一段摘要
+
+    Args:
+        llm: 支持invoke的LangChain聊天模型
+
+    Returns:
+        接收对话文本、返回摘要的函数
+    """
+
+    def summarize(text: str) -> str:
+        prompt = (
+            "请把下面这段对话压缩为一段简洁的摘要，保留用户的偏好、事实和结论：\n\n"
+            f"{text}"
+        )
+        return llm.invoke(prompt).content
+
+    return summarize
+
+
+class ConversationHistory:
+    """按token预算保留最近若干轮对话
+
+    一轮对话从一条用户消息开始，包含之后的助手回复、工具调用和工具结果，
+    淘汰时整轮移除，避免留下没有对应工具调用的工具结果。
+    """
+
+    def __init__(
+        self,
+        save_tool: Any = None,
+        max_tokens: int = 4000,
+        min_turns: int = 1,
+        summarizer: Optional[Callable[[str], str]] = None,
+    ):
+        """初始化历史管理器
+
+        Args:
+            save_tool: 记忆保存工具，被淘汰的对话通过它的_run写入记忆库；为None时直接丢弃
+            max_tokens: 保留窗口的token预算
+            min_turns: 无论是否超出预算都保留的最近对话轮数
+            summarizer: 保存前对被淘汰对话做摘要的函数，为None时保存原文
+        """
+        self.save_tool = save_tool
+        self.max_tokens = max_tokens
+        self.min_turns = max(1, min_turns)
+        self.summarizer = summarizer
+
+        self._turns: List[List[BaseMessage]] = []
+        self._turn_tokens: List[int] = []
+        self.total_tokens = 0
+        self.evicted_turns = 0
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """当前窗口中的全部消息"""
+        return [message for turn in self._turns for message in turn]
+
+    def _append(self, message: BaseMessage) -> None:
+        tokens = message_tokens(message)
+        if isinstance(message, HumanMessage) or not self._turns:
+            self._turns.append([])
+            self._turn_tokens.append(0)
+        self._turns[-1].append(message)
+        self._turn_tokens[-1] += tokens
+        self.total_tokens += tokens
+
+    def add_user_message(self, content: str) -> List[BaseMessage]:
+        """开始新一轮对话，并返回发送给Agent的消息窗口
+
+        Args:
+            content: 用户输入
+
+        Returns:
+            压缩后的消息列表
+        """
+        self._append(HumanMessage(content=content))
+        self.compact()
+        return self.messages
+
+    def update(self, messages: List[BaseMessage]) -> None:
+        """用Agent返回的完整消息列表更新历史，只追加窗口之后的新消息
+
+        Args:
+            messages: agent.invoke返回的messages
+        """
+        for message in messages[len(self.messages) :]:
+            self._append(message)
+        self.compact()
+
+    def compact(self) -> int:
+        """淘汰最早的对话直到满足token预算
+
+        Returns:
+            本次淘汰的对话轮数
+        """
+        evicted = 0
+        while self.total_tokens > self.max_tokens and len(self._turns) > self.min_turns:
+            turn = self._turns.pop(0)
+            self.total_tokens -= self._turn_tokens.pop(0)
+            self._save_turn(turn)
+            evicted += 1
+
+        if evicted:
+            self.evicted_turns += evicted
+            logger.info(
+                "对话历史超出预算，已淘汰 %s 轮，剩余约 %s tokens",
+                evicted,
+                self.total_tokens,
+            )
+        return evicted
+
+    def _save_turn(self, turn: List[BaseMessage]) -> None:
+        """把被淘汰的一轮对话写入记忆库"""
+        if self.save_tool is None:
+            return
+        text = format_turn(turn)
+        if not text:
+            return
+        try:
+            if self.summarizer is not None:
+                text = self.summarizer(text)
+            self.save_tool._run(f"[历史对话] {single_line(text)}")
+        except Exception as e:
+            logger.error("保存被淘汰的对话时出错: %s", e)
@@ -0,0 +1,139 @@
+"""
+写入时的近似重复检测（SimHash）
+
+每条记忆计算一个64位SimHash指纹，海明距离不超过max_distance的两条记忆视为近似重复。
+指纹按分段建立倒排表：把64位切成max_distance+1段，根据抽屉原理，距离不超过
+max_distance的两个指纹至少有一段完全相同，因此查找只需比较少量候选而不是全表扫描。
+"""
+
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 近似重复的处理策略
+DEDUP_POLICIES = ("skip", "merge", "bump")
+
+FINGERPRINT_BITS = 64
+
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str) -> List[str]:
+    """提取用于计算指纹的特征：英文单词和中文二元组（忽略标点和空白）"""
+    text = text.lower()
+    features = _WORD.findall(text)
+    cjk = "".join(_CJK_RUN.findall(text))
+    if len(cjk) == 1:
+        features.append(cjk)
+    features.extend(cjk[i : i + 2] for i in range(len(cjk) - 1))
+    return features
+
+
+def simhash(text: str) -> int:
+    """计算文本的64位SimHash指纹
+
+    Args:
+        text: 记忆内容
+
+    Returns:
+        指纹整数
+    """
+    weights = [0] * FINGERPRINT_BITS
+    for feature in _features(text):
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个指纹的海明距离"""
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """按指纹分段建立倒排表的近似重复索引"""
+
+    def __init__(self, max_distance: int = 3):
+        """初始化索引
+
+        Args:
+            max_distance: 视为近似重复的最大海明距离
+        """
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // self.bands
+        self.fingerprints: Dict[str, int] = {}
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, fingerprint: int) -> Iterable[Tuple[int, int]]:
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.bands):
+            yield band, fingerprint >> (band * self.band_bits) & mask
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def add(self, memory_id: str, text: str) -> int:
+        """加入（或替换）一条记忆的指纹
+
+        Args:
+            memory_id: 记忆ID
+            text: 记忆内容
+
+        Returns:
+            指纹
+        """
+        self.remove(memory_id)
+        fingerprint = simhash(text)
+        self.fingerprints[memory_id] = fingerprint
+        for band, key in self._band_keys(fingerprint):
+            self._buckets[band].setdefault(key, set()).add(memory_id)
+        return fingerprint
+
+    def remove(self, memory_id: str) -> None:
+        """移除一条记忆的指纹"""
+        fingerprint = self.fingerprints.pop(memory_id, None)
+        if fingerprint is None:
+            return
+        for band, key in self._band_keys(fingerprint):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(memory_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def find(self, text: str) -> Optional[str]:
+        """查找与文本近似重复的记忆
+
+        Args:
+            text: 待写入的记忆内容
+
+        Returns:
+            距离最近的近似重复记忆ID，没有时返回None
+        """
+        fingerprint = simhash(text)
+        candidates: Set[str] = set()
+        for band, key in self._band_keys(fingerprint):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        best = None
+        best_distance = self.max_distance + 1
+        for memory_id in candidates:
+            distance = hamming_distance(fingerprint, self.fingerprints[memory_id])
+            if distance < best_distance:
+                best, best_distance = memory_id, distance
+        return best
+
+    def clear(self) -> None:
+        """清空索引"""
+        self.fingerprints.clear()
+        for bucket in self._buckets:
+            bucket.clear()
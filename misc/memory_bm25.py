@@ -1,14 +1,33 @@
 import os
+import time
 import shutil
-import re
-import jieba
-from typing import Dict, List, Optional, Any, Tuple, ClassVar
+import logging
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Any, Tuple, ClassVar
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，退化为不加跨进程锁
+    fcntl = None
 
 from langchain_core.tools import BaseTool
-from langchain_core.documents import Document
-from rank_bm25 import BM25Okapi
 from pydantic import BaseModel, Field
 
+from misc.bm25_index import BM25Index
+from misc.content_log import ContentLog, escape_field, unescape_field
+from misc.context_packing import pack_memories
+from misc.dedup import DEDUP_POLICIES, SimHashIndex
+from misc.metrics import metrics
+from misc.retention import RetentionPolicy
+from misc.retrieval_cache import RetrievalCache
+from misc.tokenizer import init_tokenizer, tokenize_text
+from misc.tracing import tracer
+from misc.write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
 
 class MemoryNode(BaseModel):
     """记忆节点模型"""
@@ -20,34 +39,104 @@ class MemoryNode(BaseModel):
 class BM25MemoryStore:
     """基于BM25算法的记忆存储"""
 
-    def __init__(self, cache_dir: str = "db_cache/bm25_db"):
+    def __init__(
+        self,
+        cache_dir: str = "db_cache/bm25_db",
+        retrieval_cache: Optional[RetrievalCache] = None,
+        user_dict: Optional[str] = None,
+        dedup_policy: Optional[str] = None,
+        dedup_distance: int = 3,
+        retention: Optional[RetentionPolicy] = None,
+        follow: bool = False,
+        compact_ratio: float = 0.5,
+    ):
         """初始化BM25记忆存储
 
         Args:
             cache_dir: 缓存目录路径
+            retrieval_cache: 检索结果缓存，为None时不缓存
+            user_dict: jieba领域用户词典路径
+            dedup_policy: 近似重复的处理策略，skip跳过写入，merge用新内容替换已有记忆，
+                bump在BM25存储中等同于skip（没有重要性字段）；为None时不去重
+            dedup_distance: 视为近似重复的最大SimHash海明距离
+            retention: 容量策略，写入后超出容量时淘汰保留分数最低的记忆；为None时不限制。
+                BM25存储没有重要性和写入时间字段，已有记忆以文件修改时间作为写入时间
+            follow: 检索前是否读取其他进程追加到记忆文件中的记录。
+                写入总是在文件锁内先追上文件再写，不受此参数影响
+            compact_ratio: 淘汰的记忆以删除记录追加到文件末尾，文件中的失效记录超过
+                有效记忆数的该比例时整体重写文件
         """
+        if dedup_policy is not None and dedup_policy not in DEDUP_POLICIES:
+            raise ValueError(f"无效的去重策略: {dedup_policy}")
+
         # 确保缓存目录存在
         if not os.path.exists(cache_dir):
             try:
                 os.makedirs(cache_dir, exist_ok=True)
-                print(f"创建缓存目录: {cache_dir}")
+                logger.info("创建缓存目录: %s", cache_dir)
             except Exception as e:
-                print(f"创建缓存目录时出错: {e}")
+                logger.error("创建缓存目录时出错: %s", e)
 
         self.cache_dir = cache_dir
         self.memory_file = os.path.join(cache_dir, "memories.txt")
-
-        # 存储所有记忆
-        self.memories = []
-
-        # BM25检索相关
-        self.corpus = []  # 文本内容列表
-        self.tokenized_corpus = []  # 分词后的文本列表
-        self.bm25 = None  # BM25检索器
+        self.lock_file = self.memory_file + ".lock"
+        self.follow = follow
+        self.compact_ratio = compact_ratio
+
+        # 已读取到的文件位置和文件inode，用于增量读取其他进程追加的记录
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._mutex = threading.RLock()
+        self._lock_fd: Optional[int] = None
+        self._lock_depth = 0
+
+        # 记忆原文只保存在记忆文件中，通过mmap按(偏移, 长度)读取；
+        # 内存中只保留文档表和整数ID的倒排索引
+        self._log = ContentLog(self.memory_file)
+        self._offsets = array("q")  # 文档ID -> 记录在文件中的偏移，-1表示已删除
+        self._lengths = array("I")  # 文档ID -> 记录的字节长度（不含换行符）
+        self._doc_ids: Dict[str, int] = {}  # 记忆ID -> 文档ID
+        self._pending: Dict[int, bytes] = {}  # 尚未写入文件的记录
+        self._tombstones: List[str] = []  # 尚未写入文件的删除记录（记忆ID）
+        self._file_records = 0  # 文件中的记录行数，含被覆盖的记录和删除记录
+        self.index = BM25Index()
+
+        # 存储版本号，每次写入递增，用于使检索缓存失效
+        self.version = 0
+        self.retrieval_cache = retrieval_cache
+
+        # 初始化分词器，词典缓存文件放在缓存目录中（已预热时直接返回）
+        init_tokenizer(cache_dir, user_dict)
+
+        # 写入时的近似重复索引
+        self.dedup_policy = dedup_policy
+        self.dedup_index = SimHashIndex(dedup_distance) if dedup_policy else None
+
+        # 容量策略，已有记忆在加载时按文件中的顺序登记
+        self.retention = retention
 
         # 加载已有记忆
         self._load_memories()
 
+    def __len__(self) -> int:
+        """有效记忆条数（包含初始化记忆）"""
+        return len(self.index)
+
+    @property
+    def memories(self) -> List[Dict[str, str]]:
+        """按文件中的顺序返回全部记忆
+
+        记忆原文不常驻内存，每次访问都从记忆文件读取一遍，只适合遍历和测试。
+
+        Returns:
+            记忆列表
+        """
+        return [self._read_doc(doc) for doc in self._live_docs()]
+
+    def _live_docs(self) -> Iterator[int]:
+        """按文档ID顺序遍历有效文档"""
+        return (doc for doc in range(self.index.size) if self.index.is_live(doc))
+
     def _tokenize_text(self, text):
         """对文本进行中英文分词
 
@@ -57,106 +146,502 @@ class BM25MemoryStore:
         Returns:
             分词结果列表
         """
-        # 用正则分割中英文
-        pattern = re.compile(r"[\u4e00-\u9fff]+|[a-zA-Z0-9\s]+")
-        segments = pattern.findall(text)
-
-        words = []
-        for seg in segments:
-            if re.match(r"[\u4e00-\u9fff]+", seg):
-                # 中文部分用jieba
-                words += jieba.lcut(seg)
-            else:
-                # 英文部分按空格分词
-                words += [w for w in seg.strip().split() if w]
+        return tokenize_text(text)
+
+    @contextmanager
+    def _file_lock(self):
+        """持有记忆文件的跨进程排他锁（flock），同一进程内可重入"""
+        with self._mutex:
+            if self._lock_depth == 0 and fcntl is not None:
+                self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_fd is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                    os.close(self._lock_fd)
+                    self._lock_fd = None
+
+    @staticmethod
+    def _parse_line(line: bytes) -> Optional[Tuple[str, Optional[str]]]:
+        """解析记忆文件中的一行
+
+        记录行为"ID\t内容"，两个字段都经过escape_field转义；只有ID的行是删除记录，
+        内容返回None；空行返回None。
+        """
+        parts = line.decode("utf-8").rstrip("\r").split("\t")
+        if len(parts) >= 2:
+            return unescape_field(parts[0]), unescape_field(parts[1])
+        if parts[0]:
+            return unescape_field(parts[0]), None
+        return None
+
+    @staticmethod
+    def _format_line(memory_id: str, content: str) -> bytes:
+        """生成记忆文件中的一行（不含换行符），内容中的换行符和制表符被转义"""
+        return f"{escape_field(memory_id)}\t{escape_field(content)}".encode("utf-8")
+
+    def _read_doc(self, doc: int) -> Dict[str, str]:
+        """读取一条记忆的原文
+
+        Args:
+            doc: 文档ID
+
+        Returns:
+            包含id和content的记忆
+        """
+        line = self._pending.get(doc)
+        if line is None:
+            line = self._log.read(self._offsets[doc], self._lengths[doc])
+        memory_id, content = self._parse_line(line)
+        return {"id": memory_id, "content": content}
+
+    def _index_doc(
+        self, memory_id: str, tokens: List[str], line: bytes, offset: int = -1
+    ) -> int:
+        """把一条记忆加入文档表和倒排索引，同一记忆ID的旧记录失效
+
+        Args:
+            memory_id: 记忆ID
+            tokens: 记忆内容的分词结果
+            line: 记忆文件中的一行
+            offset: 记录在文件中的偏移，为-1时记录暂存在内存中，等待追加或重写文件
+
+        Returns:
+            文档ID
+        """
+        old = self._doc_ids.get(memory_id)
+        if old is not None:
+            self._unindex_doc(old)
+        doc = self.index.add(tokens)
+        self._offsets.append(offset)
+        self._lengths.append(len(line))
+        if offset < 0:
+            self._pending[doc] = line
+        self._doc_ids[memory_id] = doc
+        return doc
+
+    def _unindex_doc(self, doc: int) -> None:
+        """使一条记录失效：重新分词以扣减文档频率，文件中的记录在下次重写时丢弃"""
+        if not self.index.is_live(doc):
+            return
+        memory = self._read_doc(doc)
+        self.index.remove(doc, self._tokenize_text(memory["content"]))
+        self._offsets[doc] = -1
+        self._pending.pop(doc, None)
+
+    def _reset(self) -> None:
+        """清空文档表、倒排索引、近似重复索引和容量策略"""
+        self._offsets = array("q")
+        self._lengths = array("I")
+        self._doc_ids = {}
+        self._pending = {}
+        self._tombstones = []
+        self._file_records = 0
+        self.index = BM25Index()
+        if self.dedup_index is not None:
+            self.dedup_index.clear()
+        if self.retention is not None:
+            self.retention.clear()
+
+    def _compact(self) -> None:
+        """丢弃失效文档并重新编号，调用方需保证没有暂存的记录"""
+        keep = self.index.compact()
+        new_ids = {old: new for new, old in enumerate(keep)}
+        self._offsets = array("q", (self._offsets[doc] for doc in keep))
+        self._lengths = array("I", (self._lengths[doc] for doc in keep))
+        self._doc_ids = {
+            memory_id: new_ids[doc] for memory_id, doc in self._doc_ids.items()
+        }
+
+    def _register(self, memory: Dict[str, str], timestamp: Optional[float] = None):
+        """把记忆登记到近似重复索引和容量策略中"""
+        if memory["id"] == "init_memory":
+            return
+        if self.dedup_index is not None:
+            self.dedup_index.add(memory["id"], memory["content"])
+        if self.retention is not None:
+            self.retention.track(
+                memory["id"],
+                len(memory["content"].encode("utf-8")),
+                timestamp=timestamp,
+            )
+
+    def _index_records(
+        self, data: bytes, base: int, timestamp: Optional[float] = None
+    ) -> int:
+        """索引从记忆文件中读取的完整行，删除记录使同一ID的记忆失效
 
-        return words
+        Args:
+            data: 以换行符结尾的若干行
+            base: data在文件中的起始偏移
+            timestamp: 登记到容量策略的写入时间，为None时使用当前时间
+
+        Returns:
+            读取的记录条数（含删除记录）
+        """
+        count = 0
+        pos = 0
+        while pos < len(data):
+            end = data.index(b"\n", pos)
+            line = data[pos:end]
+            record = self._parse_line(line)
+            if record is not None:
+                memory_id, content = record
+                if content is None:
+                    self._remove_memories([memory_id])
+                else:
+                    self._index_doc(
+                        memory_id, self._tokenize_text(content), line, base + pos
+                    )
+                    self._register({"id": memory_id, "content": content}, timestamp)
+                count += 1
+            pos = end + 1
+        self._file_records += count
+        return count
 
     def _load_memories(self):
         """从文件加载记忆"""
-        if os.path.exists(self.memory_file):
-            try:
-                with open(self.memory_file, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-
-                for line in lines:
-                    parts = line.strip().split("\t")
-                    if len(parts) >= 2:
-                        memory_id, content = parts[:2]
-                        self.memories.append({"id": memory_id, "content": content})
-                        self.corpus.append(content)
-
-                # 初始化BM25检索器
-                if self.corpus:
-                    # 对文本进行中英文分词
-                    self.tokenized_corpus = [
-                        self._tokenize_text(doc) for doc in self.corpus
-                    ]
-                    self.bm25 = BM25Okapi(self.tokenized_corpus)
-                    print(f"已加载 {len(self.memories)} 条记忆")
-                else:
+        with self._file_lock():
+            if os.path.exists(self.memory_file):
+                try:
+                    self._read_all()
+                    if len(self):
+                        logger.info("已加载 %s 条记忆", len(self))
+                    else:
+                        self._init_empty_retriever()
+                except Exception as e:
+                    logger.error("加载记忆时出错: %s", e)
                     self._init_empty_retriever()
-            except Exception as e:
-                print(f"加载记忆时出错: {e}")
+            else:
                 self._init_empty_retriever()
-        else:
-            self._init_empty_retriever()
+
+    def _read_all(self):
+        """重新映射整个记忆文件并重建文档表和索引"""
+        self._log.reopen()
+        stat = self._log.stat()
+        data = self._log.read(0, self._log.mapped_size)
+        # 只读取到最后一个换行符，其他进程正在追加的半行留到下次读取
+        end = data.rfind(b"\n") + 1
+
+        self._reset()
+        self._index_records(data[:end], 0, stat.st_mtime if stat else None)
+        self._offset = end
+        self._inode = stat.st_ino if stat else None
+
+    def refresh(self) -> int:
+        """读取其他进程追加到记忆文件中的记录并增量更新索引
+
+        记忆文件被其他进程整体重写（删除、淘汰、合并）时重新加载整个文件。
+
+        Returns:
+            新读取的记录条数，整体重新加载时为-1
+        """
+        with self._mutex:
+            try:
+                stat = os.stat(self.memory_file)
+            except FileNotFoundError:
+                return 0
+
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                with tracer.span("bm25.reload"):
+                    self._read_all()
+                self.version += 1
+                logger.debug("记忆文件已被重写，重新加载 %s 条记忆", len(self))
+                return -1
+            if stat.st_size == self._offset:
+                return 0
+
+            data = self._log.read(self._offset, stat.st_size - self._offset)
+            end = data.rfind(b"\n") + 1
+            if end == 0:
+                return 0
+            with tracer.span("bm25.follow"):
+                count = self._index_records(data[:end], self._offset)
+            self._offset += end
+            self.version += 1
+            logger.debug("读取其他进程追加的 %s 条记忆", count)
+            return count
 
     def _init_empty_retriever(self):
         """初始化空的BM25检索器"""
-        self.memories = [{"id": "init_memory", "content": "初始化记忆"}]
-        self.corpus = ["初始化记忆"]
-        self.tokenized_corpus = [self._tokenize_text("初始化记忆")]
-        self.bm25 = BM25Okapi(self.tokenized_corpus)
-        print("初始化空记忆检索器")
+        self._reset()
+        self._index_doc(
+            "init_memory",
+            self._tokenize_text("初始化记忆"),
+            self._format_line("init_memory", "初始化记忆"),
+        )
+        logger.info("初始化空记忆检索器")
         # 立即保存初始记忆
         self._save_memories()
 
     def _save_memories(self):
-        """保存记忆到文件"""
+        """整体重写记忆文件，只写入有效记录，丢弃被覆盖的记录和删除记录
+
+        先写临时文件再原子替换，其他进程通过inode变化发现重写并重新加载。
+        失效文档超过一半时顺带压缩文档表和倒排索引。
+        """
+        try:
+            with self._file_lock():
+                tmp_file = f"{self.memory_file}.{os.getpid()}.tmp"
+                offsets = array("q", [-1]) * len(self._offsets)
+                pos = 0
+                with open(tmp_file, "wb") as f:
+                    for doc in self._live_docs():
+                        line = self._pending.get(doc)
+                        if line is None:
+                            line = self._log.read(
+                                self._offsets[doc], self._lengths[doc]
+                            )
+                        f.write(line + b"\n")
+                        offsets[doc] = pos
+                        pos += len(line) + 1
+                    f.flush()
+                    stat = os.fstat(f.fileno())
+                os.replace(tmp_file, self.memory_file)
+                self._offsets = offsets
+                self._pending.clear()
+                self._tombstones.clear()
+                self._file_records = len(self)
+                self._log.reopen()
+                self._offset = pos
+                self._inode = stat.st_ino
+                if self.index.dead > len(self.index):
+                    self._compact()
+            logger.debug("记忆已保存到 %s", self.memory_file)
+        except Exception as e:
+            logger.error("保存记忆时出错: %s", e)
+
+    def _append_pending(self):
+        """把暂存的删除记录和新记录追加到记忆文件末尾，调用方需持有文件锁并已追上文件
+
+        删除记录写在新记录之前：同一批中先淘汰再重新写入的记忆以新记录为准。
+        """
+        if not self._pending and not self._tombstones:
+            return
+        if self._inode is None or not os.path.exists(self.memory_file):
+            self._save_memories()
+            return
         try:
-            with open(self.memory_file, "w", encoding="utf-8") as f:
-                for memory in self.memories:
-                    f.write(f"{memory['id']}\t{memory['content']}\n")
-            print(f"记忆已保存到 {self.memory_file}")
+            docs = sorted(self._pending)
+            tombstones = b"".join(
+                escape_field(memory_id).encode("utf-8") + b"\n"
+                for memory_id in self._tombstones
+            )
+            with open(self.memory_file, "ab") as f:
+                pos = f.tell() + len(tombstones)
+                for doc in docs:
+                    self._offsets[doc] = pos
+                    pos += len(self._pending[doc]) + 1
+                f.write(
+                    tombstones + b"".join(self._pending[doc] + b"\n" for doc in docs)
+                )
+                f.flush()
+            self._offset = pos
+            self._file_records += len(self._tombstones) + len(docs)
+            self._pending.clear()
+            self._tombstones.clear()
+            logger.debug("记忆已追加到 %s", self.memory_file)
         except Exception as e:
-            print(f"保存记忆时出错: {e}")
+            logger.error("保存记忆时出错: %s", e)
+
+    def _persist(self) -> None:
+        """追加暂存的记录，追加后文件中的失效记录超过有效记忆数的compact_ratio时整体重写
+
+        每次整体重写之后至少再有compact_ratio × 有效记忆数条记录失效才会再次重写，
+        容量已满时每次写入淘汰一条记忆的平摊开销为常数。
+        """
+        records = self._file_records + len(self._tombstones) + len(self._pending)
+        if records - len(self) > self.compact_ratio * len(self):
+            self._save_memories()
+        else:
+            self._append_pending()
+
+    def _resolve_duplicate(self, content: str) -> Optional[str]:
+        """按去重策略处理近似重复的记忆
+
+        merge策略用新内容替换已有记忆的索引记录，由调用方整体重写文件。
 
-    def add_memory(self, content: str) -> str:
+        Args:
+            content: 待写入的记忆内容
+
+        Returns:
+            已有记忆的ID，不是重复时返回None
+        """
+        if self.dedup_index is None:
+            return None
+        existing_id = self.dedup_index.find(content)
+        if existing_id is None:
+            return None
+
+        metrics.inc("memory_duplicates_total", store="bm25", policy=self.dedup_policy)
+        if self.dedup_policy == "merge":
+            self._index_doc(
+                existing_id,
+                self._tokenize_text(content),
+                self._format_line(existing_id, content),
+            )
+            self.dedup_index.add(existing_id, content)
+            if self.retention is not None:
+                self.retention.track(existing_id, len(content.encode("utf-8")))
+        logger.debug("记忆与 %s 近似重复，策略: %s", existing_id, self.dedup_policy)
+        return existing_id
+
+    def _remove_memories(self, memory_ids: List[str]) -> None:
+        """从文档表和索引中移除记忆，由调用方重写文件"""
+        for memory_id in memory_ids:
+            doc = self._doc_ids.pop(memory_id, None)
+            if doc is not None:
+                self._unindex_doc(doc)
+            if self.dedup_index is not None:
+                self.dedup_index.remove(memory_id)
+            if self.retention is not None:
+                self.retention.forget(memory_id)
+
+    def _evict(self, protect: Tuple[str, ...] = ()) -> List[str]:
+        """超出容量时淘汰保留分数最低的记忆"""
+        if self.retention is None:
+            return []
+        victims = self.retention.evict(protect)
+        if victims:
+            self._remove_memories(victims)
+            self._tombstones.extend(victims)
+            metrics.inc("memory_evictions_total", len(victims), store="bm25")
+            logger.debug("超出容量，淘汰 %s 条记忆", len(victims))
+        return victims
+
+    def delete_memory(self, memory_id: str) -> bool:
+        """删除一条记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆是否存在并已删除
+        """
+        with self._file_lock():
+            self.refresh()
+            if memory_id not in self._doc_ids:
+                return False
+            self._remove_memories([memory_id])
+            if not len(self):
+                self._init_empty_retriever()
+            else:
+                self._save_memories()
+            self.version += 1
+            return True
+
+    def add_memory(self, content: str, memory_id: Optional[str] = None) -> str:
         """添加新记忆
 
         Args:
             content: 记忆内容
+            memory_id: 指定的记忆ID，为空时自动生成
 
         Returns:
             记忆ID
         """
+        with tracer.span("bm25.add_memory"), self._file_lock():
+            # 先读取其他进程追加的记录，保证去重和容量判断基于最新的记忆
+            self.refresh()
+            return self._add_memory(content, memory_id)
+
+    def _add_memory(self, content: str, memory_id: Optional[str]) -> str:
+        """写入一条记忆并增量更新索引"""
+        start = time.perf_counter()
+
         # 生成简单的随机ID
         import uuid
 
-        memory_id = f"mem_{str(uuid.uuid4())[:8]}"
+        existing_id = self._resolve_duplicate(content)
+        if existing_id is not None:
+            if self.dedup_policy == "merge":
+                self._save_memories()
+                self.version += 1
+            return existing_id
+
+        memory_id = memory_id or f"mem_{str(uuid.uuid4())[:8]}"
+        self._register({"id": memory_id, "content": content})
+
+        # 只对新记忆分词，倒排索引增量更新
+        with tracer.span("bm25.tokenize", docs=1):
+            tokens = self._tokenize_text(content)
+        with tracer.span("bm25.build_index"):
+            self._index_doc(memory_id, tokens, self._format_line(memory_id, content))
+        self._evict(protect=(memory_id,))
+
+        # 保存记忆：追加新记忆和淘汰记忆的删除记录，失效记录过多时整体重写
+        with tracer.span("bm25.persist"):
+            self._persist()
+        self.version += 1
+
+        metrics.inc("memory_writes_total", store="bm25")
+        metrics.observe(
+            "memory_write_seconds", time.perf_counter() - start, store="bm25"
+        )
+        return memory_id
 
-        memory = {"id": memory_id, "content": content}
+    def add_memories(
+        self, contents: List[str], memory_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """批量添加记忆，只对新记忆分词，文件追加或重写只做一次
 
-        # 添加到记忆列表
-        self.memories.append(memory)
+        Args:
+            contents: 记忆内容列表
+            memory_ids: 与contents一一对应的记忆ID，为空时自动生成
 
-        # 添加到语料库
-        self.corpus.append(content)
+        Returns:
+            记忆ID列表
+        """
+        import uuid
 
-        # 更新BM25检索器
-        self.tokenized_corpus = [self._tokenize_text(doc) for doc in self.corpus]
-        self.bm25 = BM25Okapi(self.tokenized_corpus)
+        if memory_ids is None:
+            memory_ids = [f"mem_{str(uuid.uuid4())[:8]}" for _ in contents]
+        if len(memory_ids) != len(contents):
+            raise ValueError("memory_ids与contents的长度不一致")
+
+        start = time.perf_counter()
+        memory_ids = list(memory_ids)
+        written = 0
+        with tracer.span("bm25.add_memories", count=len(contents)), self._file_lock():
+            self.refresh()
+            merged = False
+            with tracer.span("bm25.build_index", docs=len(contents)):
+                for i, content in enumerate(contents):
+                    existing_id = self._resolve_duplicate(content)
+                    if existing_id is not None:
+                        memory_ids[i] = existing_id
+                        merged = merged or self.dedup_policy == "merge"
+                        continue
+                    self._register({"id": memory_ids[i], "content": content})
+                    self._index_doc(
+                        memory_ids[i],
+                        self._tokenize_text(content),
+                        self._format_line(memory_ids[i], content),
+                    )
+                    written += 1
 
-        # 保存记忆
-        self._save_memories()
+            self._evict()
+            with tracer.span("bm25.persist"):
+                if merged:
+                    self._save_memories()
+                else:
+                    self._persist()
+            self.version += 1
 
-        return memory_id
+        metrics.inc("memory_writes_total", written, store="bm25")
+        metrics.observe(
+            "memory_write_seconds", time.perf_counter() - start, store="bm25"
+        )
+        return memory_ids
 
     def retrieve_relevant_memories(
         self, query: str, limit: int = 5
     ) -> List[Dict[str, Any]]:
-        """检索与查询相关的记忆
+        """检索与查询相关的记忆，配置了检索缓存时优先读取缓存
 
         Args:
             query: 查询字符串
@@ -165,52 +650,68 @@ class BM25MemoryStore:
         Returns:
             记忆列表，按相关性排序
         """
-        if not self.bm25 or not self.corpus:
-            print("没有可用的记忆进行检索")
+        start = time.perf_counter()
+        if self.follow:
+            self.refresh()
+        with tracer.span("bm25.retrieve", limit=limit) as span:
+            if self.retrieval_cache is None:
+                memories = self._retrieve(query, limit)
+            else:
+                memories = self.retrieval_cache.get_or_compute(
+                    query, limit, self.version, lambda: self._retrieve(query, limit)
+                )
+            span.set_attribute("results", len(memories))
+        if self.retention is not None:
+            self.retention.touch(memory["id"] for memory in memories)
+        metrics.inc("memory_retrievals_total", store="bm25")
+        metrics.observe(
+            "memory_retrieve_seconds", time.perf_counter() - start, store="bm25"
+        )
+        return memories
+
+    def _retrieve(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """用倒排索引对包含查询词的记忆打分并返回前limit条"""
+        if not len(self):
+            logger.debug("没有可用的记忆进行检索")
             return []
 
         # 处理空查询情况
         if not query or query.strip() == "":
-            print("查询为空，返回空列表")
+            logger.debug("查询为空，返回空列表")
             return []
 
         try:
             # 对查询进行中英文分词
-            tokenized_query = self._tokenize_text(query)
-
-            # 使用BM25检索相关文档
-            doc_scores = self.bm25.get_scores(tokenized_query)
+            with tracer.span("bm25.tokenize"):
+                tokenized_query = self._tokenize_text(query)
 
-            # 将文档ID和分数组合，并按分数降序排序
-            scored_docs = [
-                (i, score)
-                for i, score in enumerate(doc_scores)
-                if i < len(self.memories)
-            ]
-            scored_docs.sort(key=lambda x: x[1], reverse=True)
+            # 只对倒排表中包含查询词的记忆打分
+            with tracer.span("bm25.score") as span:
+                doc_scores = self.index.score(tokenized_query)
+                span.set_attribute("candidates", len(doc_scores))
 
-            # 获取前limit个文档
-            top_docs = scored_docs[:limit]
+            # 按分数降序取前limit个文档
+            with tracer.span("bm25.rank"):
+                top_docs = self.index.rank(doc_scores, limit)
 
-            print(f"BM25检索到 {len(self.corpus)} 条记忆")
+            metrics.inc(
+                "memory_candidates_scanned_total", len(doc_scores), store="bm25"
+            )
+            logger.debug("BM25对 %s 条记忆打分", len(doc_scores))
 
-            # 转换为记忆格式
+            # 从记忆文件读取原文
             memories = []
-            for i, (doc_idx, score) in enumerate(top_docs):
-                if doc_idx < len(self.memories):  # 确保索引在有效范围内
-                    memories.append(
-                        {
-                            "id": self.memories[doc_idx]["id"],
-                            "content": self.memories[doc_idx]["content"],
-                            "score": float(score),
-                            "rank": i + 1,
-                        }
-                    )
+            for i, (doc, score) in enumerate(top_docs):
+                memory = self._read_doc(doc)
+                memory["score"] = float(score)
+                memory["rank"] = i + 1
+                memories.append(memory)
 
-            print(f"返回 {len(memories)} 条相关记忆")
+            logger.debug("返回 %s 条相关记忆", len(memories))
             return memories
         except Exception as e:
-            print(f"检索相关记忆时出错: {e}")
+            metrics.inc("memory_retrieval_errors_total", store="bm25")
+            logger.error("检索相关记忆时出错: %s", e)
             return []
 
     def get_memory_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
@@ -222,22 +723,22 @@ class BM25MemoryStore:
         Returns:
             记忆信息或None
         """
-        for memory in self.memories:
-            if memory["id"] == memory_id:
-                return memory
-        return None
+        if self.follow:
+            self.refresh()
+        doc = self._doc_ids.get(memory_id)
+        if doc is None:
+            return None
+        return self._read_doc(doc)
 
     def clear_all_memories(self):
         """清除所有记忆（测试用）"""
-        self.memories = []
-        self.corpus = []
-
-        # 重新初始化检索器
-        self._init_empty_retriever()
+        with self._file_lock():
+            self.version += 1
 
-        # 如果文件存在，删除它
-        if os.path.exists(self.memory_file):
-            os.remove(self.memory_file)
+            # 删除记忆文件后重新初始化，新文件中只有初始化记忆
+            if os.path.exists(self.memory_file):
+                os.remove(self.memory_file)
+            self._init_empty_retriever()
 
 
 class MemorySaveTool(BaseTool):
@@ -246,6 +747,7 @@ class MemorySaveTool(BaseTool):
     name: ClassVar[str] = "save_memory"
     description: ClassVar[str] = "保存信息到记忆库中以便将来检索。输入应该是记忆内容。"
     memory_store: BM25MemoryStore
+    write_queue: Optional[WriteBehindQueue] = None
 
     def _run(self, content: str) -> str:
         """保存记忆
@@ -256,7 +758,11 @@ class MemorySaveTool(BaseTool):
         Returns:
             操作结果消息
         """
-        memory_id = self.memory_store.add_memory(content)
+        with tracer.span("tool.save_memory", store="bm25"):
+            if self.write_queue is not None:
+                memory_id = self.write_queue.submit(content)
+            else:
+                memory_id = self.memory_store.add_memory(content)
         if memory_id:
             return f"记忆已保存，ID: {memory_id}"
         else:
@@ -269,6 +775,9 @@ class MemoryRetrieveTool(BaseTool):
     name: ClassVar[str] = "retrieve_memories"
     description: ClassVar[str] = "检索与查询相关的记忆。输入应该是查询字符串。"
     memory_store: BM25MemoryStore
+    write_queue: Optional[WriteBehindQueue] = None
+    token_budget: int = 1000
+    max_memory_tokens: int = 300
 
     def _run(self, query: str, limit: int = 5) -> str:
         """检索相关记忆
@@ -280,44 +789,85 @@ class MemoryRetrieveTool(BaseTool):
         Returns:
             格式化的记忆列表
         """
-        print(f"开始检索记忆，查询: '{query}'")
-        memories = self.memory_store.retrieve_relevant_memories(query, limit)
-
-        if not memories:
-            return "没有找到相关记忆。"
-
-        result = f"找到以下相关记忆 (共{len(memories)}条):\n\n"
-        for i, memory in enumerate(memories, 1):
-            try:
-                score_info = (
-                    f" (分数: {memory.get('score', 'N/A'):.4f})"
-                    if "score" in memory
-                    else ""
+        with tracer.span("tool.retrieve_memories", store="bm25"):
+            logger.debug("开始检索记忆，查询: '%s'", query)
+            # 先写完排队的记忆，保证本会话保存的记忆可以被检索到
+            if self.write_queue is not None:
+                self.write_queue.flush()
+            memories = self.memory_store.retrieve_relevant_memories(query, limit)
+            with tracer.span("tool.format", results=len(memories)) as span:
+                packed = pack_memories(
+                    memories,
+                    query,
+                    self._format_memory,
+                    self.token_budget,
+                    self.max_memory_tokens,
                 )
-                result += f"{i}. {memory['content']}{score_info}\n\n"
-            except Exception as e:
-                print(f"格式化记忆时出错: {e}")
-                result += f"{i}. 记忆格式化错误: {str(memory)}\n\n"
+                span.set_attribute("dropped", packed.dropped)
+            if packed.dropped or packed.truncated:
+                logger.debug(
+                    "检索结果超出token预算，截断 %s 条，丢弃 %s 条",
+                    packed.truncated,
+                    packed.dropped,
+                )
+            return packed.text
 
-        return result
+    @staticmethod
+    def _format_memory(i: int, memory: Dict[str, Any], content: str) -> str:
+        """格式化单条记忆，content为按预算截取后的内容"""
+        score_info = f" (分数: {memory['score']:.4f})" if "score" in memory else ""
+        return f"{i}. {content}{score_info}"
 
 
 def create_memory_tools(
     cache_dir: str = "db_cache/bm25_db",
+    cache_size: int = 128,
+    cache_ttl: float = 300.0,
+    user_dict: Optional[str] = None,
+    dedup_policy: Optional[str] = None,
+    max_memories: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    write_behind: bool = False,
+    follow: bool = False,
 ) -> Tuple[MemorySaveTool, MemoryRetrieveTool]:
     """创建记忆工具
 
     Args:
         cache_dir: 缓存目录路径
+        cache_size: 检索缓存容量，为0时不启用缓存
+        cache_ttl: 检索缓存的存活时间（秒）
+        user_dict: jieba领域用户词典路径
+        dedup_policy: 近似重复的处理策略（skip/merge/bump），为None时不去重
+        max_memories: 最多保留的记忆条数，为None时不限制
+        max_bytes: 记忆内容的最大总字节数，为None时不限制
+        write_behind: 是否通过后台队列批量写入，开启后保存工具立即返回记忆ID
+        follow: 检索前是否读取其他进程追加的记忆（多个进程共享cache_dir时开启）
 
     Returns:
         保存和检索记忆的工具元组
     """
+    retrieval_cache = RetrievalCache(cache_size, cache_ttl) if cache_size > 0 else None
+    retention = (
+        RetentionPolicy(max_memories, max_bytes)
+        if max_memories is not None or max_bytes is not None
+        else None
+    )
+
     # 共享同一个记忆存储
-    memory_store = BM25MemoryStore(cache_dir=cache_dir)
+    memory_store = BM25MemoryStore(
+        cache_dir=cache_dir,
+        retrieval_cache=retrieval_cache,
+        user_dict=user_dict,
+        dedup_policy=dedup_policy,
+        retention=retention,
+        follow=follow,
+    )
 
-    save_tool = MemorySaveTool(memory_store=memory_store)
-    retrieve_tool = MemoryRetrieveTool(memory_store=memory_store)
+    write_queue = WriteBehindQueue(memory_store) if write_behind else None
+    save_tool = MemorySaveTool(memory_store=memory_store, write_queue=write_queue)
+    retrieve_tool = MemoryRetrieveTool(
+        memory_store=memory_store, write_queue=write_queue
+    )
 
     return save_tool, retrieve_tool
 
@@ -1,14 +1,31 @@
+import inspect
 import os
+import queue
+import time
+import logging
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Tuple, ClassVar
+from typing import Dict, List, Optional, Any, Set, Tuple, ClassVar
 from pathlib import Path
 
-import kuzu
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langchain_core.tools import BaseTool
-from langchain_kuzu.graphs.kuzu_graph import KuzuGraph
 from pydantic import BaseModel, Field
 
+from misc.context_packing import pack_memories
+from misc.dedup import DEDUP_POLICIES, SimHashIndex
+from misc.metrics import metrics
+from misc.retention import RetentionPolicy
+from misc.retrieval_cache import RetrievalCache
+from misc.store_registry import registry
+from misc.tracing import tracer
+from misc.write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "db_cache/test_db/memory_db.kuzu"
+
+_STOP_LINKER = object()
+
 
 class MemoryNode(BaseModel):
     """记忆节点模型"""
@@ -23,39 +40,189 @@ class MemoryNode(BaseModel):
 class GraphMemoryStore:
     """基于KuZu图数据库的记忆存储"""
 
-    def __init__(self, db_path: str = "db_cache/test_db/memory_db.kuzu"):
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB_PATH,
+        retrieval_cache: Optional[RetrievalCache] = None,
+        dedup_policy: Optional[str] = None,
+        dedup_distance: int = 3,
+        retention: Optional[RetentionPolicy] = None,
+        defer_linking: bool = False,
+        link_batch_size: int = 32,
+        read_only: bool = False,
+        buffer_pool_size: int = 0,
+        max_num_threads: int = 0,
+    ):
         """初始化图数据库连接
 
         Args:
             db_path: 数据库文件路径（不是目录）
+            retrieval_cache: 检索结果缓存，为None时不缓存
+            dedup_policy: 近似重复的处理策略，skip跳过写入，merge用新内容替换已有记忆，
+                bump把已有记忆的重要性加1；为None时不去重
+            dedup_distance: 视为近似重复的最大SimHash海明距离
+            retention: 容量策略，写入后超出容量时淘汰保留分数最低的记忆；为None时不限制
+            defer_linking: 是否由后台线程建立FOLLOWS/RELATED_TO关系，开启后写入只插入节点
+            link_batch_size: 后台线程每个事务最多连接的记忆条数
+            read_only: 是否以只读方式打开已有数据库。只读时不创建表结构、不获取写锁，
+                多个只检索的进程可以同时打开同一个数据库文件；写入操作记录警告并返回失败
+            buffer_pool_size: 缓冲池大小（字节），为0时使用KuZu的默认值
+            max_num_threads: 查询使用的最大线程数，为0时使用KuZu的默认值
         """
-        # 确保路径是文件路径而不是目录
-        db_file_path = db_path
+        if dedup_policy is not None and dedup_policy not in DEDUP_POLICIES:
+            raise ValueError(f"无效的去重策略: {dedup_policy}")
+        if read_only and (dedup_policy or retention is not None or defer_linking):
+            raise ValueError("只读模式不支持去重、容量策略和后台连接")
 
-        # 如果路径不包含文件扩展名，添加.kuzu扩展名
-        if not db_file_path.endswith(".kuzu"):
-            db_file_path += ".kuzu"
+        # 确保路径是文件路径而不是目录
+        db_file_path = self.resolve_db_path(db_path)
 
-        # 确保父目录存在
+        # 确保父目录存在（只读模式要求数据库已存在）
         parent_dir = os.path.dirname(db_file_path)
-        if parent_dir and not os.path.exists(parent_dir):
+        if not read_only and parent_dir and not os.path.exists(parent_dir):
             try:
                 os.makedirs(parent_dir, exist_ok=True)
-                print(f"创建目录: {parent_dir}")
+                logger.info("创建目录: %s", parent_dir)
             except Exception as e:
-                print(f"创建目录时出错: {e}")
+                logger.error("创建目录时出错: %s", e)
+
+        logger.info(
+            "初始化KuZu数据库: %s%s", db_file_path, "（只读）" if read_only else ""
+        )
+
+        # 存储版本号，每次写入递增，用于使检索缓存失效
+        self.version = 0
+        self.retrieval_cache = retrieval_cache
 
-        print(f"初始化KuZu数据库: {db_file_path}")
+        # kuzu较重，构造存储时才导入
+        import kuzu
 
         # 创建KuZu数据库连接
-        self.db = kuzu.Database(db_file_path)
+        self.read_only = read_only
+        self.db = kuzu.Database(
+            db_file_path,
+            buffer_pool_size=buffer_pool_size,
+            max_num_threads=max_num_threads,
+            read_only=read_only,
+        )
         self.conn = kuzu.Connection(self.db)
 
-        # 初始化图结构
-        self._init_graph_schema()
+        # 初始化图结构，只读模式下由写入方负责建表
+        if not read_only:
+            self._init_graph_schema()
+
+        # 写入时的近似重复索引
+        self.dedup_policy = dedup_policy
+        self.dedup_index = SimHashIndex(dedup_distance) if dedup_policy else None
+        if self.dedup_index is not None:
+            result = self.conn.execute("MATCH (m:Memory) RETURN m.memory_id, m.content")
+            for memory_id, content in result:
+                self.dedup_index.add(memory_id, content)
+
+        # 容量策略，已有记忆按节点上的重要性和时间戳登记
+        self.retention = retention
+        if self.retention is not None:
+            result = self.conn.execute(
+                "MATCH (m:Memory) RETURN m.memory_id, m.content, m.timestamp, m.importance"
+            )
+            for memory_id, content, timestamp, importance in result:
+                self.retention.track(
+                    memory_id,
+                    len(content.encode("utf-8")),
+                    importance,
+                    datetime.fromisoformat(timestamp).timestamp(),
+                )
+
+        # KuzuGraph会在构造时内省数据库模式，只在首次访问graph时创建
+        self._graph = None
+
+        # KuZu同一时间只允许一个写事务，写入和后台连接共用这把锁
+        self._write_lock = threading.RLock()
+
+        # 后台连接：使用独立的数据库连接，按写入顺序分批建立关系
+        self.defer_linking = defer_linking
+        self.link_batch_size = link_batch_size
+        self.link_watermark = 0  # 已提交事务、完成连接的记忆条数
+        self.failed_links = 0  # 重试后仍未能建立关系的记忆条数
+        self._link_submitted = 0
+        self._unlinked: Set[str] = set()
+        self._link_cond = threading.Condition()
+        if defer_linking:
+            self._link_queue: "queue.Queue[Any]" = queue.Queue()
+            self._linker_conn = kuzu.Connection(self.db)
+            self._linker = threading.Thread(
+                target=self._run_linker, name="graph-linker", daemon=True
+            )
+            self._linker.start()
+
+    @property
+    def graph(self):
+        """LangChain的KuzuGraph包装（用于图问答），首次访问时创建
+
+        Returns:
+            KuzuGraph实例
+        """
+        # 图问答依赖关系，等待后台连接完成
+        self.wait_for_links()
+        if self._graph is None:
+            from langchain_kuzu.graphs.kuzu_graph import KuzuGraph
+
+            self._graph = KuzuGraph(self.db, allow_dangerous_requests=True)
+        return self._graph
+
+    @property
+    def graph_schema(self) -> str:
+        """数据库模式描述，内省结果缓存在KuzuGraph中
+
+        Returns:
+            模式描述字符串
+        """
+        return self.graph.get_schema
+
+    def refresh_graph_schema(self) -> None:
+        """在修改表结构后重新内省数据库模式"""
+        if self._graph is not None:
+            self._graph.refresh_schema()
+
+    @staticmethod
+    def resolve_db_path(db_path: str) -> str:
+        """规范化数据库文件路径
 
-        # 创建KuZu图
-        self.graph = KuzuGraph(self.db, allow_dangerous_requests=True)
+        Args:
+            db_path: 数据库文件路径
+
+        Returns:
+            带.kuzu扩展名的路径
+        """
+        # 如果路径不包含文件扩展名，添加.kuzu扩展名
+        if not db_path.endswith(".kuzu"):
+            db_path += ".kuzu"
+        return db_path
+
+    def _reject_write(self, operation: str) -> bool:
+        """只读模式下拒绝写入操作
+
+        Args:
+            operation: 操作名称，用于日志
+
+        Returns:
+            是否拒绝
+        """
+        if self.read_only:
+            logger.warning("数据库以只读方式打开，忽略%s", operation)
+            metrics.inc("memory_write_errors_total", store="graph")
+        return self.read_only
+
+    def close(self) -> None:
+        """关闭数据库连接，释放缓冲池和文件句柄；后台连接会先处理完排队的记忆"""
+        if self.defer_linking and self._linker.is_alive():
+            self._link_queue.put(_STOP_LINKER)
+            self._linker.join()
+            self._linker_conn.close()
+        self._graph = None
+        self.conn.close()
+        self.db.close()
+        logger.info("KuZu数据库已关闭")
 
     def _init_graph_schema(self):
         """初始化图数据库模式"""
@@ -63,21 +230,21 @@ class GraphMemoryStore:
         try:
             # KuZu使用的是不同于SQL的语法
             # 创建节点类型
-            print("创建Memory节点表...")
+            logger.debug("创建Memory节点表...")
             create_node_query = "CREATE NODE TABLE IF NOT EXISTS Memory(memory_id STRING, content STRING, timestamp STRING, importance INT, PRIMARY KEY(memory_id))"
             self.conn.execute(create_node_query)
 
             # 创建关系类型
-            print("创建RELATED_TO关系表...")
+            logger.debug("创建RELATED_TO关系表...")
             create_rel1_query = "CREATE REL TABLE IF NOT EXISTS RELATED_TO(FROM Memory TO Memory, similarity FLOAT)"
             self.conn.execute(create_rel1_query)
 
-            print("创建FOLLOWS关系表...")
+            logger.debug("创建FOLLOWS关系表...")
             create_rel2_query = "CREATE REL TABLE IF NOT EXISTS FOLLOWS(FROM Memory TO Memory, time_diff FLOAT)"
             self.conn.execute(create_rel2_query)
 
             # 验证表是否创建成功
-            print("验证表结构...")
+            logger.debug("验证表结构...")
             try:
                 # 在KuZu中查询节点表
                 tables_query = "MATCH (n:Memory) RETURN COUNT(n) AS count"
@@ -85,47 +252,169 @@ class GraphMemoryStore:
                 count = 0
                 for row in tables_result:
                     count = row[0]
-                print(f"Memory节点表存在，当前记录数: {count}")
+                logger.info("Memory节点表存在，当前记录数: %s", count)
             except Exception as e:
-                print(f"验证Memory节点表时出错: {e}")
+                logger.warning("验证Memory节点表时出错: %s", e)
 
-            print("图数据库模式初始化完成")
+            logger.info("图数据库模式初始化完成")
         except Exception as e:
-            print(f"初始化图数据库模式时出错: {e}")
+            logger.error("初始化图数据库模式时出错: %s", e)
             raise e  # 重新抛出异常，因为模式初始化是关键步骤
 
-    def add_memory(self, content: str, importance: int = 1) -> str:
+    def _resolve_duplicate(self, content: str) -> Optional[str]:
+        """按去重策略处理近似重复的记忆
+
+        Args:
+            content: 待写入的记忆内容
+
+        Returns:
+            已有记忆的ID，不是重复时返回None
+        """
+        if self.dedup_index is None:
+            return None
+        existing_id = self.dedup_index.find(content)
+        if existing_id is None:
+            return None
+
+        metrics.inc("memory_duplicates_total", store="graph", policy=self.dedup_policy)
+        if self.dedup_policy == "merge":
+            self.conn.execute(
+                """
+                MATCH (m:Memory)
+                WHERE m.memory_id = $id
+                SET m.content = $content, m.timestamp = $timestamp
+                """,
+                {
+                    "id": existing_id,
+                    "content": content,
+                    "timestamp": datetime.now().isoformat(),
+                },
+            )
+            self.dedup_index.add(existing_id, content)
+            if self.retention is not None:
+                self.retention.track(existing_id, len(content.encode("utf-8")))
+            self.version += 1
+        elif self.dedup_policy == "bump":
+            result = self.conn.execute(
+                """
+                MATCH (m:Memory)
+                WHERE m.memory_id = $id
+                SET m.importance = CASE WHEN m.importance < 10 THEN m.importance + 1 ELSE 10 END
+                RETURN m.importance
+                """,
+                {"id": existing_id},
+            )
+            if self.retention is not None:
+                for (importance,) in result:
+                    self.retention.set_importance(existing_id, importance)
+            self.version += 1
+        logger.debug("记忆与 %s 近似重复，策略: %s", existing_id, self.dedup_policy)
+        return existing_id
+
+    def _delete_nodes(self, memory_ids: List[str]) -> None:
+        """删除记忆节点及其关系"""
+        self.conn.execute(
+            """
+            MATCH (m:Memory)
+            WHERE m.memory_id IN $ids
+            DETACH DELETE m
+            """,
+            {"ids": memory_ids},
+        )
+        for memory_id in memory_ids:
+            if self.dedup_index is not None:
+                self.dedup_index.remove(memory_id)
+            if self.retention is not None:
+                self.retention.forget(memory_id)
+        self.version += 1
+
+    def _evict(self, protect: Tuple[str, ...] = ()) -> List[str]:
+        """超出容量时淘汰保留分数最低的记忆"""
+        if self.retention is None:
+            return []
+        victims = self.retention.evict(protect)
+        if victims:
+            self._delete_nodes(victims)
+            metrics.inc("memory_evictions_total", len(victims), store="graph")
+            logger.debug("超出容量，淘汰 %s 条记忆", len(victims))
+        return victims
+
+    def delete_memory(self, memory_id: str) -> bool:
+        """删除一条记忆及其关系
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆是否存在并已删除
+        """
+        if self._reject_write("删除记忆"):
+            return False
+        try:
+            if self.get_memory_by_id(memory_id) is None:
+                return False
+            with self._write_lock:
+                self._delete_nodes([memory_id])
+            return True
+        except Exception as e:
+            logger.error("删除记忆时出错: %s", e)
+            return False
+
+    def add_memory(
+        self, content: str, importance: int = 1, memory_id: Optional[str] = None
+    ) -> str:
         """添加新记忆到图数据库
 
         Args:
             content: 记忆内容
             importance: 重要性评分 (1-10)
+            memory_id: 指定的记忆ID，为空时根据时间戳生成
 
         Returns:
             记忆ID
         """
+        if self._reject_write("写入记忆"):
+            return ""
+        with tracer.span("graph.add_memory"), self._write_lock:
+            return self._add_memory(content, importance, memory_id)
+
+    def _add_memory(
+        self, content: str, importance: int, memory_id: Optional[str]
+    ) -> str:
+        """插入记忆节点并建立时间和相似关系"""
+        start = time.perf_counter()
         timestamp = datetime.now().isoformat()
-        memory_id = f"mem_{timestamp.replace(':', '_').replace('.', '_')}"
+        memory_id = memory_id or f"mem_{timestamp.replace(':', '_').replace('.', '_')}"
 
         try:
+            existing_id = self._resolve_duplicate(content)
+            if existing_id is not None:
+                return existing_id
+
             # 插入记忆节点 - 使用KuZu支持的语法
             query = """
             CREATE (m:Memory {memory_id: $id, content: $content, timestamp: $timestamp, importance: $importance})
             """
-            print(f"执行创建节点查询: {query}")
-            print(
-                f"参数: id={memory_id}, content={content}, timestamp={timestamp}, importance={importance}"
+            logger.debug("执行创建节点查询: %s", query)
+            logger.debug(
+                "参数: id=%s, content=%s, timestamp=%s, importance=%s",
+                memory_id,
+                content,
+                timestamp,
+                importance,
             )
 
-            self.conn.execute(
-                query,
-                {
-                    "id": memory_id,
-                    "content": content,
-                    "timestamp": timestamp,
-                    "importance": importance,
-                },
-            )
+            with tracer.span("graph.insert"):
+                self.conn.execute(
+                    query,
+                    {
+                        "id": memory_id,
+                        "content": content,
+                        "timestamp": timestamp,
+                        "importance": importance,
+                    },
+                )
+            self.version += 1
 
             # 验证节点是否创建成功
             verify_query = """
@@ -133,43 +422,268 @@ class GraphMemoryStore:
             WHERE m.memory_id = $id
             RETURN m.memory_id, m.content
             """
-            result = self.conn.execute(verify_query, {"id": memory_id})
-            found = False
-            for row in result:
-                found = True
-                print(f"验证节点创建成功: {row}")
+            with tracer.span("graph.verify"):
+                result = self.conn.execute(verify_query, {"id": memory_id})
+                found = False
+                for row in result:
+                    found = True
+                    logger.debug("验证节点创建成功: %s", row)
 
             if not found:
-                print(f"警告: 节点创建后无法验证")
+                logger.warning("节点 %s 创建后无法验证", memory_id)
+            if self.dedup_index is not None:
+                self.dedup_index.add(memory_id, content)
+            if self.retention is not None:
+                self.retention.track(
+                    memory_id,
+                    len(content.encode("utf-8")),
+                    importance,
+                    datetime.fromisoformat(timestamp).timestamp(),
+                )
+                self._evict(protect=(memory_id,))
+
+            if self.defer_linking:
+                self._enqueue_links([(memory_id, content, timestamp)])
+            else:
+                # 连接到时间上相邻的记忆
+                with tracer.span("graph.link_recent"):
+                    self._connect_to_recent_memories(memory_id, timestamp)
+
+                # 连接到语义相似的记忆
+                with tracer.span("graph.link_similar"):
+                    self._connect_to_similar_memories(memory_id, content)
+
+            metrics.inc("memory_writes_total", store="graph")
+            metrics.observe(
+                "memory_write_seconds", time.perf_counter() - start, store="graph"
+            )
+            return memory_id
+        except Exception as e:
+            metrics.inc("memory_write_errors_total", store="graph")
+            logger.error("添加记忆时出错: %s", e)
+            return ""
 
-            # 连接到时间上相邻的记忆
-            self._connect_to_recent_memories(memory_id, timestamp)
+    def add_memories(
+        self,
+        contents: List[str],
+        importance: int = 1,
+        memory_ids: Optional[List[str]] = None,
+        link: bool = True,
+    ) -> List[str]:
+        """批量添加记忆，所有节点用一条UNWIND语句插入
 
-            # 连接到语义相似的记忆
-            self._connect_to_similar_memories(memory_id, content)
+        Args:
+            contents: 记忆内容列表
+            importance: 重要性评分 (1-10)
+            memory_ids: 与contents一一对应的记忆ID，为空时自动生成
+            link: 是否为每条记忆建立时间和相似关系；大批量导入时关闭可避免逐条扫描全图
 
-            return memory_id
+        Returns:
+            记忆ID列表，插入失败时为空列表
+        """
+        import uuid
+
+        if self._reject_write("写入记忆"):
+            return []
+        if memory_ids is None:
+            memory_ids = [f"mem_{str(uuid.uuid4())[:8]}" for _ in contents]
+        if len(memory_ids) != len(contents):
+            raise ValueError("memory_ids与contents的长度不一致")
+
+        start = time.perf_counter()
+        timestamp = datetime.now().isoformat()
+        memory_ids = list(memory_ids)
+        rows = []
+        try:
+            with (
+                tracer.span("graph.add_memories", count=len(contents), link=link),
+                self._write_lock,
+            ):
+                for i, content in enumerate(contents):
+                    existing_id = self._resolve_duplicate(content)
+                    if existing_id is not None:
+                        memory_ids[i] = existing_id
+                        continue
+                    if self.dedup_index is not None:
+                        self.dedup_index.add(memory_ids[i], content)
+                    rows.append(
+                        {
+                            "id": memory_ids[i],
+                            "content": content,
+                            "timestamp": timestamp,
+                            "importance": importance,
+                        }
+                    )
+
+                if rows:
+                    with tracer.span("graph.insert"):
+                        self.conn.execute(
+                            """
+                            UNWIND $rows AS r
+                            CREATE (m:Memory {memory_id: r.id, content: r.content, timestamp: r.timestamp, importance: r.importance})
+                            """,
+                            {"rows": rows},
+                        )
+                    self.version += 1
+
+                if self.retention is not None:
+                    for row in rows:
+                        self.retention.track(
+                            row["id"],
+                            len(row["content"].encode("utf-8")),
+                            importance,
+                            datetime.fromisoformat(timestamp).timestamp(),
+                        )
+                    if self._evict():
+                        rows = [row for row in rows if row["id"] in self.retention]
+
+                if link and self.defer_linking:
+                    self._enqueue_links(
+                        [(row["id"], row["content"], timestamp) for row in rows]
+                    )
+                elif link:
+                    for row in rows:
+                        with tracer.span("graph.link_recent"):
+                            self._connect_to_recent_memories(row["id"], timestamp)
+                        with tracer.span("graph.link_similar"):
+                            self._connect_to_similar_memories(row["id"], row["content"])
         except Exception as e:
-            print(f"添加记忆时出错: {e}")
-            return ""
+            metrics.inc("memory_write_errors_total", store="graph")
+            logger.error("批量添加记忆时出错: %s", e)
+            return []
+
+        metrics.inc("memory_writes_total", len(rows), store="graph")
+        metrics.observe(
+            "memory_write_seconds", time.perf_counter() - start, store="graph"
+        )
+        return memory_ids
+
+    def _enqueue_links(self, items: List[Tuple[str, str, str]]) -> None:
+        """把刚插入的记忆交给后台线程建立关系"""
+        with self._link_cond:
+            self._link_submitted += len(items)
+            self._unlinked.update(item[0] for item in items)
+        for item in items:
+            self._link_queue.put(item)
+
+    def _run_linker(self) -> None:
+        """后台线程：分批为记忆建立关系，直到收到停止信号"""
+        stop = False
+        while not stop:
+            item = self._link_queue.get()
+            if item is _STOP_LINKER:
+                break
+            batch = [item]
+            while len(batch) < self.link_batch_size:
+                try:
+                    item = self._link_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP_LINKER:
+                    stop = True
+                    break
+                batch.append(item)
+            self._link_batch(batch)
+
+    def _link_transaction(self, items: List[Tuple[str, str, str]]) -> bool:
+        """在一个写事务中为记忆建立时间和相似关系，失败时回滚
+
+        Args:
+            items: (记忆ID, 内容, 时间戳)列表
+
+        Returns:
+            事务是否已提交
+        """
+        conn = self._linker_conn
+        try:
+            conn.execute("BEGIN TRANSACTION")
+            for memory_id, content, timestamp in items:
+                with tracer.span("graph.link_recent"):
+                    self._connect_to_recent_memories(memory_id, timestamp, conn)
+                with tracer.span("graph.link_similar"):
+                    self._connect_to_similar_memories(
+                        memory_id, content, conn, timestamp
+                    )
+            conn.execute("COMMIT")
+            return True
+        except Exception as e:
+            logger.error("后台建立 %s 条记忆的关系时出错: %s", len(items), e)
+            # 不回滚的话后台连接会一直占着写事务，之后的写入全部失败
+            try:
+                conn.execute("ROLLBACK")
+            except Exception as rollback_error:
+                logger.debug("回滚后台连接的事务时出错: %s", rollback_error)
+            return False
+
+    def _link_batch(self, batch: List[Tuple[str, str, str]]) -> None:
+        """为一批记忆建立关系，整批失败时逐条重试"""
+        with tracer.span("graph.link_batch", count=len(batch)), self._write_lock:
+            if self._link_transaction(batch):
+                linked, failed = batch, []
+            else:
+                linked, failed = [], []
+                for item in batch:
+                    (linked if self._link_transaction([item]) else failed).append(item)
+
+        # 只有提交成功的记忆推进水位，失败的记忆保留在未连接集合中
+        with self._link_cond:
+            self.link_watermark += len(linked)
+            self.failed_links += len(failed)
+            self._unlinked.difference_update(item[0] for item in linked)
+            self._link_cond.notify_all()
+        if failed:
+            metrics.inc("memory_write_errors_total", len(failed), store="graph")
+        logger.debug("后台连接 %s 条记忆，水位: %s", len(linked), self.link_watermark)
+
+    @property
+    def pending_links(self) -> int:
+        """已插入但尚未处理的记忆条数（不含建立关系失败的记忆）"""
+        with self._link_cond:
+            return self._link_submitted - self.link_watermark - self.failed_links
+
+    def is_linked(self, memory_id: str) -> bool:
+        """记忆的关系是否已经建立（未开启后台连接时总是为True）"""
+        with self._link_cond:
+            return memory_id not in self._unlinked
+
+    def wait_for_links(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的记忆全部处理完（建立关系或重试后失败）
+
+        Args:
+            timeout: 最长等待时间（秒），为None时一直等待
+
+        Returns:
+            是否在超时前全部完成
+        """
+        with self._link_cond:
+            return self._link_cond.wait_for(
+                lambda: self.link_watermark + self.failed_links >= self._link_submitted,
+                timeout,
+            )
 
-    def _connect_to_recent_memories(self, memory_id: str, timestamp: str) -> None:
+    def _connect_to_recent_memories(
+        self, memory_id: str, timestamp: str, conn: Optional[Any] = None
+    ) -> None:
         """连接到时间上相邻的记忆
 
+        只考虑不晚于该记忆的节点，后台连接时后写入的记忆不会被连到较早的记忆上。
+
         Args:
             memory_id: 记忆ID
             timestamp: 时间戳
+            conn: 执行查询的连接，默认使用主连接
         """
+        conn = conn or self.conn
         try:
             # 获取最近的记忆
             query = """
             MATCH (m:Memory)
-            WHERE m.memory_id <> $id
+            WHERE m.memory_id <> $id AND m.timestamp <= $timestamp
             RETURN m.memory_id, m.timestamp
             ORDER BY m.timestamp DESC
             LIMIT 5
             """
-            result = self.conn.execute(query, {"id": memory_id})
+            result = conn.execute(query, {"id": memory_id, "timestamp": timestamp})
 
             # 创建时间关系
             current_time = datetime.fromisoformat(timestamp)
@@ -186,33 +700,53 @@ class GraphMemoryStore:
                     MATCH (m1:Memory {memory_id: $id1}), (m2:Memory {memory_id: $id2})
                     CREATE (m1)-[r:FOLLOWS {time_diff: $time_diff}]->(m2)
                     """
-                    self.conn.execute(
+                    conn.execute(
                         rel_query,
                         {"id1": memory_id, "id2": other_id, "time_diff": time_diff},
                     )
-                    print(
-                        f"创建时间关系: {memory_id} -> {other_id} (时间差: {time_diff}秒)"
+                    metrics.inc(
+                        "memory_edges_created_total", store="graph", type="FOLLOWS"
+                    )
+                    logger.debug(
+                        "创建时间关系: %s -> %s (时间差: %s秒)",
+                        memory_id,
+                        other_id,
+                        time_diff,
                     )
                 except Exception as e:
-                    print(f"处理时间关系时出错: {e}")
+                    logger.error("处理时间关系时出错: %s", e)
         except Exception as e:
-            print(f"连接到最近记忆时出错: {e}")
-
-    def _connect_to_similar_memories(self, memory_id: str, content: str) -> None:
+            logger.error("连接到最近记忆时出错: %s", e)
+
+    def _connect_to_similar_memories(
+        self,
+        memory_id: str,
+        content: str,
+        conn: Optional[Any] = None,
+        timestamp: Optional[str] = None,
+    ) -> None:
         """连接到语义相似的记忆
 
         Args:
             memory_id: 记忆ID
             content: 记忆内容
+            conn: 执行查询的连接，默认使用主连接
+            timestamp: 只与不晚于该时间的记忆比较，为None时与所有记忆比较
         """
+        conn = conn or self.conn
         try:
             # 获取所有其他记忆
-            query = """
+            condition = "m.memory_id <> $id"
+            params = {"id": memory_id}
+            if timestamp is not None:
+                condition += " AND m.timestamp <= $timestamp"
+                params["timestamp"] = timestamp
+            query = f"""
             MATCH (m:Memory)
-            WHERE m.memory_id <> $id
+            WHERE {condition}
             RETURN m.memory_id, m.content
             """
-            result = self.conn.execute(query, {"id": memory_id})
+            result = conn.execute(query, params)
 
             # 计算相似度并创建关系
             for row in result:
@@ -261,20 +795,26 @@ class GraphMemoryStore:
                     MATCH (m1:Memory {memory_id: $id1}), (m2:Memory {memory_id: $id2})
                     CREATE (m1)-[r:RELATED_TO {similarity: $similarity}]->(m2)
                     """
-                    self.conn.execute(
+                    conn.execute(
                         rel_query,
                         {"id1": memory_id, "id2": other_id, "similarity": similarity},
                     )
-                    print(
-                        f"创建相似度关系: {memory_id} -> {other_id} (相似度: {similarity})"
+                    metrics.inc(
+                        "memory_edges_created_total", store="graph", type="RELATED_TO"
+                    )
+                    logger.debug(
+                        "创建相似度关系: %s -> %s (相似度: %s)",
+                        memory_id,
+                        other_id,
+                        similarity,
                     )
         except Exception as e:
-            print(f"连接到相似记忆时出错: {e}")
+            logger.error("连接到相似记忆时出错: %s", e)
 
     def retrieve_relevant_memories(
         self, query: str, limit: int = 5, similarity_threshold: float = 0.0
     ) -> List[Dict[str, Any]]:
-        """检索与查询相关的记忆
+        """检索与查询相关的记忆，配置了检索缓存时优先读取缓存
 
         Args:
             query: 查询字符串
@@ -284,6 +824,31 @@ class GraphMemoryStore:
         Returns:
             记忆列表，按重要性排序
         """
+        start = time.perf_counter()
+        with tracer.span("graph.retrieve", limit=limit) as span:
+            if self.retrieval_cache is None:
+                memories = self._retrieve(query, limit, similarity_threshold)
+            else:
+                memories = self.retrieval_cache.get_or_compute(
+                    query,
+                    limit,
+                    self.version,
+                    lambda: self._retrieve(query, limit, similarity_threshold),
+                    similarity_threshold,
+                )
+            span.set_attribute("results", len(memories))
+        if self.retention is not None:
+            self.retention.touch(memory["id"] for memory in memories)
+        metrics.inc("memory_retrievals_total", store="graph")
+        metrics.observe(
+            "memory_retrieve_seconds", time.perf_counter() - start, store="graph"
+        )
+        return memories
+
+    def _retrieve(
+        self, query: str, limit: int, similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """按重要性取出候选记忆并做字符串匹配打分"""
         try:
             # 首先获取所有记忆，按重要性排序
             cypher_query = """
@@ -292,73 +857,87 @@ class GraphMemoryStore:
             ORDER BY m.importance DESC
             LIMIT $limit
             """
-            result = self.conn.execute(cypher_query, {"limit": limit})
-
-            # 处理查询结果
-            memories = []
-            for row in result:
-                try:
-                    memory_id, content, timestamp, importance = row
-                    print(f"找到记忆: {row}")
-                    memories.append(
-                        {
-                            "id": memory_id,
-                            "content": content,
-                            "timestamp": timestamp,
-                            "importance": importance,
-                        }
-                    )
-                except Exception as e:
-                    print(f"处理记忆行时出错: {e}")
-
-            print(f"检索到 {len(memories)} 条记忆")
+            with tracer.span("graph.query", limit=limit):
+                result = self.conn.execute(cypher_query, {"limit": limit})
+
+                # 处理查询结果
+                memories = []
+                for row in result:
+                    try:
+                        memory_id, content, timestamp, importance = row
+                        logger.debug("找到记忆: %s", row)
+                        memories.append(
+                            {
+                                "id": memory_id,
+                                "content": content,
+                                "timestamp": timestamp,
+                                "importance": importance,
+                            }
+                        )
+                    except Exception as e:
+                        logger.error("处理记忆行时出错: %s", e)
+
+            metrics.inc("memory_candidates_scanned_total", len(memories), store="graph")
+            logger.debug("检索到 %s 条记忆", len(memories))
 
             # 如果查询为空，返回所有记忆
             if not query.strip():
-                print(f"筛选后剩余 {len(memories)} 条相关记忆")
+                logger.debug("筛选后剩余 %s 条相关记忆", len(memories))
                 return memories
 
-            # 计算每条记忆与查询的相似度
-            relevant_memories = []
-            for memory in memories:
-                # 简单的字符串匹配相似度计算
-                content = memory["content"].lower()
-                query_lower = query.lower()
-
-                # 检查是否包含查询词
-                if query_lower in content:
-                    # 计算一个简单的相似度分数
-                    similarity = 0.5  # 基础分数
-                    # 如果是精确匹配或接近精确匹配，给更高分数
-                    if content == query_lower:
-                        similarity = 1.0
-                    elif content.startswith(query_lower) or content.endswith(
-                        query_lower
-                    ):
-                        similarity = 0.8
-
-                    # 调整相似度分数，考虑记忆的重要性
-                    adjusted_similarity = similarity * (1 + memory["importance"] / 10)
-
-                    print(
-                        f"记忆 '{memory['content']}' 与查询 '{query}' 的相似度: {adjusted_similarity}"
-                    )
-
-                    if adjusted_similarity >= similarity_threshold:
-                        memory["similarity"] = adjusted_similarity
-                        relevant_memories.append(memory)
-                else:
-                    print(f"记忆 '{memory['content']}' 与查询 '{query}' 的相似度: 0.0")
-
-            # 按相似度和重要性排序
-            relevant_memories.sort(
-                key=lambda x: (x.get("similarity", 0), x["importance"]), reverse=True
-            )
+            with tracer.span("graph.score", candidates=len(memories)):
+                # 计算每条记忆与查询的相似度
+                relevant_memories = []
+                for memory in memories:
+                    # 简单的字符串匹配相似度计算
+                    content = memory["content"].lower()
+                    query_lower = query.lower()
+
+                    # 检查是否包含查询词
+                    if query_lower in content:
+                        # 计算一个简单的相似度分数
+                        similarity = 0.5  # 基础分数
+                        # 如果是精确匹配或接近精确匹配，给更高分数
+                        if content == query_lower:
+                            similarity = 1.0
+                        elif content.startswith(query_lower) or content.endswith(
+                            query_lower
+                        ):
+                            similarity = 0.8
+
+                        # 调整相似度分数，考虑记忆的重要性
+                        adjusted_similarity = similarity * (
+                            1 + memory["importance"] / 10
+                        )
+
+                        logger.debug(
+                            "记忆 '%s' 与查询 '%s' 的相似度: %s",
+                            memory["content"],
+                            query,
+                            adjusted_similarity,
+                        )
+
+                        if adjusted_similarity >= similarity_threshold:
+                            memory["similarity"] = adjusted_similarity
+                            relevant_memories.append(memory)
+                    else:
+                        logger.debug(
+                            "记忆 '%s' 与查询 '%s' 的相似度: 0.0",
+                            memory["content"],
+                            query,
+                        )
+
+                # 按相似度和重要性排序
+                relevant_memories.sort(
+                    key=lambda x: (x.get("similarity", 0), x["importance"]),
+                    reverse=True,
+                )
 
-            print(f"筛选后剩余 {len(relevant_memories)} 条相关记忆")
+            logger.debug("筛选后剩余 %s 条相关记忆", len(relevant_memories))
             return relevant_memories[:limit]
         except Exception as e:
-            print(f"检索相关记忆时出错: {e}")
+            metrics.inc("memory_retrieval_errors_total", store="graph")
+            logger.error("检索相关记忆时出错: %s", e)
             return []
 
     def get_memory_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
@@ -389,7 +968,7 @@ class GraphMemoryStore:
 
             return None
         except Exception as e:
-            print(f"通过ID获取记忆时出错: {e}")
+            logger.error("通过ID获取记忆时出错: %s", e)
             return None
 
     def update_memory_importance(self, memory_id: str, importance: int) -> bool:
@@ -402,6 +981,8 @@ class GraphMemoryStore:
         Returns:
             更新是否成功
         """
+        if self._reject_write("更新重要性"):
+            return False
         try:
             query = """
             MATCH (m:Memory)
@@ -409,13 +990,87 @@ class GraphMemoryStore:
             SET m.importance = $importance
             """
 
-            self.conn.execute(query, {"id": memory_id, "importance": importance})
+            with self._write_lock:
+                self.conn.execute(query, {"id": memory_id, "importance": importance})
+            if self.retention is not None:
+                self.retention.set_importance(memory_id, importance)
+            self.version += 1
             return True
         except Exception as e:
-            print(f"更新记忆重要性时出错: {e}")
+            logger.error("更新记忆重要性时出错: %s", e)
             return False
 
 
+def _store_config(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """取出GraphMemoryStore参数中可以比较的配置值
+
+    检索缓存和容量策略按各自的参数比较，其他对象不参与比较；
+    与默认值相同的参数视为未传入。
+
+    Args:
+        kwargs: 传给GraphMemoryStore的参数
+
+    Returns:
+        参数名到配置值的映射
+    """
+    defaults = inspect.signature(GraphMemoryStore.__init__).parameters
+    config = {}
+    for name, value in kwargs.items():
+        if isinstance(value, RetrievalCache):
+            value = ("RetrievalCache", value.max_size, value.ttl)
+        elif isinstance(value, RetentionPolicy):
+            value = (
+                "RetentionPolicy",
+                value.max_memories,
+                value.max_bytes,
+                value.half_life,
+            )
+        elif value is not None and not isinstance(value, (bool, int, float, str)):
+            continue
+        if name in defaults and defaults[name].default == value:
+            continue
+        config[name] = value
+    return config
+
+
+def acquire_graph_store(db_path: str = DEFAULT_DB_PATH, **kwargs) -> GraphMemoryStore:
+    """从进程级注册表获取共享的图记忆存储
+
+    同一数据库文件只打开一次，多个工具共享同一个Database和缓冲池。
+    只有首次创建存储时kwargs才会生效，之后传入的配置值与首次不同时记录警告。
+
+    Args:
+        db_path: 数据库文件路径
+        kwargs: 传给GraphMemoryStore的其他参数
+
+    Returns:
+        共享的GraphMemoryStore实例
+    """
+    # 只读和读写方式打开的数据库不能共用，read_only作为键的一部分
+    key = (
+        "graph",
+        os.path.abspath(GraphMemoryStore.resolve_db_path(db_path)),
+        bool(kwargs.get("read_only", False)),
+    )
+    return registry.acquire(
+        key,
+        lambda: GraphMemoryStore(db_path=db_path, **kwargs),
+        params=_store_config(kwargs),
+    )
+
+
+def release_graph_store(memory_store: GraphMemoryStore) -> bool:
+    """释放对共享图记忆存储的引用，最后一个引用释放时关闭数据库
+
+    Args:
+        memory_store: 通过acquire_graph_store获取的存储
+
+    Returns:
+        存储是否已被关闭
+    """
+    return registry.release(memory_store)
+
+
 class MemorySaveTool(BaseTool):
     """保存记忆到图数据库的工具"""
 
@@ -423,7 +1078,8 @@ class MemorySaveTool(BaseTool):
     description: ClassVar[str] = (
         "保存重要信息到记忆库中以便将来检索。输入应该是一个包含'content'和可选'importance'的JSON。"
     )
-    memory_store: GraphMemoryStore = Field(default_factory=GraphMemoryStore)
+    memory_store: GraphMemoryStore = Field(default_factory=acquire_graph_store)
+    write_queue: Optional[WriteBehindQueue] = None
 
     def _run(self, content: str, importance: int = 1) -> str:
         """保存记忆
@@ -435,7 +1091,11 @@ class MemorySaveTool(BaseTool):
         Returns:
             操作结果消息
         """
-        memory_id = self.memory_store.add_memory(content, importance)
+        with tracer.span("tool.save_memory", store="graph"):
+            if self.write_queue is not None:
+                memory_id = self.write_queue.submit(content, importance)
+            else:
+                memory_id = self.memory_store.add_memory(content, importance)
         if memory_id:
             return f"记忆已保存，ID: {memory_id}"
         else:
@@ -447,7 +1107,10 @@ class MemoryRetrieveTool(BaseTool):
 
     name: ClassVar[str] = "retrieve_memories"
     description: ClassVar[str] = "检索与查询相关的记忆。输入应该是查询字符串。"
-    memory_store: GraphMemoryStore = Field(default_factory=GraphMemoryStore)
+    memory_store: GraphMemoryStore = Field(default_factory=acquire_graph_store)
+    write_queue: Optional[WriteBehindQueue] = None
+    token_budget: int = 1000
+    max_memory_tokens: int = 300
 
     def _run(self, query: str, limit: int = 5) -> str:
         """检索相关记忆
@@ -459,42 +1122,93 @@ class MemoryRetrieveTool(BaseTool):
         Returns:
             格式化的记忆列表
         """
-        print(f"开始检索记忆，查询: '{query}'")
-        memories = self.memory_store.retrieve_relevant_memories(query, limit)
-
-        if not memories:
-            return "没有找到相关记忆。"
-
-        result = f"找到以下相关记忆 (共{len(memories)}条):\n\n"
-        for i, memory in enumerate(memories, 1):
-            try:
-                timestamp = datetime.fromisoformat(memory["timestamp"]).strftime(
-                    "%Y-%m-%d %H:%M:%S"
+        with tracer.span("tool.retrieve_memories", store="graph"):
+            logger.debug("开始检索记忆，查询: '%s'", query)
+            # 先写完排队的记忆，保证本会话保存的记忆可以被检索到
+            if self.write_queue is not None:
+                self.write_queue.flush()
+            memories = self.memory_store.retrieve_relevant_memories(query, limit)
+            with tracer.span("tool.format", results=len(memories)) as span:
+                packed = pack_memories(
+                    memories,
+                    query,
+                    self._format_memory,
+                    self.token_budget,
+                    self.max_memory_tokens,
                 )
-                result += f"{i}. [{timestamp}] (重要性: {memory['importance']})\n   {memory['content']}\n\n"
-            except Exception as e:
-                print(f"格式化记忆时出错: {e}")
-                result += f"{i}. 记忆格式化错误: {str(memory)}\n\n"
+                span.set_attribute("dropped", packed.dropped)
+            if packed.dropped or packed.truncated:
+                logger.debug(
+                    "检索结果超出token预算，截断 %s 条，丢弃 %s 条",
+                    packed.truncated,
+                    packed.dropped,
+                )
+            return packed.text
 
-        return result
+    @staticmethod
+    def _format_memory(i: int, memory: Dict[str, Any], content: str) -> str:
+        """格式化单条记忆，content为按预算截取后的内容"""
+        timestamp = datetime.fromisoformat(memory["timestamp"]).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        return f"{i}. [{timestamp}] (重要性: {memory['importance']})\n   {content}"
 
 
 def create_memory_tools(
-    db_path: str = "db_cache/test_db/memory_db.kuzu",
+    db_path: str = DEFAULT_DB_PATH,
+    cache_size: int = 128,
+    cache_ttl: float = 300.0,
+    dedup_policy: Optional[str] = None,
+    max_memories: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    write_behind: bool = False,
+    defer_linking: bool = False,
+    read_only: bool = False,
 ) -> Tuple[MemorySaveTool, MemoryRetrieveTool]:
     """创建记忆工具
 
     Args:
         db_path: 数据库文件路径
+        cache_size: 检索缓存容量，为0时不启用缓存
+        cache_ttl: 检索缓存的存活时间（秒）
+        dedup_policy: 近似重复的处理策略（skip/merge/bump），为None时不去重
+        max_memories: 最多保留的记忆条数，为None时不限制
+        max_bytes: 记忆内容的最大总字节数，为None时不限制
+        write_behind: 是否通过后台队列批量写入，开启后保存工具立即返回记忆ID
+        defer_linking: 是否由后台线程建立记忆之间的关系
+        read_only: 是否以只读方式打开数据库（只检索的工作进程使用，保存工具会返回失败）
 
     Returns:
         保存和检索记忆的工具元组
+
+    Raises:
+        ValueError: 同时指定read_only和write_behind（排队的写入无法保存，却会返回记忆ID）
     """
-    # 共享同一个记忆存储
-    memory_store = GraphMemoryStore(db_path=db_path)
+    if read_only and write_behind:
+        raise ValueError("只读模式不能使用后台写入队列")
+
+    retrieval_cache = RetrievalCache(cache_size, cache_ttl) if cache_size > 0 else None
+    retention = (
+        RetentionPolicy(max_memories, max_bytes)
+        if max_memories is not None or max_bytes is not None
+        else None
+    )
 
-    save_tool = MemorySaveTool(memory_store=memory_store)
-    retrieve_tool = MemoryRetrieveTool(memory_store=memory_store)
+    # 共享同一个记忆存储，同一数据库文件在进程内只打开一次
+    memory_store = acquire_graph_store(
+        db_path,
+        retrieval_cache=retrieval_cache,
+        dedup_policy=dedup_policy,
+        retention=retention,
+        defer_linking=defer_linking,
+        read_only=read_only,
+    )
+
+    write_queue = WriteBehindQueue(memory_store) if write_behind else None
+    save_tool = MemorySaveTool(memory_store=memory_store, write_queue=write_queue)
+    retrieve_tool = MemoryRetrieveTool(
+        memory_store=memory_store, write_queue=write_queue
+    )
 
     return save_tool, retrieve_tool
 
@@ -0,0 +1,403 @@
+import functools
+import inspect
+import time
+import logging
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, List, Optional, Any, Tuple, ClassVar, Union
+
+from langchain_core.tools import BaseTool
+
+from misc.context_packing import pack_memories
+from misc.metrics import metrics
+from misc.retrieval_cache import RetrievalCache
+from misc.utils import relevant_memories
+
+logger = logging.getLogger(__name__)
+
+
+class HybridMemoryStore:
+    """融合多个检索后端的混合记忆存储
+
+    写入时同一条记忆以相同ID写入所有后端；检索时并行查询各后端，
+    用倒数排名融合（RRF）或加权分数融合结果并按记忆ID去重。
+    每个后端有独立的单线程执行器和延迟预算，超时的后端结果会被丢弃，
+    不会拖慢整个工具调用。
+    """
+
+    def __init__(
+        self,
+        stores: Dict[str, Any],
+        weights: Optional[Dict[str, float]] = None,
+        fusion: str = "rrf",
+        rrf_k: int = 60,
+        latency_budget: Union[float, Dict[str, float]] = 1.0,
+        candidate_multiplier: int = 2,
+        retrieval_cache: Optional[RetrievalCache] = None,
+        on_close: Optional[Callable[[], Any]] = None,
+    ):
+        """初始化混合记忆存储
+
+        Args:
+            stores: 后端名称到记忆存储的映射，每个存储需实现
+                add_memory/retrieve_relevant_memories/get_memory_by_id
+            weights: 各后端的融合权重，默认均为1.0
+            fusion: 融合方式，"rrf"（倒数排名融合）或"weighted"（加权分数）
+            rrf_k: RRF的平滑常数
+            latency_budget: 检索延迟预算（秒），可以为所有后端统一指定，
+                也可以按后端名称分别指定
+            candidate_multiplier: 每个后端召回 limit*candidate_multiplier 条候选
+            retrieval_cache: 融合结果的缓存，为None时不缓存
+            on_close: close时调用一次的回调，用于释放从注册表获取的后端
+        """
+        if not stores:
+            raise ValueError("至少需要一个记忆存储后端")
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"不支持的融合方式: {fusion}")
+
+        self.stores = stores
+        self.weights = {name: 1.0 for name in stores}
+        self.weights.update(weights or {})
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+        self.retrieval_cache = retrieval_cache
+        self.on_close = on_close
+
+        if isinstance(latency_budget, dict):
+            self.latency_budget = {
+                name: latency_budget.get(name, 1.0) for name in stores
+            }
+        else:
+            self.latency_budget = {name: latency_budget for name in stores}
+
+        # 每个后端一个单线程执行器：同一后端的调用串行执行，慢后端互不影响
+        self.executors = {
+            name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"memory-{name}")
+            for name in stores
+        }
+
+        # 记录哪些后端的add_memory支持importance参数
+        self._accepts_importance = {
+            name: "importance" in inspect.signature(store.add_memory).parameters
+            for name, store in stores.items()
+        }
+
+    @property
+    def version(self) -> int:
+        """存储版本号，为各后端版本号之和，任一后端写入都会使其递增"""
+        return sum(getattr(store, "version", 0) for store in self.stores.values())
+
+    def add_memory(self, content: str, importance: int = 1) -> str:
+        """以相同ID将记忆写入所有后端
+
+        Args:
+            content: 记忆内容
+            importance: 重要性评分 (1-10)，仅传给支持该参数的后端
+
+        Returns:
+            记忆ID，所有后端都写入失败时返回空字符串
+        """
+        memory_id = f"mem_{str(uuid.uuid4())[:8]}"
+
+        futures = {}
+        for name, store in self.stores.items():
+            kwargs = {"memory_id": memory_id}
+            if self._accepts_importance[name]:
+                kwargs["importance"] = importance
+            # 复制上下文，让后端线程中的追踪span挂在当前调用之下
+            futures[name] = self.executors[name].submit(
+                contextvars.copy_context().run, store.add_memory, content, **kwargs
+            )
+
+        # 写入必须等待所有后端完成，不受延迟预算限制
+        succeeded = []
+        for name, future in futures.items():
+            try:
+                if future.result():
+                    succeeded.append(name)
+            except Exception as e:
+                logger.error("后端 %s 添加记忆时出错: %s", name, e)
+
+        if not succeeded:
+            return ""
+        if len(succeeded) < len(self.stores):
+            logger.warning("记忆 %s 仅写入了部分后端: %s", memory_id, succeeded)
+        return memory_id
+
+    def _collect(
+        self, query: str, limit: int
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], bool]:
+        """并行查询各后端，丢弃超出延迟预算的结果
+
+        Returns:
+            (后端名称到检索结果的映射, 是否所有后端都返回了结果)
+        """
+        start = time.monotonic()
+        futures = {
+            name: self.executors[name].submit(
+                contextvars.copy_context().run,
+                store.retrieve_relevant_memories,
+                query,
+                limit,
+            )
+            for name, store in self.stores.items()
+        }
+
+        results = {}
+        for name in sorted(futures, key=lambda n: self.latency_budget[n]):
+            remaining = self.latency_budget[name] - (time.monotonic() - start)
+            try:
+                results[name] = futures[name].result(timeout=max(remaining, 0))
+            except TimeoutError:
+                metrics.inc(
+                    "memory_backend_timeouts_total", store="hybrid", backend=name
+                )
+                logger.warning(
+                    "后端 %s 超出延迟预算 %s秒，已跳过", name, self.latency_budget[name]
+                )
+            except Exception as e:
+                logger.error("后端 %s 检索时出错: %s", name, e)
+        return results, len(results) == len(futures)
+
+    @staticmethod
+    def _raw_score(memory: Dict[str, Any]) -> float:
+        """读取后端返回的原始分数"""
+        return float(memory.get("score", memory.get("similarity", 0.0)))
+
+    def _fuse(self, results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """融合各后端结果并按记忆ID去重
+
+        Returns:
+            融合后的记忆列表，按融合分数降序
+        """
+        fused: Dict[str, Dict[str, Any]] = {}
+        for name, memories in results.items():
+            weight = self.weights.get(name, 1.0)
+            # 0分补足结果和占位记忆不参与融合，否则排名分数与真实命中几乎相同
+            memories = relevant_memories(memories)
+
+            if self.fusion == "weighted" and memories:
+                raw = [self._raw_score(m) for m in memories]
+                low, high = min(raw), max(raw)
+                span = high - low
+
+            for rank, memory in enumerate(memories, 1):
+                if self.fusion == "rrf":
+                    contribution = weight / (self.rrf_k + rank)
+                else:
+                    normalized = (
+                        (self._raw_score(memory) - low) / span if span > 0 else 1.0
+                    )
+                    contribution = weight * normalized
+
+                entry = fused.get(memory["id"])
+                if entry is None:
+                    entry = dict(memory)
+                    entry["score"] = 0.0
+                    entry["sources"] = []
+                    fused[memory["id"]] = entry
+                entry["score"] += contribution
+                entry["sources"].append(name)
+
+        return sorted(fused.values(), key=lambda m: m["score"], reverse=True)
+
+    def retrieve_relevant_memories(
+        self, query: str, limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """并行检索所有后端并融合结果，配置了检索缓存时优先读取缓存
+
+        Args:
+            query: 查询字符串
+            limit: 返回结果数量限制
+
+        Returns:
+            记忆列表，按融合分数排序，每条记忆附带 sources 字段
+        """
+        start = time.perf_counter()
+        if self.retrieval_cache is None:
+            memories, _ = self._retrieve(query, limit)
+        else:
+            key = self.retrieval_cache.make_key(query, limit, self.version)
+            memories = self.retrieval_cache.get(key)
+            if memories is None:
+                memories, complete = self._retrieve(query, limit)
+                # 有后端超时或出错时结果不完整，不写入缓存，后端恢复后重新检索
+                if complete:
+                    self.retrieval_cache.put(key, memories)
+        metrics.inc("memory_retrievals_total", store="hybrid")
+        metrics.observe(
+            "memory_retrieve_seconds", time.perf_counter() - start, store="hybrid"
+        )
+        return memories
+
+    def _retrieve(self, query: str, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """并行查询各后端并融合
+
+        Returns:
+            (融合后的记忆列表, 是否所有后端都返回了结果)
+        """
+        if not query or query.strip() == "":
+            logger.debug("查询为空，返回空列表")
+            return [], True
+
+        results, complete = self._collect(query, limit * self.candidate_multiplier)
+        memories = self._fuse(results)[:limit]
+        for rank, memory in enumerate(memories, 1):
+            memory["rank"] = rank
+
+        logger.debug(
+            "混合检索返回 %s 条相关记忆 (后端: %s)", len(memories), list(results)
+        )
+        return memories, complete
+
+    def get_memory_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """按后端顺序查找记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆信息或None
+        """
+        for store in self.stores.values():
+            memory = store.get_memory_by_id(memory_id)
+            if memory:
+                return memory
+        return None
+
+    def close(self) -> None:
+        """关闭各后端的执行器，不等待仍在运行的慢查询；再调用on_close释放后端"""
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class MemorySaveTool(BaseTool):
+    """保存记忆到混合存储的工具"""
+
+    name: ClassVar[str] = "save_memory"
+    description: ClassVar[str] = (
+        "保存重要信息到记忆库中以便将来检索。输入应该是记忆内容和可选的重要性评分(1-10)。"
+    )
+    memory_store: HybridMemoryStore
+
+    def _run(self, content: str, importance: int = 1) -> str:
+        """保存记忆
+
+        Args:
+            content: 记忆内容
+            importance: 重要性评分 (1-10)
+
+        Returns:
+            操作结果消息
+        """
+        memory_id = self.memory_store.add_memory(content, importance)
+        if memory_id:
+            return f"记忆已保存，ID: {memory_id}"
+        else:
+            return "保存记忆失败"
+
+
+class MemoryRetrieveTool(BaseTool):
+    """从混合存储检索记忆的工具"""
+
+    name: ClassVar[str] = "retrieve_memories"
+    description: ClassVar[str] = "检索与查询相关的记忆。输入应该是查询字符串。"
+    memory_store: HybridMemoryStore
+    token_budget: int = 1000
+    max_memory_tokens: int = 300
+
+    def _run(self, query: str, limit: int = 5) -> str:
+        """检索相关记忆
+
+        Args:
+            query: 查询内容
+            limit: 返回结果数量限制
+
+        Returns:
+            格式化的记忆列表
+        """
+        logger.debug("开始检索记忆，查询: '%s'", query)
+        memories = self.memory_store.retrieve_relevant_memories(query, limit)
+        packed = pack_memories(
+            memories,
+            query,
+            self._format_memory,
+            self.token_budget,
+            self.max_memory_tokens,
+        )
+        if packed.dropped or packed.truncated:
+            logger.debug(
+                "检索结果超出token预算，截断 %s 条，丢弃 %s 条",
+                packed.truncated,
+                packed.dropped,
+            )
+        return packed.text
+
+    @staticmethod
+    def _format_memory(i: int, memory: Dict[str, Any], content: str) -> str:
+        """格式化单条记忆，content为按预算截取后的内容"""
+        sources = ",".join(memory.get("sources", []))
+        return f"{i}. {content} (分数: {memory['score']:.4f}, 来源: {sources})"
+
+
+def create_memory_tools(
+    bm25_cache_dir: Optional[str] = "db_cache/bm25_db",
+    vector_cache_dir: Optional[str] = "db_cache/vector_db",
+    db_path: Optional[str] = None,
+    fusion: str = "rrf",
+    latency_budget: Union[float, Dict[str, float]] = 1.0,
+    cache_size: int = 128,
+    cache_ttl: float = 300.0,
+) -> Tuple[MemorySaveTool, MemoryRetrieveTool]:
+    """创建混合检索的记忆工具
+
+    Args:
+        bm25_cache_dir: BM25存储的缓存目录，为None时不启用
+        vector_cache_dir: 向量存储的缓存目录，为None时不启用
+        db_path: KuZu图数据库路径，为None时不启用
+        fusion: 融合方式，"rrf"或"weighted"
+        latency_budget: 各后端的检索延迟预算（秒）
+        cache_size: 融合结果缓存容量，为0时不启用缓存
+        cache_ttl: 融合结果缓存的存活时间（秒）
+
+    Returns:
+        保存和检索记忆的工具元组
+    """
+    stores = {}
+    on_close = None
+    if bm25_cache_dir:
+        from misc.memory_bm25 import BM25MemoryStore
+
+        stores["bm25"] = BM25MemoryStore(cache_dir=bm25_cache_dir)
+    if vector_cache_dir:
+        from misc.memory_vector import VectorMemoryStore
+
+        stores["vector"] = VectorMemoryStore(cache_dir=vector_cache_dir)
+    if db_path:
+        from misc.memory_graph import acquire_graph_store, release_graph_store
+
+        # 与图存储的记忆工具共享同一个数据库，关闭混合存储时释放引用
+        graph_store = acquire_graph_store(db_path)
+        stores["graph"] = graph_store
+        on_close = functools.partial(release_graph_store, graph_store)
+
+    # 共享同一个记忆存储
+    memory_store = HybridMemoryStore(
+        stores,
+        fusion=fusion,
+        latency_budget=latency_budget,
+        retrieval_cache=(
+            RetrievalCache(cache_size, cache_ttl) if cache_size > 0 else None
+        ),
+        on_close=on_close,
+    )
+
+    save_tool = MemorySaveTool(memory_store=memory_store)
+    retrieve_tool = MemoryRetrieveTool(memory_store=memory_store)
+
+    return save_tool, retrieve_tool
@@ -0,0 +1,598 @@
+"""
+本地记忆服务：多个Agent进程共享同一个记忆存储
+
+KuZu数据库文件同一时间只允许一个读写进程打开，BM25存储也没有跨进程同步。
+记忆服务在一个进程中持有存储，通过Unix套接字或本机TCP端口提供按行分隔的JSON请求：
+
+    {"id": 1, "method": "add_memory", "params": {"content": "...", "importance": 1}}
+    {"id": 1, "result": "mem_xxxxxxxx"}
+
+多个客户端同时提交的写入在短时间窗口内合并为一次add_memories调用；
+同时到达的相同检索只执行一次。存储调用都在单个工作线程中串行执行。
+
+启动服务：
+
+    python -m misc.memory_server --backend bm25 --cache-dir db_cache/bm25_db --socket /tmp/memory.sock
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, ClassVar
+
+from langchain_core.tools import BaseTool
+
+from misc.context_packing import pack_memories
+from misc.metrics import metrics
+from misc.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 服务端允许调用的方法
+METHODS = ("ping", "add_memory", "add_memories", "retrieve", "get", "delete")
+# 只读服务拒绝的写入方法
+WRITE_METHODS = ("add_memory", "add_memories", "delete")
+
+
+class MemoryServer:
+    """持有记忆存储并合并并发请求的asyncio服务"""
+
+    def __init__(
+        self,
+        memory_store: Any,
+        socket_path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        batch_window: float = 0.005,
+        max_batch: int = 64,
+        read_only: bool = False,
+    ):
+        """初始化服务
+
+        Args:
+            memory_store: 记忆存储，需实现add_memories/retrieve_relevant_memories/
+                get_memory_by_id
+            socket_path: Unix套接字路径，为None时监听TCP端口
+            host: TCP监听地址
+            port: TCP端口，为0时由系统分配
+            batch_window: 收到第一条写入后等待合并其他写入的时间（秒）
+            max_batch: 每次合并的最大写入条数
+            read_only: 是否只提供检索，为True时写入请求返回错误，不调用存储
+        """
+        self.memory_store = memory_store
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.read_only = read_only
+        self._accepts_importance = (
+            "importance" in inspect.signature(memory_store.add_memories).parameters
+        )
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writes: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    async def start(self) -> None:
+        """开始监听"""
+        # 存储不是线程安全的，所有存储调用在同一个工作线程中执行
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="memory-server"
+        )
+        self._writes = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_writes())
+
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self._server = await asyncio.start_unix_server(
+                self._handle, path=self.socket_path
+            )
+            logger.info("记忆服务监听 %s", self.socket_path)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, self.host, self.port
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            logger.info("记忆服务监听 %s:%s", self.host, self.port)
+
+    async def serve_forever(self) -> None:
+        """启动并一直运行，直到任务被取消"""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """停止监听，写完已排队的写入"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._batcher is not None:
+            await self._writes.join()
+            self._batcher.cancel()
+            self._batcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    async def _call(self, func, *args, **kwargs) -> Any:
+        """在存储工作线程中执行存储调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """处理一个客户端连接，同一连接上的请求按顺序应答"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._dispatch(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line: bytes) -> Dict[str, Any]:
+        """解析并执行一条请求"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = request["method"]
+            params = request.get("params", {})
+            if method not in METHODS:
+                raise ValueError(f"不支持的方法: {method}")
+            if self.read_only and method in WRITE_METHODS:
+                raise PermissionError(f"只读记忆服务不支持写入: {method}")
+            metrics.inc("memory_server_requests_total", method=method)
+            with tracer.span(f"server.{method}"):
+                result = await getattr(self, f"_do_{method}")(**params)
+            return {"id": request_id, "result": result}
+        except Exception as e:
+            logger.error("处理记忆服务请求时出错: %s", e)
+            return {"id": request_id, "error": str(e)}
+
+    async def _do_ping(self) -> str:
+        return "pong"
+
+    async def _do_add_memory(self, content: str, importance: int = 1) -> str:
+        future = asyncio.get_running_loop().create_future()
+        await self._writes.put((content, importance, future))
+        return await future
+
+    async def _do_add_memories(
+        self, contents: List[str], importance: int = 1
+    ) -> List[str]:
+        kwargs = {"importance": importance} if self._accepts_importance else {}
+        return await self._call(self.memory_store.add_memories, contents, **kwargs)
+
+    async def _do_retrieve(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        # 同时到达的相同检索只执行一次
+        key = (query, limit)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._call(self.memory_store.retrieve_relevant_memories, query, limit)
+            )
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            metrics.inc("memory_server_coalesced_total", method="retrieve")
+        return await asyncio.shield(future)
+
+    async def _do_get(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call(self.memory_store.get_memory_by_id, memory_id)
+
+    async def _do_delete(self, memory_id: str) -> bool:
+        return await self._call(self.memory_store.delete_memory, memory_id)
+
+    async def _batch_writes(self) -> None:
+        """合并一个时间窗口内的写入，按批调用add_memories"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._writes.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._writes.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._apply_writes(batch)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    async def _apply_writes(self, batch: List[Tuple[str, int, asyncio.Future]]) -> None:
+        """写入一批记忆，相同重要性的连续写入合并为一次add_memories调用"""
+        if len(batch) > 1:
+            metrics.inc("memory_server_coalesced_total", len(batch) - 1, method="add")
+        groups: List[Tuple[int, List[Tuple[str, int, asyncio.Future]]]] = []
+        for item in batch:
+            importance = item[1] if self._accepts_importance else 1
+            if groups and groups[-1][0] == importance:
+                groups[-1][1].append(item)
+            else:
+                groups.append((importance, [item]))
+
+        for importance, items in groups:
+            contents = [item[0] for item in items]
+            memory_ids = [f"mem_{str(uuid.uuid4())[:8]}" for _ in items]
+            kwargs = {"memory_ids": memory_ids}
+            if self._accepts_importance:
+                kwargs["importance"] = importance
+            try:
+                applied_ids = await self._call(
+                    self.memory_store.add_memories, contents, **kwargs
+                )
+            except Exception as e:
+                logger.error("记忆服务写入 %s 条记忆时出错: %s", len(items), e)
+                applied_ids = []
+            for i, (_, _, future) in enumerate(items):
+                if not future.done():
+                    future.set_result(applied_ids[i] if i < len(applied_ids) else "")
+
+
+class MemoryClient:
+    """记忆服务的同步客户端，接口与记忆存储相同"""
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        timeout: float = 30.0,
+    ):
+        """初始化客户端，首次请求时才建立连接
+
+        Args:
+            socket_path: 服务的Unix套接字路径
+            host: 服务的TCP地址，未指定socket_path时使用
+            port: 服务的TCP端口
+            timeout: 单次请求的超时时间（秒）
+        """
+        if socket_path is None and port is None:
+            raise ValueError("需要指定socket_path或port")
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        if self.socket_path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        else:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def call(self, method: str, **params) -> Any:
+        """发送一条请求并等待应答
+
+        Args:
+            method: 方法名
+            params: 方法参数
+
+        Returns:
+            服务返回的结果
+
+        Raises:
+            ConnectionError: 无法连接服务或连接中断
+            RuntimeError: 服务返回错误
+        """
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._next_id += 1
+                request = {"id": self._next_id, "method": method, "params": params}
+                self._file.write(json.dumps(request, ensure_ascii=False).encode())
+                self._file.write(b"\n")
+                self._file.flush()
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError("记忆服务关闭了连接")
+            except OSError as e:
+                # 连接断开后下次请求重新连接
+                self._disconnect()
+                raise ConnectionError(f"无法访问记忆服务: {e}") from e
+
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def add_memory(self, content: str, importance: int = 1) -> str:
+        """保存一条记忆
+
+        Args:
+            content: 记忆内容
+            importance: 重要性评分 (1-10)，服务端存储不支持时忽略
+
+        Returns:
+            记忆ID，失败时返回空字符串
+        """
+        try:
+            return self.call("add_memory", content=content, importance=importance)
+        except (ConnectionError, RuntimeError) as e:
+            logger.error("添加记忆时出错: %s", e)
+            return ""
+
+    def add_memories(self, contents: List[str], importance: int = 1) -> List[str]:
+        """批量保存记忆
+
+        Args:
+            contents: 记忆内容列表
+            importance: 重要性评分 (1-10)
+
+        Returns:
+            记忆ID列表，失败时为空列表
+        """
+        try:
+            return self.call("add_memories", contents=contents, importance=importance)
+        except (ConnectionError, RuntimeError) as e:
+            logger.error("批量添加记忆时出错: %s", e)
+            return []
+
+    def retrieve_relevant_memories(
+        self, query: str, limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """检索与查询相关的记忆
+
+        Args:
+            query: 查询字符串
+            limit: 返回结果数量限制
+
+        Returns:
+            记忆列表，失败时为空列表
+        """
+        try:
+            return self.call("retrieve", query=query, limit=limit)
+        except (ConnectionError, RuntimeError) as e:
+            logger.error("检索相关记忆时出错: %s", e)
+            return []
+
+    def get_memory_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """通过ID获取记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆信息或None
+        """
+        try:
+            return self.call("get", memory_id=memory_id)
+        except (ConnectionError, RuntimeError) as e:
+            logger.error("通过ID获取记忆时出错: %s", e)
+            return None
+
+    def delete_memory(self, memory_id: str) -> bool:
+        """删除一条记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆是否存在并已删除
+        """
+        try:
+            return self.call("delete", memory_id=memory_id)
+        except (ConnectionError, RuntimeError) as e:
+            logger.error("删除记忆时出错: %s", e)
+            return False
+
+    def close(self) -> None:
+        """关闭连接"""
+        with self._lock:
+            self._disconnect()
+
+
+class MemorySaveTool(BaseTool):
+    """通过记忆服务保存记忆的工具"""
+
+    name: ClassVar[str] = "save_memory"
+    description: ClassVar[str] = (
+        "保存重要信息到记忆库中以便将来检索。输入应该是记忆内容和可选的重要性评分(1-10)。"
+    )
+    memory_store: MemoryClient
+
+    def _run(self, content: str, importance: int = 1) -> str:
+        """保存记忆
+
+        Args:
+            content: 记忆内容
+            importance: 重要性评分 (1-10)
+
+        Returns:
+            操作结果消息
+        """
+        with tracer.span("tool.save_memory", store="server"):
+            memory_id = self.memory_store.add_memory(content, importance)
+        if memory_id:
+            return f"记忆已保存，ID: {memory_id}"
+        else:
+            return "保存记忆失败"
+
+
+class MemoryRetrieveTool(BaseTool):
+    """通过记忆服务检索记忆的工具"""
+
+    name: ClassVar[str] = "retrieve_memories"
+    description: ClassVar[str] = "检索与查询相关的记忆。输入应该是查询字符串。"
+    memory_store: MemoryClient
+    token_budget: int = 1000
+    max_memory_tokens: int = 300
+
+    def _run(self, query: str, limit: int = 5) -> str:
+        """检索相关记忆
+
+        Args:
+            query: 查询内容
+            limit: 返回结果数量限制
+
+        Returns:
+            格式化的记忆列表
+        """
+        with tracer.span("tool.retrieve_memories", store="server"):
+            logger.debug("开始检索记忆，查询: '%s'", query)
+            memories = self.memory_store.retrieve_relevant_memories(query, limit)
+            with tracer.span("tool.format", results=len(memories)):
+                packed = pack_memories(
+                    memories,
+                    query,
+                    self._format_memory,
+                    self.token_budget,
+                    self.max_memory_tokens,
+                )
+            if packed.dropped or packed.truncated:
+                logger.debug(
+                    "检索结果超出token预算，截断 %s 条，丢弃 %s 条",
+                    packed.truncated,
+                    packed.dropped,
+                )
+            return packed.text
+
+    @staticmethod
+    def _format_memory(i: int, memory: Dict[str, Any], content: str) -> str:
+        """格式化单条记忆，content为按预算截取后的内容"""
+        return f"{i}. {content} (ID: {memory['id']})"
+
+
+def create_memory_tools(
+    socket_path: Optional[str] = None,
+    host: str = "127.0.0.1",
+    port: Optional[int] = None,
+) -> Tuple[MemorySaveTool, MemoryRetrieveTool]:
+    """创建连接记忆服务的记忆工具
+
+    Args:
+        socket_path: 服务的Unix套接字路径
+        host: 服务的TCP地址
+        port: 服务的TCP端口
+
+    Returns:
+        保存和检索记忆的工具元组
+    """
+    # 共享同一个客户端连接
+    client = MemoryClient(socket_path=socket_path, host=host, port=port)
+
+    save_tool = MemorySaveTool(memory_store=client)
+    retrieve_tool = MemoryRetrieveTool(memory_store=client)
+
+    return save_tool, retrieve_tool
+
+
+def open_store(
+    backend: str, cache_dir: str, db_path: str, read_only: bool = False
+) -> Any:
+    """按后端名称打开服务持有的记忆存储
+
+    Args:
+        backend: "bm25"或"graph"
+        cache_dir: BM25存储的缓存目录
+        db_path: KuZu图数据库路径
+        read_only: 是否作为只检索的副本打开（图数据库只读打开，BM25读取其他进程追加的记录）
+
+    Returns:
+        记忆存储
+    """
+    if backend == "bm25":
+        from misc.memory_bm25 import BM25MemoryStore
+
+        return BM25MemoryStore(cache_dir=cache_dir, follow=read_only)
+    if backend == "graph":
+        from misc.memory_graph import GraphMemoryStore
+
+        if read_only:
+            return GraphMemoryStore(db_path=db_path, read_only=True)
+        return GraphMemoryStore(db_path=db_path, defer_linking=True)
+    raise ValueError(f"不支持的后端: {backend}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地记忆服务")
+    parser.add_argument("--backend", choices=("bm25", "graph"), default="bm25")
+    parser.add_argument("--cache-dir", default="db_cache/bm25_db")
+    parser.add_argument("--db-path", default="db_cache/test_db/memory_db.kuzu")
+    parser.add_argument("--socket", default=None, help="Unix套接字路径")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-window", type=float, default=0.005)
+    parser.add_argument("--read-only", action="store_true", help="只检索的副本")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    memory_store = open_store(
+        args.backend, args.cache_dir, args.db_path, read_only=args.read_only
+    )
+    server = MemoryServer(
+        memory_store,
+        socket_path=args.socket,
+        host=args.host,
+        port=args.port,
+        batch_window=args.batch_window,
+        read_only=args.read_only,
+    )
+
+    async def run() -> None:
+        task = asyncio.create_task(server.serve_forever())
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(run())
+    finally:
+        if hasattr(memory_store, "close"):
+            memory_store.close()
+        logger.info("记忆服务已停止")
+
+
+if __name__ == "__main__":
+    main()
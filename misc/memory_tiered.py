@@ -0,0 +1,460 @@
+import functools
+import heapq
+import inspect
+import math
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Any, Tuple, ClassVar
+
+from langchain_core.tools import BaseTool
+
+from misc.context_packing import pack_memories
+from misc.metrics import metrics
+from misc.retention import RetentionPolicy
+from misc.tokenizer import tokenize_text
+from misc.tracing import tracer
+from misc.utils import relevant_memories
+
+logger = logging.getLogger(__name__)
+
+
+class HotTier:
+    """常驻内存的热层：最近写入或经常被检索到的少量记忆及其倒排索引
+
+    容量满时按RetentionPolicy的保留分数（重要性、写入时间、访问次数）降级记忆，
+    被降级的记忆仍保存在冷层中。倒排索引随写入增量维护，检索只对包含查询词的记忆打分。
+    BM25的idf使用 log(1 + (N - n + 0.5) / (n + 0.5))，热层很小时分数也不会为负。
+    """
+
+    def __init__(self, capacity: int = 500, k1: float = 1.5, b: float = 0.75):
+        """初始化热层
+
+        Args:
+            capacity: 热层最多保留的记忆条数
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+        """
+        self.retention = RetentionPolicy(max_memories=capacity)
+        self.k1 = k1
+        self.b = b
+        self._memories: Dict[str, Dict[str, Any]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._memories)
+
+    def __contains__(self, memory_id: str) -> bool:
+        return memory_id in self._memories
+
+    def _index(self, memory_id: str, tokens: List[str]) -> None:
+        for token in tokens:
+            postings = self._postings.setdefault(token, {})
+            postings[memory_id] = postings.get(memory_id, 0) + 1
+        self._doc_lengths[memory_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def _unindex(self, memory_id: str) -> None:
+        memory = self._memories.pop(memory_id, None)
+        if memory is None:
+            return
+        for token in set(memory["tokens"]):
+            postings = self._postings[token]
+            del postings[memory_id]
+            if not postings:
+                del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(memory_id)
+
+    def add(self, memory_id: str, content: str, importance: int = 1) -> List[str]:
+        """放入一条记忆，超出容量时降级保留分数最低的记忆
+
+        Args:
+            memory_id: 记忆ID
+            content: 记忆内容
+            importance: 重要性评分
+
+        Returns:
+            被降级的记忆ID
+        """
+        tokens = tokenize_text(content)
+        with self._lock:
+            self._unindex(memory_id)
+            self._memories[memory_id] = {
+                "id": memory_id,
+                "content": content,
+                "tokens": tokens,
+            }
+            self._index(memory_id, tokens)
+            self.retention.track(memory_id, len(content.encode("utf-8")), importance)
+            demoted = self.retention.evict(protect=(memory_id,))
+            for victim in demoted:
+                self._unindex(victim)
+        return demoted
+
+    def remove(self, memory_id: str) -> None:
+        """移除一条记忆"""
+        with self._lock:
+            self._unindex(memory_id)
+            self.retention.forget(memory_id)
+
+    def get(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """按ID读取热层中的记忆"""
+        memory = self._memories.get(memory_id)
+        return {"id": memory["id"], "content": memory["content"]} if memory else None
+
+    def touch(self, memory_ids: List[str]) -> None:
+        """记录热层记忆被检索到一次"""
+        with self._lock:
+            self.retention.touch(memory_ids)
+
+    def search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """在热层中用BM25检索
+
+        Args:
+            query: 查询字符串
+            limit: 返回结果数量限制
+
+        Returns:
+            包含查询词的记忆列表，按BM25分数降序
+        """
+        tokenized_query = tokenize_text(query)
+        with self._lock:
+            if not self._memories:
+                return []
+            n_docs = len(self._memories)
+            avg_length = self._total_length / n_docs or 1.0
+            scores: Dict[str, float] = {}
+            for token in set(tokenized_query):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for memory_id, tf in postings.items():
+                    norm = (
+                        1 - self.b + self.b * self._doc_lengths[memory_id] / avg_length
+                    )
+                    scores[memory_id] = scores.get(memory_id, 0.0) + idf * tf * (
+                        self.k1 + 1
+                    ) / (tf + self.k1 * norm)
+
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda x: x[1])
+            return [
+                {
+                    "id": memory_id,
+                    "content": self._memories[memory_id]["content"],
+                    "score": score,
+                }
+                for memory_id, score in ranked
+            ]
+
+
+class TieredMemoryStore:
+    """冷热分层的记忆存储
+
+    所有记忆都写入磁盘上的冷层（BM25MemoryStore或GraphMemoryStore），同时放入
+    内存中的热层。检索先查热层，热层的前k条结果分数都不低于阈值时直接返回；
+    否则查询冷层，并在后台线程中把冷层命中的记忆提升到热层。
+    """
+
+    def __init__(
+        self,
+        cold_store: Any,
+        hot_capacity: int = 500,
+        score_threshold: float = 1.0,
+        on_close: Optional[Callable[[], Any]] = None,
+    ):
+        """初始化分层存储
+
+        Args:
+            cold_store: 冷层记忆存储，需实现add_memory/retrieve_relevant_memories/
+                get_memory_by_id
+            hot_capacity: 热层最多保留的记忆条数
+            score_threshold: 热层BM25分数阈值，前k条结果中有低于阈值的即回退到冷层
+            on_close: close时调用一次的回调，用于释放从注册表获取的冷层
+        """
+        self.cold_store = cold_store
+        self.hot = HotTier(hot_capacity)
+        self.score_threshold = score_threshold
+        self.on_close = on_close
+        self._hot_version = 0
+
+        # 记录冷层的写入方法是否支持importance参数
+        self._accepts_importance = {
+            name: "importance"
+            in inspect.signature(getattr(cold_store, name)).parameters
+            for name in ("add_memory", "add_memories")
+            if hasattr(cold_store, name)
+        }
+
+        # 单线程执行器：提升按提交顺序串行执行，不阻塞检索
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="memory-promote"
+        )
+
+    @property
+    def version(self) -> int:
+        """存储版本号，冷层写入或热层内容变化时递增"""
+        return getattr(self.cold_store, "version", 0) + self._hot_version
+
+    def _put_hot(self, memory_id: str, content: str, importance: int = 1) -> None:
+        demoted = self.hot.add(memory_id, content, importance)
+        self._hot_version += 1
+        if demoted:
+            metrics.inc("memory_demotions_total", len(demoted), store="tiered")
+            logger.debug("热层已满，降级 %s 条记忆", len(demoted))
+
+    def add_memory(self, content: str, importance: int = 1) -> str:
+        """写入冷层并放入热层
+
+        Args:
+            content: 记忆内容
+            importance: 重要性评分 (1-10)，冷层不支持时忽略
+
+        Returns:
+            记忆ID，冷层写入失败时返回空字符串
+        """
+        with tracer.span("tiered.add_memory"):
+            kwargs = {}
+            if self._accepts_importance["add_memory"]:
+                kwargs["importance"] = importance
+            memory_id = self.cold_store.add_memory(content, **kwargs)
+            if memory_id:
+                self._put_hot(memory_id, content, importance)
+            return memory_id
+
+    def add_memories(self, contents: List[str], importance: int = 1) -> List[str]:
+        """批量写入冷层，并把这批记忆放入热层
+
+        Args:
+            contents: 记忆内容列表
+            importance: 重要性评分 (1-10)，冷层不支持时忽略
+
+        Returns:
+            记忆ID列表
+        """
+        with tracer.span("tiered.add_memories", count=len(contents)):
+            kwargs = {}
+            if self._accepts_importance["add_memories"]:
+                kwargs["importance"] = importance
+            memory_ids = self.cold_store.add_memories(contents, **kwargs)
+            for memory_id, content in zip(memory_ids, contents):
+                self._put_hot(memory_id, content, importance)
+            return memory_ids
+
+    def retrieve_relevant_memories(
+        self, query: str, limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """先查热层，分数不足时回退到冷层
+
+        Args:
+            query: 查询字符串
+            limit: 返回结果数量限制
+
+        Returns:
+            记忆列表，每条记忆附带 tier 字段（hot/cold）
+        """
+        if not query or query.strip() == "":
+            logger.debug("查询为空，返回空列表")
+            return []
+
+        start = time.perf_counter()
+        with tracer.span("tiered.retrieve", limit=limit) as span:
+            with tracer.span("tiered.hot"):
+                memories = self.hot.search(query, limit)
+            if len(memories) >= limit and memories[-1]["score"] >= self.score_threshold:
+                tier = "hot"
+                self.hot.touch([memory["id"] for memory in memories])
+            else:
+                tier = "cold"
+                with tracer.span("tiered.cold"):
+                    # 冷层的0分补足结果和占位记忆不返回，也不提升到热层
+                    memories = [
+                        dict(memory)
+                        for memory in relevant_memories(
+                            self.cold_store.retrieve_relevant_memories(query, limit)
+                        )
+                    ]
+                if memories:
+                    self.executor.submit(
+                        contextvars.copy_context().run, self._promote, memories
+                    )
+            span.set_attribute("tier", tier)
+
+        for rank, memory in enumerate(memories, 1):
+            memory["rank"] = rank
+            memory["tier"] = tier
+        metrics.inc("memory_tier_hits_total", store="tiered", tier=tier)
+        metrics.inc("memory_retrievals_total", store="tiered")
+        metrics.observe(
+            "memory_retrieve_seconds", time.perf_counter() - start, store="tiered"
+        )
+        return memories
+
+    def _promote(self, memories: List[Dict[str, Any]]) -> None:
+        """把冷层命中的记忆提升到热层，已在热层的记忆记一次访问"""
+        promoted = 0
+        for memory in memories:
+            if memory["id"] in self.hot:
+                self.hot.touch([memory["id"]])
+                continue
+            self._put_hot(memory["id"], memory["content"], memory.get("importance", 1))
+            promoted += 1
+        if promoted:
+            metrics.inc("memory_promotions_total", promoted, store="tiered")
+
+    def flush(self) -> None:
+        """等待已提交的后台提升完成"""
+        self.executor.submit(lambda: None).result()
+
+    def get_memory_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """先查热层再查冷层
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆信息或None
+        """
+        return self.hot.get(memory_id) or self.cold_store.get_memory_by_id(memory_id)
+
+    def delete_memory(self, memory_id: str) -> bool:
+        """从两层中删除一条记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            冷层中的记忆是否存在并已删除
+        """
+        self.flush()
+        self.hot.remove(memory_id)
+        self._hot_version += 1
+        return self.cold_store.delete_memory(memory_id)
+
+    def close(self) -> None:
+        """等待后台提升完成并关闭执行器，再调用on_close释放冷层"""
+        self.executor.shutdown(wait=True)
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class MemorySaveTool(BaseTool):
+    """保存记忆到分层存储的工具"""
+
+    name: ClassVar[str] = "save_memory"
+    description: ClassVar[str] = (
+        "保存重要信息到记忆库中以便将来检索。输入应该是记忆内容和可选的重要性评分(1-10)。"
+    )
+    memory_store: TieredMemoryStore
+
+    def _run(self, content: str, importance: int = 1) -> str:
+        """保存记忆
+
+        Args:
+            content: 记忆内容
+            importance: 重要性评分 (1-10)
+
+        Returns:
+            操作结果消息
+        """
+        with tracer.span("tool.save_memory", store="tiered"):
+            memory_id = self.memory_store.add_memory(content, importance)
+        if memory_id:
+            return f"记忆已保存，ID: {memory_id}"
+        else:
+            return "保存记忆失败"
+
+
+class MemoryRetrieveTool(BaseTool):
+    """从分层存储检索记忆的工具"""
+
+    name: ClassVar[str] = "retrieve_memories"
+    description: ClassVar[str] = "检索与查询相关的记忆。输入应该是查询字符串。"
+    memory_store: TieredMemoryStore
+    token_budget: int = 1000
+    max_memory_tokens: int = 300
+
+    def _run(self, query: str, limit: int = 5) -> str:
+        """检索相关记忆
+
+        Args:
+            query: 查询内容
+            limit: 返回结果数量限制
+
+        Returns:
+            格式化的记忆列表
+        """
+        with tracer.span("tool.retrieve_memories", store="tiered"):
+            logger.debug("开始检索记忆，查询: '%s'", query)
+            memories = self.memory_store.retrieve_relevant_memories(query, limit)
+            with tracer.span("tool.format", results=len(memories)):
+                packed = pack_memories(
+                    memories,
+                    query,
+                    self._format_memory,
+                    self.token_budget,
+                    self.max_memory_tokens,
+                )
+            if packed.dropped or packed.truncated:
+                logger.debug(
+                    "检索结果超出token预算，截断 %s 条，丢弃 %s 条",
+                    packed.truncated,
+                    packed.dropped,
+                )
+            return packed.text
+
+    @staticmethod
+    def _format_memory(i: int, memory: Dict[str, Any], content: str) -> str:
+        """格式化单条记忆，content为按预算截取后的内容"""
+        return f"{i}. {content} (层级: {memory['tier']})"
+
+
+def create_memory_tools(
+    bm25_cache_dir: Optional[str] = "db_cache/bm25_db",
+    db_path: Optional[str] = None,
+    hot_capacity: int = 500,
+    score_threshold: float = 1.0,
+) -> Tuple[MemorySaveTool, MemoryRetrieveTool]:
+    """创建分层存储的记忆工具
+
+    Args:
+        bm25_cache_dir: 冷层使用BM25存储时的缓存目录
+        db_path: KuZu图数据库路径，指定时冷层使用图存储，优先于bm25_cache_dir
+        hot_capacity: 热层最多保留的记忆条数
+        score_threshold: 热层BM25分数阈值
+
+    Returns:
+        保存和检索记忆的工具元组
+    """
+    on_close = None
+    if db_path:
+        from misc.memory_graph import acquire_graph_store, release_graph_store
+
+        # 关闭分层存储时释放对共享图存储的引用
+        cold_store = acquire_graph_store(db_path)
+        on_close = functools.partial(release_graph_store, cold_store)
+    else:
+        from misc.memory_bm25 import BM25MemoryStore
+
+        cold_store = BM25MemoryStore(cache_dir=bm25_cache_dir)
+
+    # 共享同一个记忆存储
+    memory_store = TieredMemoryStore(
+        cold_store,
+        hot_capacity=hot_capacity,
+        score_threshold=score_threshold,
+        on_close=on_close,
+    )
+
+    save_tool = MemorySaveTool(memory_store=memory_store)
+    retrieve_tool = MemoryRetrieveTool(memory_store=memory_store)
+
+    return save_tool, retrieve_tool
@@ -0,0 +1,783 @@
+import os
+import re
+import math
+import heapq
+import random
+import hashlib
+import shutil
+import uuid
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Any, Tuple, ClassVar
+
+import numpy as np
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel
+
+from misc.content_log import escape_field, unescape_field
+from misc.context_packing import pack_memories
+from misc.metrics import metrics
+from misc.retrieval_cache import RetrievalCache
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryNode(BaseModel):
+    """记忆节点模型"""
+
+    id: str
+    content: str
+
+
+class HashingEmbedder:
+    """基于哈希技巧的确定性本地嵌入函数
+
+    中文按单字和相邻双字切分，英文按单词切分，每个特征经blake2b哈希映射到
+    固定维度并带符号累加，最后做L2归一化。不依赖任何模型文件，适合离线测试。
+    """
+
+    _pattern = re.compile(r"[\u4e00-\u9fff]+|[a-zA-Z0-9]+")
+
+    def __init__(self, dim: int = 256):
+        """初始化哈希嵌入器
+
+        Args:
+            dim: 向量维度
+        """
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        """抽取文本特征
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            特征字符串列表
+        """
+        features = []
+        for seg in self._pattern.findall(text.lower()):
+            if re.match(r"[\u4e00-\u9fff]", seg):
+                features += list(seg)
+                features += [seg[i : i + 2] for i in range(len(seg) - 1)]
+            else:
+                features.append(seg)
+        return features
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        """批量嵌入文本
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为 (len(texts), dim) 的float32矩阵
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(
+                    feature.encode("utf-8"), digest_size=8
+                ).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dim] += sign
+            norm = np.linalg.norm(vectors[row])
+            if norm > 0:
+                vectors[row] /= norm
+        return vectors
+
+
+class HNSWIndex:
+    """分层可导航小世界图（HNSW）近似最近邻索引
+
+    向量本身不保存在索引中，而是通过 ``get_vectors`` 回调读取外部的
+    （内存映射）矩阵，索引只保存每层的邻接表。相似度为内积，要求向量已归一化。
+    """
+
+    def __init__(
+        self,
+        get_vectors: Callable[[], np.ndarray],
+        m: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 50,
+        seed: int = 42,
+    ):
+        """初始化HNSW索引
+
+        Args:
+            get_vectors: 返回当前向量矩阵的回调
+            m: 每层的最大邻居数（第0层为2*m）
+            ef_construction: 构建时的候选集大小
+            ef_search: 查询时的候选集大小
+            seed: 层级采样的随机种子
+        """
+        self.get_vectors = get_vectors
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(m)
+        self.rng = random.Random(seed)
+
+        self.layers: List[Dict[int, List[int]]] = []  # 每层的邻接表
+        self.entry_point: Optional[int] = None
+        self.count = 0
+        self.last_visited = 0  # 最近一次search访问的节点数
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """把索引转换为整数数组，用np.savez保存，加载时不需要反序列化Python对象
+
+        Returns:
+            数组名到数组的映射，每层的邻接表按(节点, 偏移, 邻居)三个数组展开
+        """
+        arrays = {
+            "params": np.array(
+                [
+                    self.m,
+                    self.ef_construction,
+                    self.ef_search,
+                    self.count,
+                    -1 if self.entry_point is None else self.entry_point,
+                    len(self.layers),
+                ],
+                dtype=np.int64,
+            ),
+            "rng_state": np.array(self.rng.getstate()[1], dtype=np.int64),
+        }
+        for level, graph in enumerate(self.layers):
+            nodes = list(graph)
+            arrays[f"layer{level}_nodes"] = np.array(nodes, dtype=np.int64)
+            arrays[f"layer{level}_offsets"] = np.cumsum(
+                [0] + [len(graph[node]) for node in nodes], dtype=np.int64
+            )
+            arrays[f"layer{level}_neighbors"] = np.array(
+                [neighbor for node in nodes for neighbor in graph[node]],
+                dtype=np.int64,
+            )
+        return arrays
+
+    @classmethod
+    def from_arrays(
+        cls, arrays: Any, get_vectors: Callable[[], np.ndarray]
+    ) -> "HNSWIndex":
+        """从to_arrays保存的数组恢复索引
+
+        Args:
+            arrays: np.load返回的NpzFile或数组映射
+            get_vectors: 返回当前向量矩阵的回调
+
+        Returns:
+            HNSW索引
+        """
+        m, ef_construction, ef_search, count, entry_point, num_layers = (
+            int(x) for x in arrays["params"]
+        )
+        index = cls(get_vectors, m, ef_construction, ef_search)
+        index.rng.setstate((3, tuple(int(x) for x in arrays["rng_state"]), None))
+        index.count = count
+        index.entry_point = None if entry_point < 0 else entry_point
+        for level in range(num_layers):
+            nodes = arrays[f"layer{level}_nodes"].tolist()
+            offsets = arrays[f"layer{level}_offsets"].tolist()
+            neighbors = arrays[f"layer{level}_neighbors"].tolist()
+            index.layers.append(
+                {
+                    node: neighbors[offsets[i] : offsets[i + 1]]
+                    for i, node in enumerate(nodes)
+                }
+            )
+        return index
+
+    def _similarities(self, query: np.ndarray, nodes: List[int]) -> np.ndarray:
+        """计算查询向量与若干节点的相似度"""
+        return self.get_vectors()[nodes] @ query
+
+    def _search_layer(
+        self, query: np.ndarray, entry_points: List[int], ef: int, level: int
+    ) -> List[Tuple[float, int]]:
+        """在单层上做贪心最佳优先搜索
+
+        Returns:
+            (相似度, 节点) 列表，按相似度降序
+        """
+        graph = self.layers[level]
+        visited = set(entry_points)
+        self.last_visited += len(entry_points)
+        sims = self._similarities(query, entry_points)
+        candidates = [(-float(s), n) for s, n in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        results = [(float(s), n) for s, n in zip(sims, entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if -neg_sim < results[0][0] and len(results) >= ef:
+                break
+            neighbors = [n for n in graph.get(node, []) if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            self.last_visited += len(neighbors)
+            for sim, neighbor in zip(self._similarities(query, neighbors), neighbors):
+                sim = float(sim)
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    heapq.heappush(results, (sim, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _prune(self, node: int, level: int) -> None:
+        """邻居数超过上限时，只保留与节点最相似的邻居"""
+        max_conn = self.m * 2 if level == 0 else self.m
+        neighbors = self.layers[level][node]
+        if len(neighbors) <= max_conn:
+            return
+        sims = self._similarities(self.get_vectors()[node], neighbors)
+        order = np.argsort(-sims)[:max_conn]
+        self.layers[level][node] = [neighbors[i] for i in order]
+
+    def add(self, node: int) -> None:
+        """将向量矩阵中第node行插入索引
+
+        Args:
+            node: 行号，必须按0,1,2...顺序插入
+        """
+        query = self.get_vectors()[node]
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+        while len(self.layers) <= level:
+            self.layers.append({})
+        for lvl in range(level + 1):
+            self.layers[lvl][node] = []
+        self.count += 1
+
+        if self.entry_point is None:
+            self.entry_point = node
+            return
+
+        entry = [self.entry_point]
+        top_level = len(self.layers) - 1
+        entry_level = max(
+            lvl for lvl in range(top_level + 1) if self.entry_point in self.layers[lvl]
+        )
+
+        # 在高于新节点层级的层上贪心下降
+        for lvl in range(entry_level, level, -1):
+            entry = [self._search_layer(query, entry, 1, lvl)[0][1]]
+
+        # 在新节点所在的各层上建立双向连接
+        for lvl in range(min(level, entry_level), -1, -1):
+            found = self._search_layer(query, entry, self.ef_construction, lvl)
+            neighbors = [n for _, n in found if n != node][: self.m]
+            self.layers[lvl][node] = neighbors
+            for neighbor in neighbors:
+                self.layers[lvl][neighbor].append(node)
+                self._prune(neighbor, lvl)
+            entry = [n for _, n in found]
+
+        if level > entry_level:
+            self.entry_point = node
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """查询最相似的k个节点
+
+        Args:
+            query: 归一化后的查询向量
+            k: 返回数量
+
+        Returns:
+            (相似度, 节点) 列表，按相似度降序
+        """
+        self.last_visited = 0
+        if self.entry_point is None:
+            return []
+
+        entry = [self.entry_point]
+        entry_level = max(
+            lvl
+            for lvl in range(len(self.layers))
+            if self.entry_point in self.layers[lvl]
+        )
+        for lvl in range(entry_level, 0, -1):
+            entry = [self._search_layer(query, entry, 1, lvl)[0][1]]
+
+        return self._search_layer(query, entry, max(self.ef_search, k), 0)[:k]
+
+
+class VectorMemoryStore:
+    """基于嵌入向量和HNSW近似最近邻索引的记忆存储"""
+
+    def __init__(
+        self,
+        cache_dir: str = "db_cache/vector_db",
+        embedder: Optional[Callable[[List[str]], np.ndarray]] = None,
+        exact_search_threshold: int = 1024,
+        retrieval_cache: Optional[RetrievalCache] = None,
+        autosave_every: int = 1000,
+    ):
+        """初始化向量记忆存储
+
+        Args:
+            cache_dir: 缓存目录路径
+            embedder: 嵌入函数，输入文本列表，返回归一化后的float32矩阵；
+                默认使用离线的HashingEmbedder
+            exact_search_threshold: 记忆数不超过该值时直接暴力检索
+            retrieval_cache: 检索结果缓存，为None时不缓存
+            autosave_every: 未保存的新记忆达到该条数（且不少于已保存条数的1/4）时
+                自动保存索引；close时总是保存
+        """
+        # 确保缓存目录存在
+        if not os.path.exists(cache_dir):
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                logger.info("创建缓存目录: %s", cache_dir)
+            except Exception as e:
+                logger.error("创建缓存目录时出错: %s", e)
+
+        self.cache_dir = cache_dir
+        self.memory_file = os.path.join(cache_dir, "memories.txt")
+        self.vector_file = os.path.join(cache_dir, "vectors.f32")
+        self.index_file = os.path.join(cache_dir, "hnsw.npz")
+        self.autosave_every = autosave_every
+
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = int(self._embed(["初始化"]).shape[1])
+        self.exact_search_threshold = exact_search_threshold
+
+        # 存储版本号，每次写入递增，用于使检索缓存失效
+        self.version = 0
+        self.retrieval_cache = retrieval_cache
+
+        # 存储所有记忆
+        self.memories = []
+        self.id_to_index = {}
+
+        # 向量矩阵（内存映射）及其容量
+        self.vectors = None
+        self.capacity = 0
+
+        # 近似最近邻索引，以及已保存到索引文件中的记忆条数
+        self.index = None
+        self._saved_count = 0
+
+        # 加载已有记忆
+        self._load_memories()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """调用嵌入函数并转换为float32矩阵"""
+        return np.asarray(self.embedder(texts), dtype=np.float32)
+
+    def _open_vectors(self, capacity: int) -> None:
+        """以指定容量打开（必要时扩展）向量文件
+
+        Args:
+            capacity: 需要的行数
+        """
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+
+        size = capacity * self.dim * 4
+        mode = "r+b" if os.path.exists(self.vector_file) else "w+b"
+        with open(self.vector_file, mode) as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < size:
+                f.truncate(size)
+
+        self.capacity = capacity
+        self.vectors = np.memmap(
+            self.vector_file, dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+
+    def _ensure_capacity(self, rows: int) -> None:
+        """确保向量矩阵至少可以容纳rows行，容量按倍数增长"""
+        if rows > self.capacity:
+            self._open_vectors(max(rows, self.capacity * 2, 1024))
+
+    def _new_index(self) -> HNSWIndex:
+        """创建空的HNSW索引"""
+        return HNSWIndex(lambda: self.vectors)
+
+    def _load_memories(self):
+        """从文件加载记忆、向量和索引"""
+        if os.path.exists(self.memory_file):
+            try:
+                with open(self.memory_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        parts = line.rstrip("\n").split("\t")
+                        if len(parts) >= 2:
+                            memory_id, content = map(unescape_field, parts[:2])
+                            self.id_to_index[memory_id] = len(self.memories)
+                            self.memories.append({"id": memory_id, "content": content})
+            except Exception as e:
+                logger.error("加载记忆时出错: %s", e)
+                self.memories = []
+                self.id_to_index = {}
+
+        # 加载持久化的索引，文件头记录向量维度和保存时已落盘的向量行数
+        self.index = None
+        if os.path.exists(self.index_file):
+            try:
+                with np.load(self.index_file, allow_pickle=False) as data:
+                    dim, rows = (int(x) for x in data["store"])
+                    if dim == self.dim and rows <= len(self.memories):
+                        self.index = HNSWIndex.from_arrays(data, lambda: self.vectors)
+            except Exception as e:
+                logger.error("加载向量索引时出错: %s", e)
+        valid_rows = self.index.count if self.index is not None else 0
+        self._saved_count = valid_rows
+
+        # 维度不符的向量文件直接丢弃
+        if os.path.exists(self.vector_file):
+            if os.path.getsize(self.vector_file) % (self.dim * 4):
+                os.remove(self.vector_file)
+        self._open_vectors(max(len(self.memories), 1024))
+
+        # 索引保存之后写入的向量可能没有落盘，从记录的行数起重新计算
+        if valid_rows < len(self.memories):
+            self.vectors[valid_rows : len(self.memories)] = self._embed(
+                [m["content"] for m in self.memories[valid_rows:]]
+            )
+        if self.index is None:
+            self.index = self._new_index()
+        for node in range(self.index.count, len(self.memories)):
+            self.index.add(node)
+        if self.index.count != self._saved_count:
+            self.save_index()
+
+        if self.memories:
+            logger.info("已加载 %s 条记忆", len(self.memories))
+
+    def save_index(self) -> None:
+        """将向量刷到磁盘，再把HNSW索引和有效行数原子地写入索引文件"""
+        try:
+            self.vectors.flush()
+            tmp_file = f"{self.index_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                np.savez(
+                    f,
+                    store=np.array([self.dim, self.index.count], dtype=np.int64),
+                    **self.index.to_arrays(),
+                )
+            os.replace(tmp_file, self.index_file)
+            self._saved_count = self.index.count
+            logger.info("向量索引已保存到 %s", self.index_file)
+        except Exception as e:
+            logger.error("保存向量索引时出错: %s", e)
+
+    def _maybe_save_index(self) -> None:
+        """未保存的记忆足够多时保存索引，保存次数随记忆条数按比例减少"""
+        unsaved = self.index.count - self._saved_count
+        if unsaved >= max(self.autosave_every, self._saved_count // 4):
+            self.save_index()
+
+    def close(self) -> None:
+        """保存索引并刷新向量文件"""
+        if self.index is not None and self.index.count != self._saved_count:
+            self.save_index()
+        elif self.vectors is not None:
+            self.vectors.flush()
+
+    def add_memory(self, content: str, memory_id: Optional[str] = None) -> str:
+        """添加新记忆
+
+        Args:
+            content: 记忆内容
+            memory_id: 指定的记忆ID，为空时自动生成
+
+        Returns:
+            记忆ID
+        """
+        memory_id = memory_id or f"mem_{str(uuid.uuid4())[:8]}"
+        start = time.perf_counter()
+
+        try:
+            vector = self._embed([content])[0]
+
+            # 先追加记忆文本，再写入向量和索引
+            with open(self.memory_file, "a", encoding="utf-8") as f:
+                f.write(f"{escape_field(memory_id)}\t{escape_field(content)}\n")
+
+            row = len(self.memories)
+            self._ensure_capacity(row + 1)
+            self.vectors[row] = vector
+            self.memories.append({"id": memory_id, "content": content})
+            self.id_to_index[memory_id] = row
+            self.index.add(row)
+            self.version += 1
+            self._maybe_save_index()
+
+            metrics.inc("memory_writes_total", store="vector")
+            metrics.observe(
+                "memory_write_seconds", time.perf_counter() - start, store="vector"
+            )
+            return memory_id
+        except Exception as e:
+            metrics.inc("memory_write_errors_total", store="vector")
+            logger.error("添加记忆时出错: %s", e)
+            return ""
+
+    def add_memories(
+        self, contents: List[str], memory_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """批量添加记忆，一次性计算所有嵌入并追加到文件
+
+        Args:
+            contents: 记忆内容列表
+            memory_ids: 与contents一一对应的记忆ID，为空时自动生成
+
+        Returns:
+            记忆ID列表，写入失败时为空列表
+        """
+        if memory_ids is None:
+            memory_ids = [f"mem_{str(uuid.uuid4())[:8]}" for _ in contents]
+        if len(memory_ids) != len(contents):
+            raise ValueError("memory_ids与contents的长度不一致")
+        if not contents:
+            return []
+        start = time.perf_counter()
+
+        try:
+            vectors = self._embed(list(contents))
+
+            with open(self.memory_file, "a", encoding="utf-8") as f:
+                f.writelines(
+                    f"{escape_field(memory_id)}\t{escape_field(content)}\n"
+                    for memory_id, content in zip(memory_ids, contents)
+                )
+
+            first = len(self.memories)
+            self._ensure_capacity(first + len(contents))
+            self.vectors[first : first + len(contents)] = vectors
+            for row, (memory_id, content) in enumerate(
+                zip(memory_ids, contents), first
+            ):
+                self.memories.append({"id": memory_id, "content": content})
+                self.id_to_index[memory_id] = row
+                self.index.add(row)
+            self.version += 1
+            self._maybe_save_index()
+
+            metrics.inc("memory_writes_total", len(contents), store="vector")
+            metrics.observe(
+                "memory_write_seconds", time.perf_counter() - start, store="vector"
+            )
+            return list(memory_ids)
+        except Exception as e:
+            metrics.inc("memory_write_errors_total", store="vector")
+            logger.error("批量添加记忆时出错: %s", e)
+            return []
+
+    def retrieve_relevant_memories(
+        self, query: str, limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """检索与查询语义相关的记忆，配置了检索缓存时优先读取缓存
+
+        Args:
+            query: 查询字符串
+            limit: 返回结果数量限制
+
+        Returns:
+            记忆列表，按余弦相似度排序
+        """
+        start = time.perf_counter()
+        if self.retrieval_cache is None:
+            memories = self._retrieve(query, limit)
+        else:
+            memories = self.retrieval_cache.get_or_compute(
+                query, limit, self.version, lambda: self._retrieve(query, limit)
+            )
+        metrics.inc("memory_retrievals_total", store="vector")
+        metrics.observe(
+            "memory_retrieve_seconds", time.perf_counter() - start, store="vector"
+        )
+        return memories
+
+    def _retrieve(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """嵌入查询并在向量索引中查找最相似的记忆"""
+        if not self.memories:
+            logger.debug("没有可用的记忆进行检索")
+            return []
+
+        # 处理空查询情况
+        if not query or query.strip() == "":
+            logger.debug("查询为空，返回空列表")
+            return []
+
+        try:
+            query_vector = self._embed([query])[0]
+            count = len(self.memories)
+
+            if count <= self.exact_search_threshold:
+                # 记忆较少时直接暴力计算
+                sims = self.vectors[:count] @ query_vector
+                top = np.argsort(-sims)[:limit]
+                hits = [(float(sims[i]), int(i)) for i in top]
+                scanned = count
+            else:
+                hits = self.index.search(query_vector, limit)
+                scanned = self.index.last_visited
+            metrics.inc("memory_candidates_scanned_total", scanned, store="vector")
+
+            memories = []
+            for rank, (score, row) in enumerate(hits, 1):
+                memories.append(
+                    {
+                        "id": self.memories[row]["id"],
+                        "content": self.memories[row]["content"],
+                        "score": score,
+                        "rank": rank,
+                    }
+                )
+
+            logger.debug("向量检索返回 %s 条相关记忆", len(memories))
+            return memories
+        except Exception as e:
+            metrics.inc("memory_retrieval_errors_total", store="vector")
+            logger.error("检索相关记忆时出错: %s", e)
+            return []
+
+    def get_memory_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """通过ID获取记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆信息或None
+        """
+        row = self.id_to_index.get(memory_id)
+        if row is None:
+            return None
+        return self.memories[row]
+
+    def clear_all_memories(self):
+        """清除所有记忆（测试用）"""
+        self.memories = []
+        self.id_to_index = {}
+        self.vectors = None
+        self.capacity = 0
+        self.version += 1
+
+        for path in (self.memory_file, self.vector_file, self.index_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+        self._open_vectors(1024)
+        self.index = self._new_index()
+        self._saved_count = 0
+
+
+class MemorySaveTool(BaseTool):
+    """保存记忆到向量存储的工具"""
+
+    name: ClassVar[str] = "save_memory"
+    description: ClassVar[str] = "保存信息到记忆库中以便将来检索。输入应该是记忆内容。"
+    memory_store: VectorMemoryStore
+
+    def _run(self, content: str) -> str:
+        """保存记忆
+
+        Args:
+            content: 记忆内容
+
+        Returns:
+            操作结果消息
+        """
+        memory_id = self.memory_store.add_memory(content)
+        if memory_id:
+            return f"记忆已保存，ID: {memory_id}"
+        else:
+            return "保存记忆失败"
+
+
+class MemoryRetrieveTool(BaseTool):
+    """从向量存储检索记忆的工具"""
+
+    name: ClassVar[str] = "retrieve_memories"
+    description: ClassVar[str] = "检索与查询语义相关的记忆。输入应该是查询字符串。"
+    memory_store: VectorMemoryStore
+    token_budget: int = 1000
+    max_memory_tokens: int = 300
+
+    def _run(self, query: str, limit: int = 5) -> str:
+        """检索相关记忆
+
+        Args:
+            query: 查询内容
+            limit: 返回结果数量限制
+
+        Returns:
+            格式化的记忆列表
+        """
+        logger.debug("开始检索记忆，查询: '%s'", query)
+        memories = self.memory_store.retrieve_relevant_memories(query, limit)
+        packed = pack_memories(
+            memories,
+            query,
+            self._format_memory,
+            self.token_budget,
+            self.max_memory_tokens,
+        )
+        if packed.dropped or packed.truncated:
+            logger.debug(
+                "检索结果超出token预算，截断 %s 条，丢弃 %s 条",
+                packed.truncated,
+                packed.dropped,
+            )
+        return packed.text
+
+    @staticmethod
+    def _format_memory(i: int, memory: Dict[str, Any], content: str) -> str:
+        """格式化单条记忆，content为按预算截取后的内容"""
+        score_info = f" (相似度: {memory['score']:.4f})" if "score" in memory else ""
+        return f"{i}. {content}{score_info}"
+
+
+def create_memory_tools(
+    cache_dir: str = "db_cache/vector_db",
+    embedder: Optional[Callable[[List[str]], np.ndarray]] = None,
+    cache_size: int = 128,
+    cache_ttl: float = 300.0,
+) -> Tuple[MemorySaveTool, MemoryRetrieveTool]:
+    """创建记忆工具
+
+    Args:
+        cache_dir: 缓存目录路径
+        embedder: 嵌入函数，默认使用HashingEmbedder
+        cache_size: 检索缓存容量，为0时不启用缓存
+        cache_ttl: 检索缓存的存活时间（秒）
+
+    Returns:
+        保存和检索记忆的工具元组
+    """
+    retrieval_cache = RetrievalCache(cache_size, cache_ttl) if cache_size > 0 else None
+
+    # 共享同一个记忆存储
+    memory_store = VectorMemoryStore(
+        cache_dir=cache_dir, embedder=embedder, retrieval_cache=retrieval_cache
+    )
+
+    save_tool = MemorySaveTool(memory_store=memory_store)
+    retrieve_tool = MemoryRetrieveTool(memory_store=memory_store)
+
+    return save_tool, retrieve_tool
+
+
+if __name__ == "__main__":
+    test_dir = "db_cache/vector_db_demo"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+
+    store = VectorMemoryStore(cache_dir=test_dir)
+    store.add_memory("苹果是一种水果，也是一家科技公司 Apple")
+    store.add_memory("香蕉banana是黄色的水果")
+    store.add_memory("Python是一种流行的编程语言，用于AI开发")
+
+    for query in ["水果", "编程语言", "apple"]:
+        print(f"\n查询'{query}':")
+        for memory in store.retrieve_relevant_memories(query, limit=2):
+            print(f"- {memory['content']} ({memory['score']:.4f})")
@@ -0,0 +1,241 @@
+"""
+记忆存储的运行指标（计数器和直方图）
+
+指标在进程内累计，可以导出为Prometheus文本格式或JSON快照。
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+# 延迟直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    """单个标签组合下的直方图"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """按Prometheus约定返回累积分桶计数，最后一个为+Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append((math.inf, self.count))
+        return result
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表"""
+
+    def __init__(self):
+        """初始化指标注册表"""
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name: str, help_text: str) -> None:
+        """为指标添加说明，导出Prometheus文本时作为HELP行
+
+        Args:
+            name: 指标名
+            help_text: 说明文字
+        """
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """计数器加值
+
+        Args:
+            name: 指标名，约定以_total结尾
+            value: 增加的值
+            labels: 标签
+        """
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        **labels: Any,
+    ) -> None:
+        """向直方图记录一个观测值
+
+        Args:
+            name: 指标名
+            value: 观测值
+            buckets: 分桶上界，只在该标签组合首次出现时生效
+            labels: 标签
+        """
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """统计代码块耗时（秒）并记录到直方图
+
+        Args:
+            name: 直方图指标名
+            labels: 标签
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get(self, name: str, **labels: Any) -> float:
+        """读取计数器的当前值，或直方图的观测次数
+
+        Args:
+            name: 指标名
+            labels: 标签
+
+        Returns:
+            当前值，不存在时为0
+        """
+        key = self._label_key(labels)
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name].get(key, 0)
+            histogram = self._histograms.get(name, {}).get(key)
+            return histogram.count if histogram else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出JSON可序列化的指标快照
+
+        Returns:
+            包含counters和histograms的字典
+        """
+        with self._lock:
+            counters = {
+                name: [
+                    {"labels": dict(key), "value": value}
+                    for key, value in series.items()
+                ]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": h.count,
+                        "sum": h.sum,
+                        "buckets": {
+                            ("+Inf" if math.isinf(bound) else str(bound)): count
+                            for bound, count in h.cumulative()
+                        },
+                    }
+                    for key, h in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self) -> str:
+        """导出JSON格式的指标快照"""
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        """导出Prometheus文本格式
+
+        Returns:
+            Prometheus exposition格式的文本
+        """
+
+        def fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{fmt_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    for bound, count in h.cumulative():
+                        le = "+Inf" if math.isinf(bound) else repr(bound)
+                        lines.append(
+                            f"{name}_bucket{fmt_labels(key, (('le', le),))} {count}"
+                        )
+                    lines.append(f"{name}_sum{fmt_labels(key)} {h.sum}")
+                    lines.append(f"{name}_count{fmt_labels(key)} {h.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """清空所有指标（测试用）"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# 进程级别的全局指标注册表
+metrics = MetricsRegistry()
+metrics.describe("memory_writes_total", "写入的记忆条数")
+metrics.describe("memory_write_errors_total", "写入失败次数")
+metrics.describe("memory_retrievals_total", "检索次数")
+metrics.describe("memory_retrieval_errors_total", "检索失败次数")
+metrics.describe("memory_candidates_scanned_total", "检索时打分的候选记忆条数")
+metrics.describe("memory_duplicates_total", "写入时检测到的近似重复记忆条数")
+metrics.describe("memory_evictions_total", "超出容量时淘汰的记忆条数")
+metrics.describe("memory_tier_hits_total", "分层存储中由热层或冷层回答的检索次数")
+metrics.describe("memory_promotions_total", "从冷层提升到热层的记忆条数")
+metrics.describe("memory_demotions_total", "热层已满时降级的记忆条数")
+metrics.describe("memory_server_requests_total", "记忆服务收到的请求数")
+metrics.describe("memory_server_coalesced_total", "记忆服务中被合并执行的请求数")
+metrics.describe("memory_edges_created_total", "图存储中创建的关系条数")
+metrics.describe(
+    "memory_backend_timeouts_total", "混合检索中超出延迟预算的后端查询次数"
+)
+metrics.describe("memory_write_seconds", "单次写入耗时（秒）")
+metrics.describe("memory_retrieve_seconds", "单次检索耗时（秒）")
+metrics.describe(
+    "memory_write_behind_batch_seconds", "后台队列写入一批记忆的耗时（秒）"
+)
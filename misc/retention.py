@@ -0,0 +1,188 @@
+"""
+按重要性、时间和访问次数淘汰记忆的容量策略
+
+每条记忆的保留分数为 importance × (1 + access_count) × 2^(t / half_life)，
+在对数空间中计算为 log(importance) + log1p(access_count) + t·ln2 / half_life。
+时间项只取决于写入时间，不随当前时间变化，因此分数只在访问或修改重要性时改变，
+用最小堆即可随时取出分数最低的记忆。分数变化时压入新条目，旧条目在出堆时惰性丢弃。
+"""
+
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 默认半衰期：一周前写入的记忆需要两倍的重要性或访问次数才能与新记忆同分
+DEFAULT_HALF_LIFE = 7 * 24 * 3600.0
+
+
+@dataclass
+class _Entry:
+    importance: int
+    access_count: int
+    timestamp: float
+    size: int
+    seq: int
+
+
+class RetentionPolicy:
+    """容量受限时按保留分数从低到高淘汰记忆"""
+
+    def __init__(
+        self,
+        max_memories: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        half_life: float = DEFAULT_HALF_LIFE,
+    ):
+        """初始化容量策略
+
+        Args:
+            max_memories: 最多保留的记忆条数，为None时不限制
+            max_bytes: 记忆内容的最大总字节数（UTF-8），为None时不限制
+            half_life: 时间项的半衰期（秒）
+        """
+        if max_memories is None and max_bytes is None:
+            raise ValueError("max_memories和max_bytes至少需要设置一个")
+        self.max_memories = max_memories
+        self.max_bytes = max_bytes
+        self.half_life = half_life
+
+        self.total_bytes = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, memory_id: str) -> bool:
+        return memory_id in self._entries
+
+    def score(self, importance: int, access_count: int, timestamp: float) -> float:
+        """计算对数空间的保留分数
+
+        Args:
+            importance: 重要性评分
+            access_count: 被检索到的次数
+            timestamp: 写入时间（Unix秒）
+
+        Returns:
+            保留分数，越低越先被淘汰
+        """
+        return (
+            math.log(max(importance, 1))
+            + math.log1p(access_count)
+            + timestamp * math.log(2) / self.half_life
+        )
+
+    def _push(self, memory_id: str, entry: _Entry) -> None:
+        entry.seq = next(self._seq)
+        key = self.score(entry.importance, entry.access_count, entry.timestamp)
+        heapq.heappush(self._heap, (key, entry.seq, memory_id))
+        # 过期条目过多时重建堆，保持堆大小与记忆条数同一量级
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (self.score(e.importance, e.access_count, e.timestamp), e.seq, i)
+                for i, e in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def track(
+        self,
+        memory_id: str,
+        size: int,
+        importance: Optional[int] = None,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        """登记（或更新）一条记忆，已登记的记忆保留访问次数
+
+        Args:
+            memory_id: 记忆ID
+            size: 记忆内容的字节数
+            importance: 重要性评分，为None时沿用已有值（新记忆为1）
+            timestamp: 写入时间（Unix秒），为None时使用当前时间
+        """
+        old = self._entries.get(memory_id)
+        if old is not None:
+            self.total_bytes -= old.size
+        entry = _Entry(
+            importance=importance or (old.importance if old else 1),
+            access_count=old.access_count if old else 0,
+            timestamp=time.time() if timestamp is None else timestamp,
+            size=size,
+            seq=0,
+        )
+        self._entries[memory_id] = entry
+        self.total_bytes += size
+        self._push(memory_id, entry)
+
+    def touch(self, memory_ids: Iterable[str]) -> None:
+        """记录记忆被检索到一次
+
+        Args:
+            memory_ids: 被检索到的记忆ID
+        """
+        for memory_id in memory_ids:
+            entry = self._entries.get(memory_id)
+            if entry is not None:
+                entry.access_count += 1
+                self._push(memory_id, entry)
+
+    def set_importance(self, memory_id: str, importance: int) -> None:
+        """更新记忆的重要性
+
+        Args:
+            memory_id: 记忆ID
+            importance: 新的重要性评分
+        """
+        entry = self._entries.get(memory_id)
+        if entry is not None and entry.importance != importance:
+            entry.importance = importance
+            self._push(memory_id, entry)
+
+    def forget(self, memory_id: str) -> None:
+        """移除一条记忆，堆中的条目在出堆时丢弃"""
+        entry = self._entries.pop(memory_id, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def clear(self) -> None:
+        """清空全部登记"""
+        self._entries.clear()
+        self._heap.clear()
+        self.total_bytes = 0
+
+    def over_capacity(self) -> bool:
+        """是否超出容量"""
+        if self.max_memories is not None and len(self._entries) > self.max_memories:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def evict(self, protect: Iterable[str] = ()) -> List[str]:
+        """按保留分数从低到高取出记忆，直到不再超出容量
+
+        Args:
+            protect: 不参与淘汰的记忆ID（例如刚写入的记忆）
+
+        Returns:
+            被淘汰的记忆ID，调用方负责从存储中删除
+        """
+        protect = set(protect)
+        skipped = []
+        victims = []
+        while self.over_capacity() and self._heap:
+            item = heapq.heappop(self._heap)
+            _, seq, memory_id = item
+            entry = self._entries.get(memory_id)
+            if entry is None or entry.seq != seq:
+                continue
+            if memory_id in protect:
+                skipped.append(item)
+                continue
+            self.forget(memory_id)
+            victims.append(memory_id)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return victims
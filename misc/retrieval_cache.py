@@ -0,0 +1,151 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+
+class RetrievalCache:
+    """检索结果缓存
+
+    缓存键由规范化后的查询词、limit和存储版本号组成。存储每次写入都会递增版本号，
+    旧版本的缓存项自然失效，无需主动清理。淘汰策略为LRU加TTL。
+    一个缓存实例只服务一个记忆存储。
+    """
+
+    _token_pattern = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+")
+
+    def __init__(self, max_size: int = 128, ttl: float = 300.0):
+        """初始化检索缓存
+
+        Args:
+            max_size: 最多缓存的查询数
+            ttl: 缓存项的存活时间（秒），小于等于0表示不过期
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Dict[str, Any]]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+        # 命中率统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def normalize_query(cls, query: str) -> Tuple[str, ...]:
+        """规范化查询：统一大小写，去掉空白和标点
+
+        Args:
+            query: 查询字符串
+
+        Returns:
+            查询词元组
+        """
+        return tuple(cls._token_pattern.findall(query.lower()))
+
+    def make_key(self, query: str, limit: int, version: int, *extra: Any) -> Hashable:
+        """构造缓存键
+
+        Args:
+            query: 查询字符串
+            limit: 返回结果数量限制
+            version: 存储版本号
+            extra: 其他影响结果的检索参数
+
+        Returns:
+            缓存键
+        """
+        return (self.normalize_query(query), limit, version) + tuple(extra)
+
+    def get(self, key: Hashable):
+        """读取缓存项
+
+        Returns:
+            缓存的记忆列表副本，未命中时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl > 0:
+                if time.monotonic() - entry[0] > self.ttl:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # 返回浅拷贝，避免调用方修改缓存中的结果
+        return [dict(memory) for memory in entry[1]]
+
+    def put(self, key: Hashable, memories: List[Dict[str, Any]]) -> None:
+        """写入缓存项
+
+        Args:
+            key: 缓存键
+            memories: 检索结果
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic(),
+                [dict(memory) for memory in memories],
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(
+        self,
+        query: str,
+        limit: int,
+        version: int,
+        compute: Callable[[], List[Dict[str, Any]]],
+        *extra: Any,
+    ) -> List[Dict[str, Any]]:
+        """命中时直接返回缓存结果，否则调用compute并写入缓存
+
+        Args:
+            query: 查询字符串
+            limit: 返回结果数量限制
+            version: 存储版本号
+            compute: 未命中时执行实际检索的回调
+            extra: 其他影响结果的检索参数
+
+        Returns:
+            记忆列表
+        """
+        key = self.make_key(query, limit, version, *extra)
+        memories = self.get(key)
+        if memories is None:
+            memories = compute()
+            self.put(key, memories)
+        return memories
+
+    def clear(self) -> None:
+        """清空缓存（统计数据保留）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中率等统计信息
+
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,112 @@
+"""
+进程内共享的记忆存储注册表
+"""
+
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StoreRegistry:
+    """按键（通常是规范化后的存储路径）共享记忆存储实例
+
+    同一个键只会创建一个存储实例，并记录引用计数；引用计数归零时调用存储的
+    close方法释放数据库连接、缓冲池和文件句柄。进程退出时关闭所有仍在使用的存储。
+    """
+
+    def __init__(self):
+        """初始化注册表"""
+        self._entries: Dict[Hashable, List[Any]] = {}  # 键 -> [存储, 引用计数, 参数]
+        self._lock = threading.RLock()
+
+    def acquire(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """获取共享的存储实例，不存在时用factory创建
+
+        Args:
+            key: 存储的唯一键
+            factory: 创建存储的无参函数
+            params: 创建存储时使用的参数；已有的存储是按其他参数创建的时候记录警告，
+                仍然返回已有的存储
+
+        Returns:
+            存储实例
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [factory(), 0, params]
+                self._entries[key] = entry
+            elif params is not None and entry[2] != params:
+                logger.warning(
+                    "存储 %s 已按参数 %s 创建，忽略本次的参数 %s", key, entry[2], params
+                )
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, store: Any) -> bool:
+        """释放一次对存储的引用，引用计数归零时关闭存储
+
+        Args:
+            store: 通过acquire获取的存储实例
+
+        Returns:
+            存储是否已被关闭
+        """
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry[0] is store:
+                    entry[1] -= 1
+                    if entry[1] > 0:
+                        return False
+                    del self._entries[key]
+                    break
+            else:
+                return False
+
+        self._close(store)
+        return True
+
+    def refcount(self, key: Hashable) -> int:
+        """查询存储的引用计数
+
+        Args:
+            key: 存储的唯一键
+
+        Returns:
+            引用计数，未注册时为0
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry else 0
+
+    def close_all(self) -> None:
+        """关闭所有已注册的存储"""
+        with self._lock:
+            stores = [entry[0] for entry in self._entries.values()]
+            self._entries.clear()
+        for store in stores:
+            self._close(store)
+
+    @staticmethod
+    def _close(store: Any) -> None:
+        """调用存储的close方法（如果有）"""
+        close = getattr(store, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            logger.error("关闭记忆存储时出错: %s", e)
+
+
+# 进程级别的全局注册表
+registry = StoreRegistry()
+atexit.register(registry.close_all)
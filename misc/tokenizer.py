@@ -0,0 +1,103 @@
+"""
+中英文分词及jieba分词器的初始化控制
+"""
+
+import os
+import re
+import logging
+import time
+import threading
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+_segment_pattern = re.compile(r"[\u4e00-\u9fff]+|[a-zA-Z0-9\s]+")
+_chinese_pattern = re.compile(r"[\u4e00-\u9fff]+")
+
+# jieba词典在进程内只构建一次，用户词典在进程内只加载一次
+_init_lock = threading.Lock()
+_initialized = False
+_jieba = None  # jieba模块，首次初始化时才导入
+_loaded_user_dicts = set()
+
+
+def init_tokenizer(
+    cache_dir: Optional[str] = None, user_dict: Optional[str] = None
+) -> None:
+    """初始化jieba分词器
+
+    首次调用时构建前缀词典，并把词典缓存文件（jieba.cache）放在cache_dir中，
+    之后的进程可以直接从缓存加载。cache_dir只在词典尚未构建时生效。
+
+    Args:
+        cache_dir: 词典缓存文件所在目录，为None时使用jieba默认的临时目录
+        user_dict: 领域用户词典路径，同一路径在进程内只加载一次
+    """
+    global _initialized, _jieba
+
+    with _init_lock:
+        if not _initialized:
+            import jieba
+
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                jieba.dt.tmp_dir = cache_dir
+            start = time.perf_counter()
+            jieba.initialize()
+            _jieba = jieba
+            _initialized = True
+            logger.info("jieba词典初始化完成，耗时 %.3f秒", time.perf_counter() - start)
+
+        if user_dict:
+            user_dict = os.path.abspath(user_dict)
+            if user_dict not in _loaded_user_dicts:
+                _jieba.load_userdict(user_dict)
+                _loaded_user_dicts.add(user_dict)
+                logger.info("已加载用户词典: %s", user_dict)
+
+
+def warm_up_tokenizer(
+    cache_dir: Optional[str] = None, user_dict: Optional[str] = None
+) -> threading.Thread:
+    """在后台线程中初始化jieba分词器
+
+    Args:
+        cache_dir: 词典缓存文件所在目录
+        user_dict: 领域用户词典路径
+
+    Returns:
+        已启动的后台线程，可以通过join等待初始化完成
+    """
+    thread = threading.Thread(
+        target=init_tokenizer,
+        args=(cache_dir, user_dict),
+        name="jieba-warm-up",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def tokenize_text(text: str) -> List[str]:
+    """对文本进行中英文分词
+
+    Args:
+        text: 待分词文本
+
+    Returns:
+        分词结果列表
+    """
+    if not _initialized:
+        init_tokenizer()
+
+    # 用正则分割中英文
+    words = []
+    for seg in _segment_pattern.findall(text):
+        if _chinese_pattern.match(seg):
+            # 中文部分用jieba
+            words += _jieba.lcut(seg)
+        else:
+            # 英文部分按空格分词
+            words += [w for w in seg.strip().split() if w]
+
+    return words
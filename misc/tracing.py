@@ -0,0 +1,299 @@
+"""
+记忆工具调用的分阶段耗时追踪
+
+默认关闭，关闭时span()只返回一个空的上下文管理器。开启后每个根span（通常是一次
+工具调用或一次存储操作）结束时形成一条完整的追踪，可以输出分阶段耗时，
+也可以按OpenTelemetry OTLP/JSON格式逐行追加到本地文件。
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "self-agent-memory"
+
+
+class Span:
+    """一个计时阶段"""
+
+    __slots__ = (
+        "name",
+        "trace",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(self, name: str, trace: "Trace", parent_id: Optional[str]):
+        self.name = name
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """设置span属性"""
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """由一个根span及其所有子span组成的追踪"""
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def root(self) -> Optional[Span]:
+        return next((s for s in self.spans if s.parent_id is None), None)
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空span"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    "memory_current_span", default=None
+)
+
+
+class _ActiveSpan:
+    """开启追踪时span()返回的上下文管理器"""
+
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        parent = _current_span.get()
+        trace = parent.trace if parent is not None else Trace()
+        self.tracer = tracer
+        self.span = Span(name, trace, parent.span_id if parent else None)
+        self.span.attributes.update(attributes)
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        span = self.span
+        span.end_ns = time.time_ns()
+        if exc is not None:
+            span.error = repr(exc)
+        _current_span.reset(self.token)
+        span.trace.add(span)
+        if span.parent_id is None:
+            self.tracer._finish(span.trace)
+        return False
+
+
+class Tracer:
+    """分阶段耗时追踪器"""
+
+    def __init__(self, max_traces: int = 100):
+        """初始化追踪器
+
+        Args:
+            max_traces: 内存中保留的最近追踪条数
+        """
+        self.enabled = False
+        self.export_path: Optional[str] = None
+        self.log_breakdown = False
+        self.traces: Deque[Trace] = deque(maxlen=max_traces)
+        self._export_lock = threading.Lock()
+
+    def enable(
+        self, export_path: Optional[str] = None, log_breakdown: bool = False
+    ) -> None:
+        """开启追踪
+
+        Args:
+            export_path: OTLP/JSON行格式的导出文件，为None时只保存在内存中
+            log_breakdown: 每条追踪结束时是否以INFO级别输出分阶段耗时
+        """
+        self.enabled = True
+        self.export_path = export_path
+        self.log_breakdown = log_breakdown
+
+    def disable(self) -> None:
+        """关闭追踪"""
+        self.enabled = False
+
+    def span(self, name: str, **attributes: Any):
+        """创建一个计时阶段，嵌套调用时自动成为当前span的子span
+
+        Args:
+            name: 阶段名称
+            attributes: span属性
+
+        Returns:
+            上下文管理器，进入后得到可设置属性的span对象
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _ActiveSpan(self, name, attributes)
+
+    def _finish(self, trace: Trace) -> None:
+        """根span结束时保存、输出并导出追踪"""
+        self.traces.append(trace)
+        if self.log_breakdown:
+            logger.info("分阶段耗时:\n%s", self.format_breakdown(trace))
+        if self.export_path:
+            self._export(trace)
+
+    def last_trace(self) -> Optional[Trace]:
+        """获取最近一条完成的追踪"""
+        return self.traces[-1] if self.traces else None
+
+    def breakdown(self, trace: Optional[Trace] = None) -> List[Dict[str, Any]]:
+        """按调用层级展开追踪中各阶段的耗时
+
+        Args:
+            trace: 追踪，默认为最近一条
+
+        Returns:
+            [{"name", "depth", "duration_ms", "attributes"}] 列表，按开始时间排序
+        """
+        trace = trace or self.last_trace()
+        if trace is None:
+            return []
+
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in trace.spans:
+            children.setdefault(span.parent_id, []).append(span)
+
+        rows = []
+
+        def visit(parent_id: Optional[str], depth: int) -> None:
+            for span in sorted(children.get(parent_id, []), key=lambda s: s.start_ns):
+                rows.append(
+                    {
+                        "name": span.name,
+                        "depth": depth,
+                        "duration_ms": span.duration_ms,
+                        "attributes": dict(span.attributes),
+                    }
+                )
+                visit(span.span_id, depth + 1)
+
+        visit(None, 0)
+        return rows
+
+    def format_breakdown(self, trace: Optional[Trace] = None) -> str:
+        """格式化分阶段耗时，便于直接打印
+
+        Args:
+            trace: 追踪，默认为最近一条
+
+        Returns:
+            每行一个阶段的文本
+        """
+        lines = []
+        for row in self.breakdown(trace):
+            name = "  " * row["depth"] + row["name"]
+            lines.append(f"{name:<40} {row['duration_ms']:>10.3f}ms")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _otlp_value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def to_otlp(self, trace: Trace) -> Dict[str, Any]:
+        """转换为OTLP/JSON格式（与OpenTelemetry Collector文件导出器一致）
+
+        Args:
+            trace: 追踪
+
+        Returns:
+            包含resourceSpans的字典
+        """
+        spans = []
+        for span in trace.spans:
+            item = {
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [
+                    {"key": k, "value": self._otlp_value(v)}
+                    for k, v in span.attributes.items()
+                ],
+                "status": (
+                    {"code": 2, "message": span.error} if span.error else {"code": 1}
+                ),
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            spans.append(item)
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": SERVICE_NAME},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+                }
+            ]
+        }
+
+    def _export(self, trace: Trace) -> None:
+        """把追踪以一行JSON追加到导出文件"""
+        try:
+            line = json.dumps(self.to_otlp(trace), ensure_ascii=False)
+            with self._export_lock:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            logger.error("导出追踪时出错: %s", e)
+
+
+# 进程级别的全局追踪器，设置MEMORY_TRACE_FILE环境变量即可开启并导出到文件
+tracer = Tracer()
+if os.getenv("MEMORY_TRACE_FILE"):
+    tracer.enable(export_path=os.getenv("MEMORY_TRACE_FILE"))
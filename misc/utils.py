@@ -3,15 +3,18 @@
 """
 
 import os
+import re
 import dotenv
-from typing import Dict, List, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Union
 
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 
 # 创建语言模型实例
-def create_llm(temperature: float = 0.3) -> ChatOpenAI:
+def create_llm(temperature: float = 0.3) -> "ChatOpenAI":
     """
     创建语言模型实例
 
@@ -25,6 +28,9 @@ def create_llm(temperature: float = 0.3) -> ChatOpenAI:
     model_key = os.getenv("MODEL_KEY")
     model_base_url = os.getenv("MODEL_BASE_URL")
 
+    # langchain_openai导入较慢，只有真正创建模型时才导入
+    from langchain_openai import ChatOpenAI
+
     return ChatOpenAI(
         model=model_name,
         api_key=model_key,
@@ -33,6 +39,53 @@ def create_llm(temperature: float = 0.3) -> ChatOpenAI:
     )
 
 
+# 中日韩文字和全角标点，分词器通常按每字至少一个token切分
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的token数，不依赖具体模型的分词器
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 中文字符按每字一个token、其余字符按每4个字符一个token估计的数量
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+# BM25存储为空时写入的占位记忆
+PLACEHOLDER_MEMORY_ID = "init_memory"
+
+
+def relevant_memories(memories: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    去掉检索结果中的填充项：分数不为正的记忆和占位记忆
+
+    BM25存储不足limit条匹配时会用0分记忆补足结果，组合多个后端时这些记忆不能当作命中。
+
+    Args:
+        memories: 后端返回的记忆列表，分数在score或similarity字段
+
+    Returns:
+        List[Dict[str, Any]]: 保留原顺序的相关记忆，没有分数字段的记忆视为相关
+    """
+    relevant = []
+    for memory in memories:
+        if memory.get("id") == PLACEHOLDER_MEMORY_ID:
+            continue
+        score = memory.get("score", memory.get("similarity"))
+        if score is not None and score <= 0:
+            continue
+        relevant.append(memory)
+    return relevant
+
+
 # 工具函数
 @tool
 def get_weather(city: str) -> str:
@@ -0,0 +1,180 @@
+"""
+记忆写入的后台队列（write-behind）
+
+保存工具把记忆放入队列后立即返回预先生成的记忆ID，后台线程把排队的记忆
+按批调用存储的add_memories写入，一次重建索引或一条UNWIND语句即可写入一批。
+检索工具在读取前调用flush，保证同一会话中先保存的记忆一定能被检索到。
+"""
+
+import atexit
+import inspect
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from misc.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """按批在后台写入记忆的队列"""
+
+    def __init__(
+        self,
+        memory_store: Any,
+        batch_size: int = 64,
+        max_delay: float = 0.05,
+    ):
+        """初始化队列并启动后台写入线程
+
+        Args:
+            memory_store: 实现add_memories(contents, memory_ids=...)的记忆存储
+            batch_size: 每批最多写入的记忆条数
+            max_delay: 收到第一条记忆后最多等待多久凑满一批（秒）
+        """
+        self.memory_store = memory_store
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._accepts_importance = (
+            "importance" in inspect.signature(memory_store.add_memories).parameters
+        )
+
+        # 预先生成的ID到实际ID的映射：开启去重时一条记忆可能并入已有记忆
+        self.aliases: Dict[str, str] = {}
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._submitted = 0
+        self._applied = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._worker = threading.Thread(
+            target=self._run, name="memory-write-behind", daemon=True
+        )
+        self._worker.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未写入的记忆条数"""
+        with self._cond:
+            return self._submitted - self._applied
+
+    def submit(self, content: str, importance: int = 1) -> str:
+        """提交一条记忆，立即返回记忆ID
+
+        Args:
+            content: 记忆内容
+            importance: 重要性评分 (1-10)，存储不支持时忽略
+
+        Returns:
+            预先生成的记忆ID
+        """
+        if self._closed:
+            raise RuntimeError("写入队列已关闭")
+        memory_id = f"mem_{str(uuid.uuid4())[:8]}"
+        with self._cond:
+            self._submitted += 1
+        self._queue.put((memory_id, content, importance))
+        return memory_id
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的记忆全部写入
+
+        Args:
+            timeout: 最长等待时间（秒），为None时一直等待
+
+        Returns:
+            是否在超时前全部写入
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._applied >= self._submitted, timeout
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """写完队列中的记忆并停止后台线程
+
+        Args:
+            timeout: 等待后台线程结束的最长时间（秒）
+        """
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def _next_batch(self) -> Tuple[List[Tuple[str, str, int]], bool]:
+        """取出一批记忆，返回(批次, 是否收到停止信号)"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        """后台线程：按批写入直到收到停止信号"""
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                self._apply(batch)
+
+    def _apply(self, batch: List[Tuple[str, str, int]]) -> None:
+        """写入一批记忆，相同重要性的连续记忆合并为一次add_memories调用"""
+        start = time.perf_counter()
+        groups: List[Tuple[int, List[Tuple[str, str, int]]]] = []
+        for item in batch:
+            importance = item[2] if self._accepts_importance else 1
+            if groups and groups[-1][0] == importance:
+                groups[-1][1].append(item)
+            else:
+                groups.append((importance, [item]))
+
+        for importance, items in groups:
+            memory_ids = [item[0] for item in items]
+            contents = [item[1] for item in items]
+            kwargs = {"memory_ids": memory_ids}
+            if self._accepts_importance:
+                kwargs["importance"] = importance
+            try:
+                applied_ids = self.memory_store.add_memories(contents, **kwargs)
+                for memory_id, applied_id in zip(memory_ids, applied_ids):
+                    if applied_id != memory_id:
+                        self.aliases[memory_id] = applied_id
+                if not applied_ids:
+                    metrics.inc(
+                        "memory_write_errors_total", len(items), store="write_behind"
+                    )
+            except Exception as e:
+                metrics.inc(
+                    "memory_write_errors_total", len(items), store="write_behind"
+                )
+                logger.error("后台写入 %s 条记忆时出错: %s", len(items), e)
+
+        metrics.observe(
+            "memory_write_behind_batch_seconds",
+            time.perf_counter() - start,
+            store="write_behind",
+        )
+        with self._cond:
+            self._applied += len(batch)
+            self._cond.notify_all()
+        logger.debug("后台写入 %s 条记忆", len(batch))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试基准数据集的Arrow缓存
+"""
+
+import os
+import pickle
+import tempfile
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from benchmark_case.memory_benchmark_dataset import (  # noqa: E402
+    ArrowRows,
+    get_ttl_ds,
+    write_arrow_cache,
+)
+from benchmark_case.ttl_eval import run_evaluation  # noqa: E402
+
+
+def test_arrow_rows_lazy_access():
+    """测试内存映射缓存的按行访问、切片和序列化"""
+    print("\n===== 测试Arrow缓存 =====")
+
+    table = pa.table(
+        {
+            "context": [
+                "How do I top up?\nlabel: 3\n\nMy card was declined\nlabel: 7",
+                "I lost my card\nlabel: 1",
+                "Where is my new card\nlabel: 2",
+            ],
+            "questions": [["top up", "declined"], ["lost card"], ["new card"]],
+            "answers": [[["3"], ["7"]], [["1"]], [["2"]]],
+        }
+    )
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = write_arrow_cache(table, os.path.join(cache_dir, "ttl.arrow"))
+        rows = get_ttl_ds(cache_path)
+
+        assert isinstance(rows, ArrowRows)
+        assert len(rows) == 3
+        assert rows[1]["questions"] == ["lost card"]
+        assert rows[-1]["answers"] == [["2"]]
+        assert [row["context"] for row in rows[1:]] == table["context"].to_pylist()[1:]
+
+        restored = pickle.loads(pickle.dumps(rows[1:]))
+        assert len(restored) == 2
+        assert restored[0] == rows[1]
+
+        summary = run_evaluation(rows[:2], workers=1, backend="bm25", ks=(3,))
+        print(summary)
+        assert summary["questions"] == 3
+        assert summary["recall_at_k"]["3"] == 1.0
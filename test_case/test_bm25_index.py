@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试整数ID倒排索引与mmap记忆文件
+"""
+
+import os
+import random
+import tempfile
+
+from rank_bm25 import BM25Okapi
+
+from misc.bm25_index import BM25Index
+from misc.content_log import ContentLog
+from misc.memory_bm25 import BM25MemoryStore
+
+
+def _corpus(seed: int, docs: int):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(30)]
+    return [[rng.choice(words) for _ in range(rng.randint(1, 12))] for _ in range(docs)]
+
+
+def test_scores_match_bm25okapi():
+    """测试打分和排序与rank_bm25.BM25Okapi一致（包括负idf的下限）"""
+    print("\n===== 测试BM25打分一致性 =====")
+
+    corpus = _corpus(0, 40)
+    index = BM25Index()
+    for tokens in corpus:
+        index.add(tokens)
+    okapi = BM25Okapi(corpus)
+
+    for query in (["w1"], ["w2", "w3", "w2"], ["w0", "missing"], ["missing"]):
+        expected = okapi.get_scores(query)
+        scores = index.score(query)
+        for doc, value in enumerate(expected):
+            assert abs(scores.get(doc, 0.0) - value) < 1e-9
+
+        ranked = sorted(enumerate(expected), key=lambda item: item[1], reverse=True)
+        assert [doc for doc, _ in index.rank(scores, 10)] == [
+            doc for doc, _ in ranked[:10]
+        ]
+
+
+def test_remove_and_compact():
+    """测试删除后的打分等同于只用剩余文档建立的索引，压缩后按原顺序重新编号"""
+    print("\n===== 测试删除与压缩 =====")
+
+    corpus = _corpus(1, 30)
+    index = BM25Index()
+    for tokens in corpus:
+        index.add(tokens)
+    removed = set(range(0, 30, 3))
+    for doc in removed:
+        index.remove(doc, corpus[doc])
+
+    kept = [doc for doc in range(30) if doc not in removed]
+    okapi = BM25Okapi([corpus[doc] for doc in kept])
+    expected = okapi.get_scores(["w4", "w5"])
+    scores = index.score(["w4", "w5"])
+    for new, doc in enumerate(kept):
+        assert abs(scores.get(doc, 0.0) - expected[new]) < 1e-9
+
+    assert index.compact() == kept
+    assert index.dead == 0
+    compacted = index.score(["w4", "w5"])
+    for new in range(len(kept)):
+        assert abs(compacted.get(new, 0.0) - expected[new]) < 1e-9
+
+
+def test_content_log_follows_appends():
+    """测试文件追加后按偏移读取新记录"""
+    print("\n===== 测试mmap记忆文件 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "memories.txt")
+        log = ContentLog(path)
+        assert log.mapped_size == 0
+
+        with open(path, "wb") as f:
+            f.write(b"a\tfirst\n")
+        log.reopen()
+        assert log.read(0, 7) == b"a\tfirst"
+
+        with open(path, "ab") as f:
+            f.write("b\t第二条\n".encode("utf-8"))
+        assert (
+            log.read(8, len("b\t第二条".encode("utf-8"))).decode("utf-8") == "b\t第二条"
+        )
+        log.close()
+
+
+def test_store_keeps_text_on_disk():
+    """测试存储的记忆原文只在文件中，删除后重启仍能正确检索"""
+    print("\n===== 测试BM25存储的文件寻址 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = BM25MemoryStore(cache_dir=cache_dir)
+        ids = store.add_memories([f"用户第{i}次提到喜欢 topic{i}" for i in range(10)])
+        assert store.retrieve_relevant_memories("topic3")[0]["id"] == ids[3]
+        assert not hasattr(store, "corpus")
+
+        for memory_id in ids[:6]:
+            assert store.delete_memory(memory_id)
+        # 失效记录超过一半后压缩，文档ID重新编号
+        assert store.index.dead == 0
+        assert store.get_memory_by_id(ids[7])["content"] == "用户第7次提到喜欢 topic7"
+        assert store.retrieve_relevant_memories("topic8")[0]["id"] == ids[8]
+
+        reopened = BM25MemoryStore(cache_dir=cache_dir)
+        assert [m["id"] for m in reopened.memories] == [m["id"] for m in store.memories]
+        assert reopened.retrieve_relevant_memories("topic9")[0]["id"] == ids[9]
+
+
+def test_multiline_content_round_trip():
+    """测试含换行符、制表符和反斜杠的记忆重新加载后内容不变，不会被误当作删除记录"""
+    print("\n===== 测试多行记忆的转义 =====")
+
+    contents = [
+        "用户问题\nlabel: 1",
+        "第一行\r\n第二行\t制表符",
+        "路径 C:\\new\\table 和字面的 \\n",
+        "普通记忆",
+    ]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = BM25MemoryStore(cache_dir=cache_dir)
+        ids = store.add_memories(contents[:2])
+        ids.append(store.add_memory(contents[2]))
+        ids.append(store.add_memory(contents[3], memory_id="label: 1"))
+
+        with open(store.memory_file, "rb") as f:
+            assert len(f.read().splitlines()) == 5
+
+        follower = BM25MemoryStore(cache_dir=cache_dir, follow=True)
+        reopened = BM25MemoryStore(cache_dir=cache_dir)
+        for loaded in (store, follower, reopened):
+            for memory_id, content in zip(ids, contents):
+                assert loaded.get_memory_by_id(memory_id)["content"] == content
+        print(reopened.memories)
+
+
+if __name__ == "__main__":
+    test_scores_match_bm25okapi()
+    test_remove_and_compact()
+    test_content_log_follows_appends()
+    test_store_keeps_text_on_disk()
+    test_multiline_content_round_trip()
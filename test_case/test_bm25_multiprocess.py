@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试多个进程共享同一个BM25记忆目录：写入加锁、追加写入和增量读取
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+from misc.memory_bm25 import BM25MemoryStore
+
+
+def _write_memories(cache_dir: str, worker: int, count: int):
+    """子进程：向共享目录写入记忆"""
+    store = BM25MemoryStore(cache_dir=cache_dir)
+    for i in range(count):
+        store.add_memory(f"进程{worker}写入的第{i}条记忆", memory_id=f"w{worker}_{i}")
+
+
+def test_follow_appended_records():
+    """测试读取方增量读取其他实例追加的记忆"""
+    print("\n===== 测试增量读取 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        writer = BM25MemoryStore(cache_dir=cache_dir)
+        reader = BM25MemoryStore(cache_dir=cache_dir, follow=True)
+
+        writer.add_memory("用户喜欢喝乌龙茶", memory_id="tea")
+        writer.add_memories(["用户住在杭州", "用户养了一只猫"])
+
+        results = reader.retrieve_relevant_memories("乌龙茶")
+        print(results)
+        assert results and results[0]["id"] == "tea"
+        assert len(reader.memories) == len(writer.memories)
+
+        # 没有新记录时不重新读取
+        assert reader.refresh() == 0
+
+        # 写入方整体重写文件（删除）后读取方重新加载
+        assert writer.delete_memory("tea")
+        assert reader.refresh() == -1
+        assert reader.get_memory_by_id("tea") is None
+        assert len(reader.memories) == len(writer.memories)
+
+
+def test_writers_do_not_lose_records():
+    """测试两个实例交替写入不会覆盖对方的记忆"""
+    print("\n===== 测试交替写入 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        a = BM25MemoryStore(cache_dir=cache_dir)
+        b = BM25MemoryStore(cache_dir=cache_dir)
+        a.add_memory("第一条记忆", memory_id="a1")
+        b.add_memory("第二条记忆", memory_id="b1")
+        a.add_memory("第三条记忆", memory_id="a2")
+
+        fresh = BM25MemoryStore(cache_dir=cache_dir)
+        ids = {m["id"] for m in fresh.memories}
+        print(ids)
+        assert {"a1", "b1", "a2"} <= ids
+
+
+def test_concurrent_processes():
+    """测试多个进程同时写入同一个目录"""
+    print("\n===== 测试多进程写入 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        BM25MemoryStore(cache_dir=cache_dir)
+        ctx = multiprocessing.get_context("spawn")
+        workers = [
+            ctx.Process(target=_write_memories, args=(cache_dir, w, 10))
+            for w in range(3)
+        ]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join(60)
+            assert p.exitcode == 0
+
+        with open(os.path.join(cache_dir, "memories.txt"), encoding="utf-8") as f:
+            ids = [line.split("\t")[0] for line in f]
+        print(f"共 {len(ids)} 行")
+        expected = {f"w{w}_{i}" for w in range(3) for i in range(10)}
+        assert expected <= set(ids)
+        assert len(ids) == len(set(ids))
+
+
+if __name__ == "__main__":
+    test_follow_appended_records()
+    test_writers_do_not_lose_records()
+    test_concurrent_processes()
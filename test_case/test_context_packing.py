@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试检索结果按token预算打包
+"""
+
+import tempfile
+
+from misc.context_packing import pack_memories, query_terms, snippet
+from misc.memory_bm25 import create_memory_tools
+from misc.utils import estimate_tokens
+
+
+def test_snippet_centers_on_query_terms():
+    """测试长记忆截取为查询词附近的片段"""
+    print("\n===== 测试片段截取 =====")
+
+    text = "前面的无关内容" * 40 + "用户喜欢机器学习" + "后面的内容" * 40
+    result = snippet(text, query_terms("机器学习"), 30)
+    print(result)
+    assert "机器学习" in result
+    assert result.startswith("…") and result.endswith("…")
+    assert snippet("短记忆", ["短"], 30) == "短记忆"
+
+
+def test_pack_memories_reports_dropped():
+    """测试超出预算的记忆被丢弃并报告条数"""
+    print("\n===== 测试预算打包 =====")
+
+    memories = [{"content": f"第{i}条记忆，" + "内容" * 100} for i in range(10)]
+    packed = pack_memories(
+        memories,
+        "记忆",
+        lambda i, memory, content: f"{i}. {content}",
+        token_budget=300,
+        max_memory_tokens=100,
+    )
+    print(packed.text)
+    assert packed.included + packed.dropped == 10
+    assert packed.dropped > 0
+    assert packed.truncated == packed.included
+    assert f"另有{packed.dropped}条" in packed.text
+    assert estimate_tokens(packed.text) <= 300
+
+
+def test_retrieve_tool_output_is_bounded():
+    """测试检索工具输出受token预算限制"""
+    print("\n===== 测试检索工具输出 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        _, retrieve_tool = create_memory_tools(cache_dir, cache_size=0)
+        retrieve_tool.memory_store.add_memories(
+            [f"用户喜欢蓝色，第{i}条很长的说明" + "补充" * 200 for i in range(5)]
+        )
+        retrieve_tool.token_budget = 400
+
+        result = retrieve_tool._run("蓝色", limit=5)
+        print(result)
+        assert estimate_tokens(result) <= 400
+        assert "蓝色" in result
+        assert "因长度限制未显示" in result
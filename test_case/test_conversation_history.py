@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试按token预算压缩对话历史
+"""
+
+import tempfile
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from misc.conversation_history import ConversationHistory
+from misc.memory_bm25 import create_memory_tools
+
+
+def _agent_reply(messages, i):
+    """模拟Agent一轮的输出：一次工具调用、工具结果和最终回复"""
+    call = {"name": "retrieve_memories", "args": {"query": f"问题{i}"}, "id": f"c{i}"}
+    return messages + [
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content="没有找到相关记忆。", tool_call_id=f"c{i}"),
+        AIMessage(content=f"这是第{i}轮的回答，" + "内容" * 20),
+    ]
+
+
+def test_history_window_and_eviction_to_memory():
+    """测试窗口保持在预算内，被淘汰的对话写入记忆库并可检索"""
+    print("\n===== 测试对话历史压缩 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        save_tool, retrieve_tool = create_memory_tools(cache_dir, cache_size=0)
+        history = ConversationHistory(save_tool, max_tokens=150, min_turns=1)
+
+        for i in range(6):
+            window = history.add_user_message(f"第{i}轮：我喜欢编号为{i}的颜色")
+            history.update(_agent_reply(window, i))
+            assert history.total_tokens <= 150 or len(history._turns) == 1
+
+        messages = history.messages
+        print(f"窗口消息数: {len(messages)}, 淘汰轮数: {history.evicted_turns}")
+        assert history.evicted_turns > 0
+        # 窗口总是以用户消息开始，工具结果不会脱离对应的工具调用
+        assert isinstance(messages[0], HumanMessage)
+        assert "第5轮" in messages[0].content or "第4轮" in messages[0].content
+
+        result = retrieve_tool._run("编号为0的颜色")
+        print(result)
+        assert "[历史对话] 用户: 第0轮" in result
+
+        # 重新加载记忆文件后，一轮对话的用户和助手部分都还在
+        _, reloaded_tool = create_memory_tools(cache_dir, cache_size=0)
+        result = reloaded_tool._run("编号为0的颜色")
+        print(result)
+        assert "用户: 第0轮：我喜欢编号为0的颜色 / 助手: 这是第0轮的回答" in result
+
+
+def test_summarizer_is_used():
+    """测试配置摘要函数时保存摘要而不是原文"""
+    print("\n===== 测试历史摘要 =====")
+
+    saved = []
+
+    class FakeSaveTool:
+        def _run(self, content):
+            saved.append(content)
+            return "ok"
+
+    history = ConversationHistory(
+        FakeSaveTool(), max_tokens=20, summarizer=lambda text: f"摘要({len(text)})"
+    )
+    history.add_user_message("很长的一段话" * 10)
+    history.update(history.messages + [AIMessage(content="好的")])
+    history.add_user_message("下一个问题")
+
+    assert len(saved) == 1
+    assert saved[0].startswith("[历史对话] 摘要(")
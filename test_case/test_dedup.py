@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试写入时的近似重复检测
+"""
+
+import os
+import tempfile
+
+from misc.dedup import SimHashIndex
+from misc.memory_bm25 import BM25MemoryStore
+from misc.memory_graph import GraphMemoryStore
+
+
+def test_simhash_index_matches_near_duplicates():
+    """测试标点和空白不同的文本视为近似重复，无关文本不匹配"""
+    print("\n===== 测试SimHash索引 =====")
+
+    index = SimHashIndex(max_distance=3)
+    index.add("a", "用户喜欢蓝色，也喜欢绿色。")
+    index.add("b", "The user works at a robotics startup in Berlin")
+
+    assert index.find("用户喜欢蓝色 也喜欢绿色！") == "a"
+    assert index.find("the user works at a robotics startup in berlin.") == "b"
+    assert index.find("明天下午三点开会讨论项目进度") is None
+
+    index.remove("a")
+    assert index.find("用户喜欢蓝色，也喜欢绿色。") is None
+    assert len(index) == 1
+
+
+def test_bm25_dedup_policies():
+    """测试BM25存储的skip和merge策略"""
+    print("\n===== 测试BM25去重 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = BM25MemoryStore(cache_dir=cache_dir, dedup_policy="skip")
+        first = store.add_memory("用户喜欢蓝色，也喜欢绿色。")
+        count = len(store.memories)
+        assert store.add_memory("用户喜欢蓝色 也喜欢绿色！") == first
+        assert len(store.memories) == count
+
+        ids = store.add_memories(["用户喜欢蓝色，也喜欢绿色", "用户住在上海浦东新区"])
+        assert ids[0] == first
+        assert len(store.memories) == count + 1
+
+        # 重新加载后指纹索引从磁盘恢复
+        reloaded = BM25MemoryStore(cache_dir=cache_dir, dedup_policy="merge")
+        assert reloaded.add_memory("用户喜欢蓝色，也喜欢绿色！！") == first
+        contents = [m["content"] for m in reloaded.memories if m["id"] == first]
+        print(contents)
+        assert contents == ["用户喜欢蓝色，也喜欢绿色！！"]
+        assert len(reloaded.memories) == count + 1
+
+
+def test_graph_dedup_bump():
+    """测试图存储的bump策略提升已有记忆的重要性"""
+    print("\n===== 测试图存储去重 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = GraphMemoryStore(
+            db_path=os.path.join(tmp_dir, "dedup.kuzu"), dedup_policy="bump"
+        )
+        try:
+            first = store.add_memory("用户喜欢蓝色，也喜欢绿色。", importance=3)
+            assert store.add_memory("用户喜欢蓝色 也喜欢绿色！") == first
+            assert store.get_memory_by_id(first)["importance"] == 4
+
+            ids = store.add_memories(["用户喜欢蓝色，也喜欢绿色", "用户住在上海浦东"])
+            assert ids[0] == first
+            assert store.get_memory_by_id(first)["importance"] == 5
+            assert store.get_memory_by_id(ids[1]) is not None
+        finally:
+            store.close()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试图存储的后台关系建立
+"""
+
+import os
+import tempfile
+
+from misc.memory_graph import GraphMemoryStore
+
+
+def _edges(store, rel):
+    query = f"MATCH (a:Memory)-[r:{rel}]->(b:Memory) RETURN a.memory_id, b.memory_id"
+    return sorted(tuple(row) for row in store.conn.execute(query))
+
+
+def _write(store):
+    ids = [store.add_memory(f"用户喜欢 蓝色 的 东西 {i}") for i in range(3)]
+    ids += store.add_memories([f"用户喜欢 蓝色 的 东西 {i}" for i in range(3, 6)])
+    return ids
+
+
+def test_deferred_links_match_synchronous_links():
+    """测试后台建立的关系与同步写入时相同，水位推进到全部记忆"""
+    print("\n===== 测试后台关系建立 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sync_store = GraphMemoryStore(db_path=os.path.join(tmp_dir, "sync.kuzu"))
+        deferred = GraphMemoryStore(
+            db_path=os.path.join(tmp_dir, "deferred.kuzu"),
+            defer_linking=True,
+            link_batch_size=4,
+        )
+        try:
+            sync_ids = _write(sync_store)
+            deferred_ids = _write(deferred)
+
+            assert deferred.wait_for_links(timeout=30)
+            print(f"水位: {deferred.link_watermark}")
+            assert deferred.link_watermark == 6
+            assert deferred.pending_links == 0
+            assert all(deferred.is_linked(memory_id) for memory_id in deferred_ids)
+
+            # 两个存储的ID不同，按写入顺序比较关系结构
+            for rel in ("FOLLOWS", "RELATED_TO"):
+                sync_edges = {
+                    (sync_ids.index(a), sync_ids.index(b))
+                    for a, b in _edges(sync_store, rel)
+                }
+                deferred_edges = {
+                    (deferred_ids.index(a), deferred_ids.index(b))
+                    for a, b in _edges(deferred, rel)
+                }
+                print(rel, len(sync_edges), len(deferred_edges))
+                assert sync_edges and sync_edges == deferred_edges
+        finally:
+            sync_store.close()
+            deferred.close()
+
+
+def test_close_drains_pending_links():
+    """测试关闭存储时先处理完排队的记忆"""
+    print("\n===== 测试关闭时建立关系 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "drain.kuzu")
+        store = GraphMemoryStore(db_path=db_path, defer_linking=True)
+        for i in range(5):
+            store.add_memory(f"记忆 {i} 关于 天气")
+        store.close()
+
+        reopened = GraphMemoryStore(db_path=db_path)
+        try:
+            assert len(_edges(reopened, "FOLLOWS")) > 0
+        finally:
+            reopened.close()
+
+
+def test_failed_batch_rolls_back():
+    """测试一批关系建立失败时回滚事务，之后的写入和关系建立不受影响"""
+    print("\n===== 测试后台事务失败 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = GraphMemoryStore(
+            db_path=os.path.join(tmp_dir, "rollback.kuzu"),
+            defer_linking=True,
+            link_batch_size=8,
+        )
+        connect = store._connect_to_similar_memories
+        bad_ids = []
+
+        def failing_connect(memory_id, content, conn=None, timestamp=None):
+            # 先在事务中写入一条关系，再模拟失败
+            connect(memory_id, content, conn, timestamp)
+            if memory_id in bad_ids:
+                raise RuntimeError("模拟建立关系失败")
+
+        store._connect_to_similar_memories = failing_connect
+        try:
+            # 阻塞后台线程，让三条记忆进入同一批
+            store._write_lock.acquire()
+            ids = [store.add_memory(f"用户喜欢 红色 的 东西 {i}") for i in range(3)]
+            bad_ids.append(ids[1])
+            store._write_lock.release()
+
+            assert store.wait_for_links(timeout=30)
+            print(f"水位: {store.link_watermark}, 失败: {store.failed_links}")
+            assert store.link_watermark == 2 and store.failed_links == 1
+            assert not store.is_linked(ids[1])
+            assert store.is_linked(ids[0]) and store.is_linked(ids[2])
+            # 失败记忆的关系已回滚
+            assert all(ids[1] != a for a, _ in _edges(store, "RELATED_TO"))
+
+            later = store.add_memory("用户喜欢 红色 的 东西 3")
+            assert later
+            assert store.wait_for_links(timeout=30)
+            assert store.is_linked(later)
+            assert any(a == later for a, _ in _edges(store, "FOLLOWS"))
+        finally:
+            store.close()
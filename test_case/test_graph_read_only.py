@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试以只读方式打开图数据库的检索副本
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from misc.memory_graph import (
+    GraphMemoryStore,
+    acquire_graph_store,
+    create_memory_tools,
+    release_graph_store,
+)
+
+
+def test_read_only_replicas():
+    """测试多个只读副本同时检索，写入操作被拒绝"""
+    print("\n===== 测试只读副本 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "replica.kuzu")
+        writer = GraphMemoryStore(db_path=db_path)
+        memory_id = writer.add_memory("用户喜欢爬山", importance=4)
+        writer.close()
+
+        replicas = [
+            GraphMemoryStore(
+                db_path=db_path,
+                read_only=True,
+                buffer_pool_size=64 * 1024 * 1024,
+                max_num_threads=1,
+            )
+            for _ in range(2)
+        ]
+        for replica in replicas:
+            memories = replica.retrieve_relevant_memories("爬山")
+            print(memories)
+            assert memories and memories[0]["id"] == memory_id
+            assert replica.get_memory_by_id(memory_id)["importance"] == 4
+
+        replica = replicas[0]
+        assert replica.add_memory("新的记忆") == ""
+        assert replica.add_memories(["新的记忆"]) == []
+        assert not replica.update_memory_importance(memory_id, 9)
+        assert not replica.delete_memory(memory_id)
+        assert replica.get_memory_by_id(memory_id)["importance"] == 4
+
+        for replica in replicas:
+            replica.close()
+
+
+def test_read_only_rejects_write_options():
+    """测试只读模式不能与写入相关的选项同时使用"""
+    with pytest.raises(ValueError):
+        GraphMemoryStore(db_path="unused", read_only=True, defer_linking=True)
+    with pytest.raises(ValueError):
+        create_memory_tools("unused", read_only=True, write_behind=True)
+
+
+def test_registry_separates_read_only():
+    """测试注册表按打开方式区分同一数据库文件"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "registry")
+        GraphMemoryStore(db_path=db_path).close()
+
+        replica = acquire_graph_store(db_path, read_only=True)
+        assert acquire_graph_store(db_path, read_only=True) is replica
+        assert replica.read_only
+        assert not release_graph_store(replica)
+        assert release_graph_store(replica)
+
+
+if __name__ == "__main__":
+    test_read_only_replicas()
+    test_read_only_rejects_write_options()
+    test_registry_separates_read_only()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试混合检索记忆存储的功能
+"""
+
+import tempfile
+import time
+
+from misc.memory_bm25 import BM25MemoryStore
+from misc.memory_hybrid import HybridMemoryStore
+from misc.memory_vector import VectorMemoryStore
+from misc.retrieval_cache import RetrievalCache
+
+
+class SlowStore:
+    """模拟检索很慢的后端"""
+
+    delay = 1.0
+
+    def add_memory(self, content, memory_id=None):
+        return memory_id
+
+    def retrieve_relevant_memories(self, query, limit=5):
+        time.sleep(self.delay)
+        return [{"id": "slow", "content": "慢后端的结果", "score": 1.0}]
+
+    def get_memory_by_id(self, memory_id):
+        return None
+
+
+def test_hybrid_fusion():
+    """测试多后端写入、融合与去重"""
+    print("\n===== 测试 HybridMemoryStore 融合检索 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stores = {
+            "bm25": BM25MemoryStore(cache_dir=f"{tmp_dir}/bm25"),
+            "vector": VectorMemoryStore(cache_dir=f"{tmp_dir}/vector"),
+        }
+        for fusion in ("rrf", "weighted"):
+            hybrid = HybridMemoryStore(stores, fusion=fusion)
+            memory_id = hybrid.add_memory(f"用户喜欢蓝色 ({fusion})")
+            hybrid.add_memory(f"Python是一种编程语言 ({fusion})")
+
+            # 同一条记忆在两个后端使用相同的ID
+            assert stores["bm25"].get_memory_by_id(memory_id)
+            assert stores["vector"].get_memory_by_id(memory_id)
+
+            memories = hybrid.retrieve_relevant_memories("蓝色", limit=3)
+            ids = [m["id"] for m in memories]
+            assert len(ids) == len(set(ids))
+            print(f"{fusion}: {[(m['content'], m['sources']) for m in memories]}")
+            assert memories[0]["content"].startswith("用户喜欢蓝色")
+            assert sorted(memories[0]["sources"]) == ["bm25", "vector"]
+            hybrid.close()
+
+
+def test_hybrid_drops_padding():
+    """测试后端的0分补足结果和占位记忆不参与融合"""
+    print("\n===== 测试 HybridMemoryStore 过滤补足结果 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hybrid = HybridMemoryStore(
+            {
+                "bm25": BM25MemoryStore(cache_dir=f"{tmp_dir}/bm25"),
+                "vector": VectorMemoryStore(cache_dir=f"{tmp_dir}/vector"),
+            }
+        )
+        fruit_id = hybrid.add_memory("用户喜欢吃苹果和香蕉等水果")
+        hybrid.add_memory("Python是一种编程语言")
+        hybrid.add_memory("用户住在杭州")
+
+        memories = hybrid.retrieve_relevant_memories("水果", limit=5)
+        print([(m["content"], m["sources"]) for m in memories])
+        assert [m["id"] for m in memories] == [fruit_id]
+        hybrid.close()
+
+
+def test_hybrid_latency_budget():
+    """测试慢后端被延迟预算截断"""
+    print("\n===== 测试 HybridMemoryStore 延迟预算 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hybrid = HybridMemoryStore(
+            {"vector": VectorMemoryStore(cache_dir=tmp_dir), "slow": SlowStore()},
+            latency_budget={"vector": 1.0, "slow": 0.1},
+        )
+        hybrid.add_memory("用户喜欢蓝色")
+
+        start = time.monotonic()
+        memories = hybrid.retrieve_relevant_memories("蓝色")
+        elapsed = time.monotonic() - start
+        print(f"检索耗时: {elapsed:.3f}秒")
+
+        assert elapsed < 0.5
+        assert all("slow" not in m["sources"] for m in memories)
+        hybrid.close()
+
+
+def test_hybrid_does_not_cache_degraded_results():
+    """测试有后端超时时融合结果不写入缓存，后端恢复后重新检索"""
+    print("\n===== 测试 HybridMemoryStore 降级结果不缓存 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        slow = SlowStore()
+        hybrid = HybridMemoryStore(
+            {"vector": VectorMemoryStore(cache_dir=tmp_dir), "slow": slow},
+            latency_budget={"vector": 1.0, "slow": 0.1},
+            retrieval_cache=RetrievalCache(),
+        )
+        hybrid.add_memory("用户喜欢蓝色")
+
+        memories = hybrid.retrieve_relevant_memories("蓝色")
+        assert all("slow" not in m["sources"] for m in memories)
+        assert hybrid.retrieval_cache.stats()["size"] == 0
+
+        # 慢后端恢复后，同一查询包含它的结果，完整结果才写入缓存
+        slow.delay = 0.0
+        time.sleep(1.0)
+        memories = hybrid.retrieve_relevant_memories("蓝色")
+        assert any("slow" in m["sources"] for m in memories)
+        assert hybrid.retrieval_cache.stats()["size"] == 1
+        hybrid.close()
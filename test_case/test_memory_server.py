@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试本地记忆服务
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from misc.memory_bm25 import BM25MemoryStore
+from misc.memory_server import MemoryClient, MemoryServer, create_memory_tools
+
+
+class _ServerThread:
+    """在后台线程的事件循环中运行记忆服务"""
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(server.start(), self.loop).result(10)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+
+
+def test_concurrent_clients_share_store_and_batch_writes():
+    """测试多个客户端并发写入被合并，并能检索到彼此的记忆"""
+    print("\n===== 测试记忆服务 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = BM25MemoryStore(cache_dir=tmp_dir)
+        calls = []
+        original = store.add_memories
+
+        def add_memories(contents, memory_ids=None):
+            calls.append(len(contents))
+            return original(contents, memory_ids)
+
+        store.add_memories = add_memories
+        server = MemoryServer(
+            store, socket_path=os.path.join(tmp_dir, "memory.sock"), batch_window=0.2
+        )
+        runner = _ServerThread(server)
+        clients = [MemoryClient(socket_path=server.socket_path) for _ in range(8)]
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                ids = list(
+                    pool.map(
+                        lambda i: clients[i].add_memory(
+                            f"工作进程{i}记录：项目代号是北极星"
+                        ),
+                        range(8),
+                    )
+                )
+            print(f"写入批次: {calls}")
+            assert all(ids) and len(set(ids)) == 8
+            assert len(calls) < 8
+
+            memories = clients[0].retrieve_relevant_memories("北极星", limit=8)
+            assert {m["id"] for m in memories} == set(ids)
+            assert (
+                clients[3].get_memory_by_id(ids[5])["content"].startswith("工作进程5")
+            )
+            assert clients[1].delete_memory(ids[0])
+            assert clients[2].get_memory_by_id(ids[0]) is None
+        finally:
+            for client in clients:
+                client.close()
+            runner.stop()
+        assert not os.path.exists(server.socket_path)
+
+
+def test_tools_over_tcp():
+    """测试记忆工具通过TCP连接服务"""
+    print("\n===== 测试记忆服务工具 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        server = MemoryServer(BM25MemoryStore(cache_dir=tmp_dir), port=0)
+        runner = _ServerThread(server)
+        save_tool, retrieve_tool = create_memory_tools(port=server.port)
+        try:
+            assert "记忆已保存" in save_tool._run("用户最喜欢的水果是芒果")
+            result = retrieve_tool._run("芒果")
+            print(result)
+            assert "芒果" in result
+        finally:
+            save_tool.memory_store.close()
+            runner.stop()
+
+        # 服务停止后客户端返回失败而不是抛出异常
+        assert save_tool._run("服务已停止") == "保存记忆失败"
+
+
+def test_read_only_server_rejects_writes():
+    """测试只读服务拒绝写入请求，检索不受影响"""
+    print("\n===== 测试只读记忆服务 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = BM25MemoryStore(cache_dir=tmp_dir)
+        memory_id = store.add_memories(["用户住在成都", "用户喜欢爬山", "用户养猫"])[0]
+        server = MemoryServer(
+            store, socket_path=os.path.join(tmp_dir, "memory.sock"), read_only=True
+        )
+        runner = _ServerThread(server)
+        client = MemoryClient(socket_path=server.socket_path)
+        try:
+            assert client.add_memory("新的记忆") == ""
+            assert client.add_memories(["新的记忆"]) == []
+            with pytest.raises(RuntimeError, match="只读"):
+                client.call("delete", memory_id=memory_id)
+            assert client.get_memory_by_id(memory_id)["content"] == "用户住在成都"
+            results = client.retrieve_relevant_memories("成都")
+            print(results)
+            assert results and results[0]["id"] == memory_id
+        finally:
+            client.close()
+            runner.stop()
+        assert len(store) == 4
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试冷热分层的记忆存储
+"""
+
+import tempfile
+
+from misc.memory_bm25 import BM25MemoryStore
+from misc.memory_tiered import TieredMemoryStore, create_memory_tools
+
+
+def test_hot_tier_answers_and_cold_fallback():
+    """测试热层命中时不查冷层，热层分数不足时回退并在后台提升"""
+    print("\n===== 测试分层检索 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold = BM25MemoryStore(cache_dir=cache_dir)
+        cold.add_memories(
+            ["用户的猫叫咪咪，是一只橘猫", "用户住在杭州西湖区"]
+            + [f"无关的历史记录{i}" for i in range(20)]
+        )
+
+        store = TieredMemoryStore(cold, hot_capacity=4, score_threshold=0.5)
+        try:
+            for i in range(4):
+                store.add_memory(f"最近的对话{i}：用户在学习日语第{i}课")
+
+            memories = store.retrieve_relevant_memories("日语第2课", limit=1)
+            print(memories)
+            assert memories[0]["tier"] == "hot"
+            assert "第2课" in memories[0]["content"]
+
+            memories = store.retrieve_relevant_memories("橘猫", limit=1)
+            print(memories)
+            assert memories[0]["tier"] == "cold"
+            assert "咪咪" in memories[0]["content"]
+
+            # 后台提升完成后同一查询由热层回答，热层容量保持不变
+            store.flush()
+            assert memories[0]["id"] in store.hot
+            assert len(store.hot) == 4
+            assert store.retrieve_relevant_memories("橘猫", limit=1)[0]["tier"] == "hot"
+
+            # 无关查询不返回冷层的0分补足结果，也不会把它们提升到热层
+            hot_ids = set(store.hot._memories)
+            assert store.retrieve_relevant_memories("量子计算", limit=5) == []
+            store.flush()
+            assert set(store.hot._memories) == hot_ids
+            assert "init_memory" not in store.hot
+
+            assert store.delete_memory(memories[0]["id"])
+            assert store.get_memory_by_id(memories[0]["id"]) is None
+        finally:
+            store.close()
+
+
+def test_tiered_tools():
+    """测试分层存储的记忆工具"""
+    print("\n===== 测试分层存储工具 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        save_tool, retrieve_tool = create_memory_tools(
+            bm25_cache_dir=cache_dir, score_threshold=0.2
+        )
+        try:
+            assert "记忆已保存" in save_tool._run("用户喜欢爬山和露营")
+            result = retrieve_tool._run("爬山", limit=1)
+            print(result)
+            assert "爬山" in result and "层级: hot" in result
+        finally:
+            retrieve_tool.memory_store.close()
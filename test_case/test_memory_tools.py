@@ -5,16 +5,22 @@
 测试记忆图谱工具的功能
 """
 
+import logging
 import os
+import tempfile
 import time
 from datetime import datetime
 
 from misc.memory_graph import (
     GraphMemoryStore,
+    acquire_graph_store,
+    release_graph_store,
     create_memory_tools,
     MemorySaveTool,
     MemoryRetrieveTool,
 )
+from misc.memory_hybrid import create_memory_tools as create_hybrid_tools
+from misc.memory_tiered import create_memory_tools as create_tiered_tools
 
 
 def test_graph_memory_store():
@@ -149,6 +155,84 @@ def test_memory_relationships():
     print("\n记忆关系测试完成")
 
 
+def test_lazy_kuzu_graph():
+    """测试KuzuGraph在首次访问时才创建，并缓存模式内省结果"""
+    print("\n===== 测试 KuzuGraph 延迟创建 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        memory_store = GraphMemoryStore(db_path=os.path.join(tmp_dir, "lazy.kuzu"))
+        assert memory_store._graph is None
+
+        schema = memory_store.graph_schema
+        print(f"数据库模式: {schema}")
+        assert "Memory" in schema
+        assert memory_store.graph is memory_store.graph
+
+    print("\nKuzuGraph 延迟创建测试完成")
+
+
+def test_shared_store_registry():
+    """测试同一数据库文件在进程内共享同一个存储实例"""
+    print("\n===== 测试共享存储注册表 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "shared")
+        save_tool, _ = create_memory_tools(db_path)
+        _, retrieve_tool = create_memory_tools(db_path + ".kuzu")
+        assert save_tool.memory_store is retrieve_tool.memory_store
+
+        save_tool._run("用户喜欢绿色", importance=3)
+        assert "绿色" in retrieve_tool._run("绿色")
+
+        # 两次获取需要两次释放，最后一次释放时关闭数据库
+        assert not release_graph_store(save_tool.memory_store)
+        assert release_graph_store(retrieve_tool.memory_store)
+
+        reopened = acquire_graph_store(db_path)
+        assert reopened is not save_tool.memory_store
+        assert reopened.retrieve_relevant_memories("绿色")
+        release_graph_store(reopened)
+
+    print("\n共享存储注册表测试完成")
+
+
+def test_shared_store_kwargs_and_hybrid(caplog):
+    """测试按不同参数获取已打开的存储时记录警告，混合检索和分层存储关闭时释放图存储"""
+    print("\n===== 测试共享存储的参数 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "kwargs")
+        with caplog.at_level(logging.WARNING, logger="misc.store_registry"):
+            # 相同设置每次都会新建检索缓存和容量策略对象，不应视为参数不同
+            save_tool, _ = create_memory_tools(db_path, max_memories=5)
+            other_tool, _ = create_memory_tools(db_path, max_memories=5)
+            store = save_tool.memory_store
+            assert other_tool.memory_store is store
+            assert not caplog.records
+            assert acquire_graph_store(db_path, defer_linking=True) is store
+        print(caplog.text)
+        assert "defer_linking" in caplog.text
+        assert not store.defer_linking
+
+        # 混合检索和分层存储关闭时各自释放获取的引用
+        hybrid_tool, _ = create_hybrid_tools(
+            bm25_cache_dir=None, vector_cache_dir=None, db_path=db_path
+        )
+        assert hybrid_tool.memory_store.stores["graph"] is store
+        hybrid_tool.memory_store.close()
+        tiered_tool, _ = create_tiered_tools(db_path=db_path)
+        assert tiered_tool.memory_store.cold_store is store
+        tiered_tool.memory_store.close()
+        tiered_tool.memory_store.close()
+
+        assert not release_graph_store(store)
+        assert not release_graph_store(store)
+        assert release_graph_store(store)
+        reopened = acquire_graph_store(db_path)
+        assert reopened is not store
+        assert release_graph_store(reopened)
+
+
 def main():
     """主函数"""
     print("开始测试记忆图谱功能...")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试向量记忆存储的功能
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from misc.memory_vector import (
+    HashingEmbedder,
+    HNSWIndex,
+    VectorMemoryStore,
+    create_memory_tools,
+)
+
+
+def test_hashing_embedder():
+    """测试哈希嵌入器的确定性和归一化"""
+    print("\n===== 测试 HashingEmbedder =====")
+
+    embedder = HashingEmbedder(dim=64)
+    vectors = embedder(["用户喜欢蓝色", "用户喜欢蓝色", "Python编程"])
+
+    assert vectors.shape == (3, 64)
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors[0], vectors[1])
+    assert np.isclose(np.linalg.norm(vectors[2]), 1.0)
+    # 共享字词的中文文本应当比无关文本更相似
+    similar = embedder(["用户最喜欢的颜色是蓝色"])[0] @ vectors[0]
+    unrelated = embedder(["Python编程"])[0] @ vectors[0]
+    assert similar > unrelated
+
+
+def test_hnsw_recall():
+    """测试HNSW索引与暴力检索结果的一致性"""
+    print("\n===== 测试 HNSWIndex 召回率 =====")
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    index = HNSWIndex(lambda: vectors, m=8, ef_construction=64, ef_search=64)
+    for node in range(len(vectors)):
+        index.add(node)
+
+    hits = 0
+    for query in vectors[:50]:
+        exact = set(np.argsort(-(vectors @ query))[:10].tolist())
+        approx = {node for _, node in index.search(query, 10)}
+        hits += len(exact & approx)
+    recall = hits / 500
+    print(f"recall@10: {recall:.3f}")
+    assert recall > 0.9
+
+
+def test_vector_memory_store():
+    """测试VectorMemoryStore的添加、检索和持久化"""
+    print("\n===== 测试 VectorMemoryStore =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = VectorMemoryStore(cache_dir=cache_dir, exact_search_threshold=0)
+        apple_id = store.add_memory("苹果是一种水果，也是一家科技公司 Apple")
+        store.add_memory("香蕉banana是黄色的水果")
+        store.add_memory("Python是一种流行的编程语言，用于AI开发")
+
+        memories = store.retrieve_relevant_memories("编程语言", limit=1)
+        assert memories[0]["content"].startswith("Python")
+        assert store.get_memory_by_id(apple_id)["content"].endswith("Apple")
+        store.close()
+        assert os.path.exists(os.path.join(cache_dir, "hnsw.npz"))
+
+        # 重新打开同一目录，记忆和索引应当被恢复
+        reopened = VectorMemoryStore(cache_dir=cache_dir, exact_search_threshold=0)
+        assert len(reopened.memories) == 3
+        memories = reopened.retrieve_relevant_memories("apple", limit=1)
+        assert memories[0]["id"] == apple_id
+
+        save_tool, retrieve_tool = create_memory_tools(cache_dir)
+        print(save_tool._run("用户是一位NLP研究者"))
+        result = retrieve_tool._run("NLP研究")
+        print(result)
+        assert "NLP" in result
+
+
+def test_reopen_loads_saved_index(monkeypatch):
+    """测试重新打开时加载保存的索引，只补齐保存之后新增的记忆"""
+    print("\n===== 测试加载持久化索引 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = VectorMemoryStore(cache_dir=cache_dir, autosave_every=10)
+        store.add_memories([f"第{i}条记忆：用户喜欢编号{i}" for i in range(20)])
+        for i in range(20, 25):
+            store.add_memory(f"第{i}条记忆：用户喜欢编号{i}")
+        # 批量写入后自动保存过，之后的5条尚未保存
+        assert store._saved_count == 20
+        expected = store.retrieve_relevant_memories("编号7", limit=3)
+
+        added = []
+        original_add = HNSWIndex.add
+        monkeypatch.setattr(
+            HNSWIndex,
+            "add",
+            lambda self, node: added.append(node) or original_add(self, node),
+        )
+        reopened = VectorMemoryStore(cache_dir=cache_dir, autosave_every=10)
+        print(f"重新加入索引的节点: {added}")
+        assert added == list(range(20, 25))
+        assert reopened._saved_count == 25
+        assert reopened.retrieve_relevant_memories("编号7", limit=3) == expected
+
+        added.clear()
+        reopened.close()
+        VectorMemoryStore(cache_dir=cache_dir)
+        assert added == []
+
+
+def test_multiline_content_round_trip():
+    """测试多行记忆重新加载后内容和向量行一一对应"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = VectorMemoryStore(cache_dir=cache_dir)
+        ids = store.add_memories(["问题\nlabel: 1", "第二条\t记忆"])
+        ids.append(store.add_memory("第三条\r\n记忆"))
+        store.close()
+
+        reopened = VectorMemoryStore(cache_dir=cache_dir)
+        assert [m["id"] for m in reopened.memories] == ids
+        assert reopened.get_memory_by_id(ids[0])["content"] == "问题\nlabel: 1"
+        assert reopened.get_memory_by_id(ids[2])["content"] == "第三条\r\n记忆"
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试日志与运行指标
+"""
+
+import json
+import tempfile
+
+from misc.memory_bm25 import BM25MemoryStore
+from misc.metrics import MetricsRegistry, metrics
+
+
+def test_metrics_export():
+    """测试计数器和直方图的导出格式"""
+    print("\n===== 测试指标导出 =====")
+
+    registry = MetricsRegistry()
+    registry.describe("demo_total", "示例计数器")
+    registry.inc("demo_total", store="bm25")
+    registry.inc("demo_total", 2, store="bm25")
+    registry.observe("demo_seconds", 0.003, store="bm25")
+    registry.observe("demo_seconds", 0.2, store="bm25")
+
+    text = registry.to_prometheus()
+    print(text)
+    assert "# HELP demo_total 示例计数器" in text
+    assert 'demo_total{store="bm25"} 3' in text
+    assert 'demo_seconds_bucket{store="bm25",le="0.005"} 1' in text
+    assert 'demo_seconds_bucket{store="bm25",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{store="bm25"} 2' in text
+
+    snapshot = json.loads(registry.to_json())
+    assert snapshot["counters"]["demo_total"][0]["value"] == 3
+    assert snapshot["histograms"]["demo_seconds"][0]["count"] == 2
+
+
+def test_store_records_metrics_without_printing(capsys):
+    """测试存储写入和检索会更新指标，并且不再向标准输出打印"""
+    print("\n===== 测试存储指标 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = BM25MemoryStore(cache_dir=cache_dir)
+        capsys.readouterr()
+
+        writes = metrics.get("memory_writes_total", store="bm25")
+        retrievals = metrics.get("memory_retrievals_total", store="bm25")
+
+        store.add_memory("用户喜欢蓝色")
+        store.retrieve_relevant_memories("蓝色")
+
+        assert capsys.readouterr().out == ""
+        assert metrics.get("memory_writes_total", store="bm25") == writes + 1
+        assert metrics.get("memory_retrievals_total", store="bm25") == retrievals + 1
+        assert metrics.get("memory_candidates_scanned_total", store="bm25") > 0
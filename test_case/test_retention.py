@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试容量受限时按重要性、时间和访问次数淘汰记忆
+"""
+
+import os
+import tempfile
+
+from misc.memory_bm25 import BM25MemoryStore
+from misc.memory_graph import GraphMemoryStore
+from misc.retention import RetentionPolicy
+
+
+def test_policy_evicts_lowest_score():
+    """测试淘汰顺序：重要性低、时间早、访问少的记忆先被淘汰"""
+    print("\n===== 测试淘汰顺序 =====")
+
+    policy = RetentionPolicy(max_memories=3, half_life=100.0)
+    policy.track("old", 10, importance=1, timestamp=1000.0)
+    policy.track("important", 10, importance=8, timestamp=1000.0)
+    policy.track("accessed", 10, importance=1, timestamp=1000.0)
+    policy.touch(["accessed"] * 3)
+    policy.track("new", 10, importance=1, timestamp=1100.0)
+
+    assert policy.evict() == ["old"]
+    assert len(policy) == 3 and not policy.over_capacity()
+
+    # 刚写入的记忆可以被保护
+    policy.track("newest", 10, importance=1, timestamp=1000.0)
+    assert policy.evict(protect=["newest"]) == ["new"]
+
+
+def test_policy_max_bytes():
+    """测试按总字节数限制容量"""
+    print("\n===== 测试字节容量 =====")
+
+    policy = RetentionPolicy(max_bytes=100)
+    for i in range(5):
+        policy.track(f"m{i}", 30, timestamp=float(i))
+    victims = policy.evict()
+    print(victims)
+    assert victims == ["m0", "m1"]
+    assert policy.total_bytes == 90
+
+
+def test_bm25_store_bounded():
+    """测试BM25存储写入时淘汰并保持在容量内"""
+    print("\n===== 测试BM25容量 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = BM25MemoryStore(
+            cache_dir=cache_dir, retention=RetentionPolicy(max_memories=5)
+        )
+        for i in range(8):
+            store.add_memory(f"第{i}条记忆，用户喜欢编号{i}")
+            if i == 0:
+                store.retrieve_relevant_memories("第0条记忆")
+
+        ids = [m["id"] for m in store.memories if m["id"] != "init_memory"]
+        print(ids)
+        assert len(ids) == 5
+        assert "第0条" in store.memories[1]["content"]
+
+        store.add_memories([f"批量记忆{i}" for i in range(3)])
+        assert len(store.retention) == 5
+        assert len(store) == len(store.memories) == 6
+
+        assert store.delete_memory(ids[-1])
+        assert store.get_memory_by_id(ids[-1]) is None
+        assert not store.delete_memory("missing")
+
+
+def test_bm25_eviction_appends_tombstones():
+    """测试淘汰以删除记录追加到文件，失效记录过多时才整体重写"""
+    print("\n===== 测试BM25删除记录 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = BM25MemoryStore(
+            cache_dir=cache_dir, retention=RetentionPolicy(max_memories=10)
+        )
+        follower = BM25MemoryStore(cache_dir=cache_dir, follow=True)
+        rewrites = []
+        save_memories = store._save_memories
+        store._save_memories = lambda: rewrites.append(1) or save_memories()
+        for i in range(40):
+            store.add_memory(f"第{i}条记忆，用户喜欢编号{i}", memory_id=f"m{i}")
+        # 每次淘汰留下被删除的记录和删除记录两条失效记录，
+        # 重写之后至少再有 compact_ratio × 有效记忆数 条失效记录才会再次重写
+        print(f"淘汰30条，重写{len(rewrites)}次")
+        assert 0 < len(rewrites) <= 30 * 2 // 5
+
+        expected = [m["id"] for m in store.memories]
+        assert expected == ["init_memory"] + [f"m{i}" for i in range(30, 40)]
+        assert follower.get_memory_by_id("m0") is None
+        assert [m["id"] for m in follower.memories] == expected
+        reopened = BM25MemoryStore(
+            cache_dir=cache_dir, retention=RetentionPolicy(max_memories=10)
+        )
+        assert [m["id"] for m in reopened.memories] == expected
+        assert len(reopened.retention) == 10
+
+
+def test_graph_store_bounded():
+    """测试图存储写入时删除重要性最低的节点"""
+    print("\n===== 测试图存储容量 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = GraphMemoryStore(
+            db_path=os.path.join(tmp_dir, "retention.kuzu"),
+            retention=RetentionPolicy(max_memories=3),
+        )
+        try:
+            keep = store.add_memory("重要的记忆", importance=9)
+            ids = [store.add_memory(f"普通记忆{i}") for i in range(4)]
+
+            count = list(store.conn.execute("MATCH (m:Memory) RETURN COUNT(m)"))[0][0]
+            assert count == 3
+            assert store.get_memory_by_id(keep) is not None
+            assert store.get_memory_by_id(ids[0]) is None
+            assert store.get_memory_by_id(ids[-1]) is not None
+        finally:
+            store.close()
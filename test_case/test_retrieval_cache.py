@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试检索结果缓存
+"""
+
+import tempfile
+import time
+
+from misc.memory_bm25 import BM25MemoryStore
+from misc.retrieval_cache import RetrievalCache
+
+
+def test_cache_eviction_and_ttl():
+    """测试LRU淘汰与TTL过期"""
+    print("\n===== 测试 RetrievalCache 淘汰策略 =====")
+
+    cache = RetrievalCache(max_size=2, ttl=0.05)
+    for query in ["蓝色", "红色", "绿色"]:
+        cache.put(cache.make_key(query, 5, 0), [{"id": query}])
+
+    assert cache.get(cache.make_key("蓝色", 5, 0)) is None
+    assert cache.get(cache.make_key("绿色", 5, 0)) == [{"id": "绿色"}]
+    time.sleep(0.1)
+    assert cache.get(cache.make_key("绿色", 5, 0)) is None
+
+    stats = cache.stats()
+    print(f"缓存统计: {stats}")
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+
+
+def test_cached_store_retrieval():
+    """测试存储检索命中缓存以及写入后失效"""
+    print("\n===== 测试 BM25MemoryStore 检索缓存 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = RetrievalCache()
+        store = BM25MemoryStore(cache_dir=cache_dir, retrieval_cache=cache)
+        store.add_memory("用户喜欢蓝色")
+
+        first = store.retrieve_relevant_memories("蓝色", limit=3)
+        # 大小写、空白和标点不同的查询应当命中同一个缓存项
+        second = store.retrieve_relevant_memories(" 蓝色？", limit=3)
+        assert first == second
+        assert cache.stats()["hits"] == 1
+
+        # 写入后版本号递增，旧缓存不再命中
+        store.add_memory("用户不喜欢蓝色的车")
+        third = store.retrieve_relevant_memories("蓝色", limit=3)
+        assert len(third) > len(first)
+        print(f"缓存统计: {cache.stats()}")
+        assert cache.stats()["misses"] == 2
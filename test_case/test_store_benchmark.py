@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试记忆存储性能基准脚本
+"""
+
+import tempfile
+
+from benchmark_case.store_benchmark import (
+    compare_with_baseline,
+    generate_corpus,
+    run_backend,
+)
+
+
+def test_corpus_is_reproducible():
+    """测试相同种子生成相同的中英文语料"""
+    print("\n===== 测试合成语料 =====")
+
+    corpus = generate_corpus(10, seed=1)
+    print(corpus[:2])
+    assert corpus == generate_corpus(10, seed=1)
+    assert corpus != generate_corpus(10, seed=2)
+    assert len(set(corpus)) == 10
+
+
+def test_bm25_benchmark_small():
+    """测试在小规模语料上运行BM25基准并与基线比较"""
+    print("\n===== 测试BM25基准 =====")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        result = run_backend("bm25", 100, work_dir, queries=20, add_samples=3)
+    print(result)
+    assert result["size"] == 100
+    assert result["batch_load_per_s"] > 0
+    assert result["retrieve_p99_ms"] >= result["retrieve_p50_ms"] > 0
+
+    slower = dict(result, retrieve_p99_ms=result["retrieve_p99_ms"] * 2)
+    assert compare_with_baseline([result], [result]) == []
+    assert len(compare_with_baseline([slower], [result])) == 1
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试分词器初始化控制
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import jieba
+
+from misc import tokenizer
+
+
+def test_warm_up_writes_cache_to_cache_dir():
+    """测试在新进程中预热分词器，词典缓存文件写入指定目录"""
+    print("\n===== 测试分词器预热 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        script = (
+            "from misc.tokenizer import warm_up_tokenizer, tokenize_text\n"
+            f"warm_up_tokenizer({cache_dir!r}).join()\n"
+            "print(tokenize_text('用户喜欢机器学习 and Python'))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        print(result.stdout)
+        assert os.path.exists(os.path.join(cache_dir, "jieba.cache"))
+        assert "Python" in result.stdout
+
+
+def test_user_dict_loaded_once(monkeypatch):
+    """测试同一用户词典在进程内只加载一次"""
+    print("\n===== 测试用户词典加载 =====")
+
+    calls = []
+    monkeypatch.setattr(jieba, "load_userdict", lambda path: calls.append(path))
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("记忆图谱 10 n\n")
+    try:
+        tokenizer.init_tokenizer(user_dict=f.name)
+        tokenizer.init_tokenizer(user_dict=f.name)
+        assert calls == [os.path.abspath(f.name)]
+    finally:
+        tokenizer._loaded_user_dicts.discard(os.path.abspath(f.name))
+        os.remove(f.name)
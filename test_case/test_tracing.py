@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试记忆工具调用的分阶段耗时追踪
+"""
+
+import json
+import os
+import tempfile
+
+from misc.memory_bm25 import create_memory_tools
+from misc.tracing import Tracer, tracer
+
+
+def test_disabled_tracer_records_nothing():
+    """测试追踪关闭时不产生任何追踪"""
+    print("\n===== 测试追踪关闭 =====")
+
+    local = Tracer()
+    with local.span("outer") as span:
+        span.set_attribute("k", 1)
+        with local.span("inner"):
+            pass
+    assert local.last_trace() is None
+    assert local.breakdown() == []
+
+
+def test_retrieve_breakdown_and_otlp_export():
+    """测试检索工具调用的分阶段耗时和OTLP文件导出"""
+    print("\n===== 测试检索分阶段耗时 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        export_path = os.path.join(cache_dir, "traces.jsonl")
+        save_tool, retrieve_tool = create_memory_tools(
+            cache_dir=os.path.join(cache_dir, "bm25"), cache_size=0
+        )
+        save_tool._run("用户喜欢机器学习")
+
+        tracer.enable(export_path=export_path)
+        try:
+            retrieve_tool._run("机器学习")
+        finally:
+            tracer.disable()
+
+        print(tracer.format_breakdown())
+        names = [(row["depth"], row["name"]) for row in tracer.breakdown()]
+        assert names[0] == (0, "tool.retrieve_memories")
+        assert (1, "bm25.retrieve") in names
+        assert (2, "bm25.tokenize") in names
+        assert (2, "bm25.score") in names
+        assert (1, "tool.format") in names
+
+        with open(export_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        assert len(lines) == 1
+        spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert len(spans) == len(names)
+        assert len({span["traceId"] for span in spans}) == 1
+        root = [span for span in spans if "parentSpanId" not in span]
+        assert [span["name"] for span in root] == ["tool.retrieve_memories"]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试Test_Time_Learning离线评测
+"""
+
+from benchmark_case.ttl_eval import StubLLM, run_evaluation, split_examples
+
+RECORDS = [
+    {
+        "context": (
+            "How do I top up my card?\nlabel: 3\n\n"
+            "My card was declined at the shop\nlabel: 7\n\n"
+            "Can I top up by bank transfer?\nlabel: 3"
+        ),
+        "questions": ["top up with transfer", "card declined"],
+        "answers": [["3"], ["7"]],
+    }
+]
+
+
+def test_stub_llm_votes_by_rank():
+    """测试替身LLM按排名加权投票"""
+    print("\n===== 测试替身LLM =====")
+
+    llm = StubLLM()
+    retrieved = "1. a\nlabel: 5\n\n2. b\nlabel: 9\n\n3. c\nlabel: 9\n\n"
+    assert llm.answer("q", retrieved) == "5"
+    assert llm.answer("q", retrieved + "4. d\nlabel: 9\n\n") == "9"
+    assert llm.answer("q", "没有找到相关记忆。") == ""
+    assert len(split_examples(RECORDS[0]["context"])) == 3
+
+
+def test_run_evaluation_bm25():
+    """测试在BM25后端上评测并汇总recall@k和阶段耗时"""
+    print("\n===== 测试TTL评测 =====")
+
+    summary = run_evaluation(RECORDS, workers=1, backend="bm25", ks=(1, 3))
+    print(summary)
+    assert summary["questions"] == 2
+    assert summary["recall_at_k"]["3"] == 1.0
+    assert summary["accuracy"] == 1.0
+    assert set(summary["timings_s"]) == {"setup", "ingest", "retrieve", "answer"}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试WikiHop多跳检索基准
+"""
+
+import json
+import os
+import tempfile
+
+from benchmark_case.wikihop_eval import evaluate_example, hop_queries, run_benchmark
+
+
+def _make_record(i):
+    return {
+        "_id": f"q{i}",
+        "type": "compositional",
+        "question": f"Who is the mother of the director of film Movie{i}?",
+        "context": [
+            [f"Movie{i}", [f"Movie{i} is a 1999 film directed by Person{i}."]],
+            [f"Person{i}", [f"Person{i} is a director. His mother is Mom{i}."]],
+            [f"Other{i}", ["Unrelated text about the weather."]],
+        ],
+        "supporting_facts": [[f"Movie{i}", 0], [f"Person{i}", 0]],
+        "evidences": [
+            [f"Movie{i}", "director", f"Person{i}"],
+            [f"Person{i}", "mother", f"Mom{i}"],
+        ],
+        "answer": f"Mom{i}",
+    }
+
+
+def test_wikihop_benchmark_bm25():
+    """测试BM25后端的支持事实召回率和延迟统计"""
+    print("\n===== 测试WikiHop基准 =====")
+
+    records = [_make_record(i) for i in range(4)]
+    assert hop_queries(records[0]) == ["Movie0 director", "Person0 mother"]
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        with open(os.path.join(data_dir, "dev.json"), "w", encoding="utf-8") as f:
+            json.dump(records, f)
+        summary = run_benchmark(data_dir, "dev", "bm25", k=1, limit=3)
+
+    print(summary)
+    assert summary["examples"] == 3
+    assert summary["sf_recall_with_hops"] == 1.0
+    assert summary["sf_recall_question"] <= summary["sf_recall_with_hops"]
+    assert summary["query_p99_ms"] >= summary["query_p50_ms"] > 0
+
+
+def test_padding_is_not_counted():
+    """测试检索不足k条匹配时补足的段落不计入支持事实召回"""
+    print("\n===== 测试填充结果不计入召回 =====")
+
+    record = _make_record(0)
+    record["question"] = "Which river flows through the capital?"
+    record["evidences"] = []
+    result = evaluate_example(record, "bm25", k=3)
+    print(result)
+    assert result["hits_question"] == result["hits_with_hops"] == 0
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试WikiHop数据集的流式读取
+"""
+
+import json
+import os
+import tempfile
+
+import pytest
+
+from benchmark_case.wikihop_dataset import (
+    WikiHopQADataset,
+    ingest_records,
+    iter_json_array,
+)
+from misc.memory_bm25 import BM25MemoryStore
+
+
+def _make_records(count):
+    return [
+        {
+            "_id": f"q{i}",
+            "question": f"Who directed film [{i}]?",
+            "context": [
+                [f"Film {i}", [f'Film {i} is a movie, "quoted" ]', "Second, one."]],
+                [f"Director {i}", [f"Director {i} was born in 19{i:02d}."]],
+            ],
+            "answer": f"Director {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def test_iter_json_array_small_chunks():
+    """测试按很小的块流式解析与json.load结果一致"""
+    print("\n===== 测试流式解析 =====")
+
+    records = _make_records(5)
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "dev.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=1)
+        assert list(iter_json_array(path, chunk_size=7)) == records
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([1, 22, 333], f)
+        assert list(iter_json_array(path, chunk_size=2)) == [1, 22, 333]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+def test_iter_json_array_mixed_scalars(chunk_size):
+    """测试标量在任意块边界截断时的解析结果与json.loads一致"""
+    text = (
+        '[ 1, -2.5e3,"a,b]" ,true,false , null,\n{"k": [1, 2.0]}, [], "x\\"y",'
+        " 0, 12345678901234567890, 3.25E-2 ]\n"
+    )
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "mixed.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        assert list(iter_json_array(path, chunk_size=chunk_size)) == json.loads(text)
+
+
+def test_iter_data_shards_and_cache():
+    """测试分片读取、JSONL缓存和写入记忆存储"""
+    print("\n===== 测试分片和缓存 =====")
+
+    records = _make_records(7)
+    with tempfile.TemporaryDirectory() as data_dir:
+        with open(os.path.join(data_dir, "dev.json"), "w", encoding="utf-8") as f:
+            json.dump(records, f)
+        dataset = WikiHopQADataset(data_dir)
+        cache_dir = os.path.join(data_dir, "cache")
+
+        shards = [list(dataset.iter_data("dev", i, 3)) for i in range(3)]
+        assert sorted(r["_id"] for shard in shards for r in shard) == sorted(
+            r["_id"] for r in records
+        )
+        assert shards[1] == records[1::3]
+
+        cached = list(dataset.iter_data("dev", 0, 2, cache_dir=cache_dir))
+        assert os.path.exists(os.path.join(cache_dir, "dev.jsonl"))
+        assert cached == records[0::2]
+
+        store = BM25MemoryStore(cache_dir=os.path.join(data_dir, "bm25"))
+        count = ingest_records(dataset.iter_data("dev"), store, batch_size=4)
+        assert count == 14
+        memories = store.retrieve_relevant_memories("Director 3", limit=1)
+        print(memories)
+        assert memories[0]["content"].startswith("Director 3:")
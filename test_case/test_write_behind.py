@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试记忆写入的后台队列
+"""
+
+import os
+import tempfile
+
+from misc.memory_bm25 import BM25MemoryStore, create_memory_tools
+from misc.memory_graph import GraphMemoryStore
+from misc.write_behind import WriteBehindQueue
+
+
+def test_save_returns_immediately_and_reads_own_writes():
+    """测试保存工具立即返回ID，随后的检索能读到刚保存的记忆"""
+    print("\n===== 测试后台写入 =====")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        save_tool, retrieve_tool = create_memory_tools(
+            cache_dir, cache_size=0, write_behind=True
+        )
+        queue = save_tool.write_queue
+        try:
+            results = [
+                save_tool._run(f"用户第{i}次提到喜欢的城市是成都") for i in range(20)
+            ]
+            assert all("记忆已保存" in r for r in results)
+
+            result = retrieve_tool._run("成都", limit=3)
+            print(result)
+            assert "成都" in result
+            assert queue.pending == 0
+
+            memory_id = results[0].split("ID: ")[1]
+            assert save_tool.memory_store.get_memory_by_id(memory_id) is not None
+        finally:
+            queue.close()
+
+
+def test_close_flushes_pending_writes():
+    """测试关闭队列时写完排队的记忆，并按批写入"""
+    print("\n===== 测试关闭时写入 =====")
+
+    calls = []
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = BM25MemoryStore(cache_dir=cache_dir)
+        original = store.add_memories
+
+        def add_memories(contents, memory_ids=None):
+            calls.append(len(contents))
+            return original(contents, memory_ids)
+
+        store.add_memories = add_memories
+        queue = WriteBehindQueue(store, batch_size=10, max_delay=0.5)
+        ids = [queue.submit(f"批量记忆{i}") for i in range(25)]
+        queue.close()
+
+        print(calls)
+        assert sum(calls) == 25
+        assert len(calls) < 25
+        assert all(store.get_memory_by_id(memory_id) for memory_id in ids)
+
+
+def test_graph_write_behind_keeps_importance():
+    """测试图存储按重要性分组批量写入"""
+    print("\n===== 测试图存储后台写入 =====")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = GraphMemoryStore(db_path=os.path.join(tmp_dir, "write_behind.kuzu"))
+        queue = WriteBehindQueue(store)
+        try:
+            low = queue.submit("普通的记忆", importance=1)
+            high = queue.submit("重要的记忆", importance=8)
+            assert queue.flush(timeout=10)
+            assert store.get_memory_by_id(low)["importance"] == 1
+            assert store.get_memory_by_id(high)["importance"] == 8
+        finally:
+            queue.close()
+            store.close()